@@ -187,6 +187,14 @@ NIGHTLY_VERSION[1] = '2024-11-16T07:21:28+01:00'
 
 # CACHE
 CACHE_TYPE_THUMBNAILS    = 'thumbnails'
+CACHE_TYPE_EXPORTS       = 'exports'
+
+# Disk budget of the embedded metadata export cache in MB
+EXPORT_CACHE_SIZE        = int(os.environ.get('CWA_EXPORT_CACHE_MB', 2048)) * 1024 * 1024
+# Disk budget, worker count and look-back window of exports prepared ahead of e-reader syncs
+EXPORT_PREWARM_SIZE      = int(os.environ.get('CWA_EXPORT_PREWARM_MB', 1024)) * 1024 * 1024
+EXPORT_PREWARM_WORKERS   = max(1, int(os.environ.get('CWA_EXPORT_PREWARM_WORKERS', 2)))
+EXPORT_PREWARM_DAYS      = 30
 
 # Thumbnail Types
 THUMBNAIL_TYPE_COVER     = 1
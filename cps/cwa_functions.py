@@ -34,6 +34,8 @@ from .web import cwa_get_num_books_in_library
 import sys
 sys.path.insert(1, '/app/calibre-web-automated/scripts/')
 from cwa_db import CWA_DB
+from run_status import (read_run_status, write_run_status, mark_run_status, read_log_since, FINAL_STATES,
+                        CONVERT_LIBRARY_STATUS, EPUB_FIXER_STATUS)
 from .services.background_scheduler import BackgroundScheduler, DateTrigger
 from .services.worker import WorkerThread
 from .tasks.database import TaskReconnectDatabase
@@ -480,6 +482,8 @@ def cwa_internal_reconnect_db():
 
         task = TaskReconnectDatabase()
         WorkerThread.add(None, task, hidden=True)
+        # Ingest ends here, prepare the exports of whatever devices are about to sync
+        helper.prewarm_embedded_exports()
         return jsonify({"status": "enqueued"}), 200
     except Exception as e:
         log.error(f"Internal reconnect-db failed: {e}")
@@ -781,6 +785,25 @@ def cwa_scheduled_upcoming():
         log.error(f"Error fetching upcoming scheduled sends: {e}")
         return jsonify({"items": []}), 200
 
+@cwa_stats.route('/cwa-stats/kobo-sync', methods=["GET"])
+@login_required_if_no_ano
+@admin_required
+def cwa_kobo_sync_stats():
+    """Return how long Kobo library syncs have been taking since the server started."""
+    try:
+        from .kobo import sync_stats
+    except ImportError:
+        return jsonify({}), 200
+    return jsonify(sync_stats.as_dict()), 200
+
+@cwa_stats.route('/cwa-stats/kosync-auth', methods=["GET"])
+@login_required_if_no_ano
+@admin_required
+def cwa_kosync_auth_stats():
+    """Return how often KOSync requests were authenticated from the credential cache since the server started."""
+    from .progress_syncing.protocols.kosync import credential_cache
+    return jsonify(credential_cache.stats()), 200
+
 @cwa_stats.route('/cwa-scheduled/upcoming-ops', methods=["GET"])
 @login_required_if_no_ano
 @admin_required
@@ -945,15 +968,17 @@ def read_log(log_filename):
 
 ##————————————————————————SHARED VARIABLES & FUNCTIONS————————————————————————##
 
-def extract_progress(log_content):
-    """Analyses a log's given contents & returns the processes current progress as a dict"""
-    # Regex to find all progress matches (e.g., "n/n")
-    matches = re.findall(r'(\d+)/(\d+)', log_content)
-    if matches:
-        # Convert the matches to integers and take the last one
-        current, total = map(int, matches[-1])
-        return {"current": current, "total": total}
-    return {"current": 0, "total": 0}
+def get_run_status(log_path, status_path) -> dict:
+    """Progress of a run from its status record, plus whatever was added to its log since the offset
+    the page passed in. The status is read first, so the log already holds everything up to it"""
+    run = read_run_status(status_path)
+    offset = request.args.get('offset', default=0, type=int)
+    log_text, offset, reset = read_log_since(log_path, offset)
+    return {'status': log_text,
+            'offset': offset,
+            'reset': reset,
+            'state': run['state'],
+            'progress': {'current': run['current'], 'total': run['total']}}
 
 def archive_run_log(log_path):
     try:
@@ -1006,12 +1031,7 @@ def empty_tmp_con_dir(tmp_conversion_dir) -> None:
         print(f"[cwa-functions]: An error occurred while emptying {tmp_conversion_dir}. See the following error: {e}")
 
 def is_convert_library_finished() -> bool:
-    log_path = "/config/convert-library.log"
-    with open(log_path, 'r') as log:
-        if "CWA Convert Library Service - Run Ended: " in log.read():
-            return True
-        else:
-            return False
+    return read_run_status(CONVERT_LIBRARY_STATUS)['state'] in FINAL_STATES
 
 def kill_convert_library(queue):
     trigger_file = Path(tempfile.gettempdir() + "/.kill_convert_library_trigger")
@@ -1036,7 +1056,8 @@ def kill_convert_library(queue):
                 ...
             # Add string to log to notify user of successful cancellation and to stop the JS update script
             with open(log_path, 'a') as f:
-                f.write(f"\nCONVERT LIBRARY PROCESS TERMINATED BY USER AT {datetime.now()}")
+                f.write(f"\nCONVERT LIBRARY PROCESS TERMINATED BY USER AT {datetime.now()}\n")
+            mark_run_status(CONVERT_LIBRARY_STATUS, 'cancelled')
             # Add run log to log_archive
             archive_run_log(log_path)
             break
@@ -1103,8 +1124,9 @@ def download_current_log(log_filename):
 
 @convert_library.route('/cwa-convert-library-start', methods=["GET"])
 def start_conversion():
-    # Wipe conversion log from previous runs
+    # Wipe conversion log and status from previous runs
     open('/config/convert-library.log', 'w').close()
+    write_run_status(CONVERT_LIBRARY_STATUS, 'starting')
     # Remove any left over kill file
     try:
         os.remove(tempfile.gettempdir() + "/.kill_convert_library_trigger")
@@ -1128,12 +1150,7 @@ def cancel_convert_library():
 
 @convert_library.route('/convert-library-status', methods=["GET"])
 def get_status():
-    with open("/config/convert-library.log", 'r') as f:
-        status = f.read()
-    progress = extract_progress(status)
-    statusList = {'status':status,
-                  'progress':progress}
-    return json.dumps(statusList)
+    return json.dumps(get_run_status("/config/convert-library.log", CONVERT_LIBRARY_STATUS))
 
 
 ##————————————————————————————————————————————————————————————————————————————##
@@ -1147,12 +1164,7 @@ def epub_fixer_start(queue):
     queue.put(ef_process)
 
 def is_epub_fixer_finished() -> bool:
-    log_path = "/config/epub-fixer.log"
-    with open(log_path, 'r') as log:
-        if "CWA Kindle EPUB Fixer Service - Run Ended: " in log.read():
-            return True
-        else:
-            return False
+    return read_run_status(EPUB_FIXER_STATUS)['state'] in FINAL_STATES
 
 def kill_epub_fixer(queue):
     trigger_file = Path(tempfile.gettempdir() + "/.kill_epub_fixer_trigger")
@@ -1175,7 +1187,8 @@ def kill_epub_fixer(queue):
                 ...
             # Add string to log to notify user of successful cancellation and to stop the JS update script
             with open(log_path, 'a') as f:
-                f.write(f"\nCWA EPUB FIXER PROCESS TERMINATED BY USER AT {datetime.now()}")
+                f.write(f"\nCWA EPUB FIXER PROCESS TERMINATED BY USER AT {datetime.now()}\n")
+            mark_run_status(EPUB_FIXER_STATUS, 'cancelled')
             # Add run log to log_archive
             archive_run_log(log_path)
             break
@@ -1240,8 +1253,9 @@ def download_current_log(log_filename):
 
 @epub_fixer.route('/cwa-epub-fixer-start', methods=["GET"])
 def start_epub_fixer():
-    # Wipe conversion log from previous runs
+    # Wipe fixer log and status from previous runs
     open('/config/epub-fixer.log', 'w').close()
+    write_run_status(EPUB_FIXER_STATUS, 'starting')
     # Remove any left over kill file
     try:
         os.remove(tempfile.gettempdir() + "/.kill_epub_fixer_trigger")
@@ -1265,12 +1279,7 @@ def cancel_epub_fixer():
 
 @epub_fixer.route('/epub-fixer-status', methods=["GET"])
 def get_status():
-    with open("/config/epub-fixer.log", 'r') as f:
-        status = f.read()
-    progress = extract_progress(status)
-    statusList = {'status':status,
-                  'progress':progress}
-    return json.dumps(statusList)
+    return json.dumps(get_run_status("/config/epub-fixer.log", EPUB_FIXER_STATUS))
 
 
 # ################################### Profile Pictures ###################################################
@@ -8,6 +8,8 @@
 import os
 import re
 import json
+import threading
+from collections import OrderedDict
 from datetime import datetime, timezone
 from urllib.parse import quote
 import unidecode
@@ -19,7 +21,9 @@ import sqlite3
 from sqlalchemy import create_engine
 from sqlalchemy import Table, Column, ForeignKey, CheckConstraint
 from sqlalchemy import String, Integer, Boolean, TIMESTAMP, Float
+from sqlalchemy import inspect
 from sqlalchemy.orm import relationship, sessionmaker, scoped_session
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.orm.collections import InstrumentedList
 from sqlalchemy.ext.declarative import DeclarativeMeta
 from sqlalchemy.exc import OperationalError
@@ -29,7 +33,7 @@ try:
 except ImportError:
     from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.pool import StaticPool
-from sqlalchemy.sql.expression import and_, true, false, text, func, or_
+from sqlalchemy.sql.expression import and_, true, false, text, func, or_, select
 from sqlalchemy.ext.associationproxy import association_proxy
 from .cw_login import current_user
 from flask_babel import gettext as _
@@ -531,6 +535,13 @@ class CalibreDB:
     # This is a WeakSet so that references here don't keep other CalibreDB
     # instances alive once they reach the end of their respective scopes
     instances = WeakSet()
+    # (calibre dir, on-disk signature of metadata.db) as of the last setup_db, see reconnect_db_if_changed
+    library_signature = None
+    _reconnect_lock = threading.Lock()
+    # common_filters expressions keyed by everything they are built from, see common_filters
+    _filters_cache = OrderedDict()
+    _filters_cache_lock = threading.Lock()
+    FILTERS_CACHE_SIZE = 256
 
     def __init__(self, expire_on_commit=True, init=False):
         """ Initialize a new CalibreDB session
@@ -682,9 +693,23 @@ class CalibreDB:
     def update_config(cls, config):
         cls.config = config
 
+    @staticmethod
+    def get_library_signature(config_calibre_dir):
+        """Cheap fingerprint of metadata.db's state on disk. With WAL enabled, commits from other processes
+        (calibredb, the ingest scripts) land in metadata.db-wal until the next checkpoint, so both files count"""
+        signature = []
+        for suffix in ("", "-wal"):
+            try:
+                stat = os.stat(os.path.join(config_calibre_dir, "metadata.db" + suffix))
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return config_calibre_dir, tuple(signature)
+
     @classmethod
     def setup_db(cls, config_calibre_dir, app_db_path):
         cls.dispose()
+        cls.library_signature = None
 
         if not config_calibre_dir:
             cls.config.invalidate()
@@ -695,6 +720,9 @@ class CalibreDB:
             cls.config.invalidate()
             return None
 
+        # Taken before connecting, so a change made while we set up still triggers the next refresh
+        library_signature = cls.get_library_signature(config_calibre_dir)
+
         try:
             cls.engine = create_engine('sqlite://',
                                        echo=False,
@@ -740,6 +768,7 @@ class CalibreDB:
         from .progress_syncing.models import ensure_calibre_db_tables
         ensure_calibre_db_tables(conn)
 
+        cls.library_signature = library_signature
         cls._init = True
 
     def get_book(self, book_id):
@@ -796,12 +825,39 @@ class CalibreDB:
 
     # Language and content filters for displaying in the UI
     def common_filters(self, allow_show_archived=False, return_all_languages=False):
+        """Visibility filter for the current user's book queries. Built once for every combination of
+        user, restrictions and arguments and reused from then on: a change to any restriction makes a
+        new key, and archived books are excluded by a subquery so archiving needs no rebuild"""
+        key = (int(current_user.id), allow_show_archived, return_all_languages, current_user.filter_language(),
+               current_user.denied_tags, current_user.allowed_tags, self.config.config_restricted_column,
+               current_user.allowed_column_value, current_user.denied_column_value)
+        with self._filters_cache_lock:
+            cached = self._filters_cache.get(key)
+            if cached is not None:
+                self._filters_cache.move_to_end(key)
+                return cached
+
+        filters, cacheable = self._build_common_filters(allow_show_archived, return_all_languages)
+        if cacheable:
+            with self._filters_cache_lock:
+                self._filters_cache[key] = filters
+                while len(self._filters_cache) > self.FILTERS_CACHE_SIZE:
+                    self._filters_cache.popitem(last=False)
+        return filters
+
+    @classmethod
+    def clear_filters_cache(cls):
+        with cls._filters_cache_lock:
+            cls._filters_cache.clear()
+
+    def _build_common_filters(self, allow_show_archived, return_all_languages):
+        """Returns the filter expression and whether it can be reused"""
+        cacheable = True
         if not allow_show_archived:
-            archived_books = (ub.session.query(ub.ArchivedBook)
-                              .filter(ub.ArchivedBook.user_id==int(current_user.id))
-                              .filter(ub.ArchivedBook.is_archived==True)
-                              .all())
-            archived_book_ids = [archived_book.book_id for archived_book in archived_books]
+            # archived_book lives in app.db, which is attached to the calibre session
+            archived_book_ids = (select(ub.ArchivedBook.book_id)
+                                 .where(ub.ArchivedBook.user_id == int(current_user.id))
+                                 .where(ub.ArchivedBook.is_archived == True))
             archived_filter = Books.id.notin_(archived_book_ids)
         else:
             archived_filter = true()
@@ -827,6 +883,8 @@ class CalibreDB:
             except (KeyError, AttributeError, IndexError):
                 pos_content_cc_filter = false()
                 neg_content_cc_filter = true()
+                # Not kept, so the error is shown again until the column is fixed
+                cacheable = False
                 log.error("Custom Column No.{} does not exist in calibre database".format(
                     self.config.config_restricted_column))
                 flash(_("Custom Column No.%(column)d does not exist in calibre database",
@@ -837,7 +895,7 @@ class CalibreDB:
             pos_content_cc_filter = true()
             neg_content_cc_filter = false()
         return and_(lang_filter, pos_content_tags_filter, ~neg_content_tags_filter,
-                    pos_content_cc_filter, ~neg_content_cc_filter, archived_filter)
+                    pos_content_cc_filter, ~neg_content_cc_filter, archived_filter), cacheable
 
     def generate_linked_query(self, config_read_column, database):
         # Safety: session can be briefly None during DB reconnects
@@ -934,41 +992,61 @@ class CalibreDB:
     # Orders all Authors in the list according to authors sort
     def order_authors(self, entries, list_return=False, combined=False):
         self.ensure_session()
-        for entry in entries:
-            if combined:
-                sort_authors = entry.Books.author_sort.split('&')
-                ids = [a.id for a in entry.Books.authors]
-
-            else:
-                sort_authors = entry.author_sort.split('&')
-                ids = [a.id for a in entry.authors]
+        books = [entry.Books if combined else entry for entry in entries]
+        if not list_return:
+            # Only the first entry's authors are returned
+            books = books[:1]
+        self._load_authors(books)
+
+        sort_names = set()
+        for book in books:
+            sort_names.update(strip_whitespaces(auth) for auth in book.author_sort.split('&'))
+        known_sorts = set()
+        for chunk in _chunks(list(sort_names)):
+            known_sorts.update(row[0] for row in self.session.query(Authors.sort).filter(Authors.sort.in_(chunk)))
+
+        for book in books:
+            sort_authors = book.author_sort.split('&')
+            remaining = list(book.authors)
             authors_ordered = list()
             # error = False
             for auth in sort_authors:
                 auth = strip_whitespaces(auth)
-                results = self.session.query(Authors).filter(Authors.sort == auth).all()
                 # ToDo: How to handle not found author name
-                if not len(results):
+                if auth not in known_sorts:
                     log.error("Author {} not found to display name in right order".format(auth))
                     # error = True
                     break
-                for r in results:
-                    if r.id in ids:
-                        authors_ordered.append(r)
-                        ids.remove(r.id)
-            for author_id in ids:
-                result = self.session.query(Authors).filter(Authors.id == author_id).first()
-                authors_ordered.append(result)
+                for author in [a for a in remaining if a.sort == auth]:
+                    authors_ordered.append(author)
+                    remaining.remove(author)
+            authors_ordered.extend(remaining)
 
             if list_return:
                 if combined:
-                    entry.Books.authors = authors_ordered
+                    set_committed_value(book, 'authors', authors_ordered)
                 else:
-                    entry.ordered_authors = authors_ordered
+                    book.ordered_authors = authors_ordered
             else:
                 return authors_ordered
         return entries
 
+    def _load_authors(self, books):
+        """Loads the authors of all given books with one query (per 500 books) instead of a lazy load per book"""
+        unloaded = {book.id: book for book in books if 'authors' in inspect(book).unloaded}
+        if not unloaded:
+            return
+        authors = {book_id: [] for book_id in unloaded}
+        for chunk in _chunks(list(unloaded)):
+            rows = (self.session.query(books_authors_link.c.book, Authors)
+                    .join(Authors, Authors.id == books_authors_link.c.author)
+                    .filter(books_authors_link.c.book.in_(chunk))
+                    .order_by(books_authors_link.c.book))
+            for book_id, author in rows:
+                authors[book_id].append(author)
+        for book_id, book in unloaded.items():
+            set_committed_value(book, 'authors', authors[book_id])
+
     def get_typeahead(self, database, query, replace=('', ''), tag_filter=true()):
         self.ensure_session()
         query = query or ''
@@ -1047,18 +1125,18 @@ class CalibreDB:
         self.ensure_session()
         order = order[0] if order else [Books.sort]
         pagination = None
-        result = self.search_query(term, config, *join).order_by(*order).all()
-        result_count = len(result)
+        query = self.search_query(term, config, *join).order_by(*order)
+        result_count = query.count()
         if offset is not None and limit is not None:
             offset = int(offset)
-            limit_all = offset + int(limit)
             pagination = Pagination((offset / (int(limit)) + 1), limit, result_count)
+            result = query.offset(offset).limit(int(limit)).all()
         else:
-            offset = 0
-            limit_all = result_count
+            result = query.all()
 
-        ub.store_combo_ids(result)
-        entries = self.order_authors(result[offset:limit_all], list_return=True, combined=True)
+        # Only the ids of the whole result are kept for adding it to a shelf, not the books themselves
+        ub.store_book_ids(book_id for book_id, in query.with_entities(Books.id).yield_per(1000))
+        entries = self.order_authors(result, list_return=True, combined=True)
 
         return entries, result_count, pagination
 
@@ -1148,6 +1226,8 @@ class CalibreDB:
         for db_class in cc_classes.values():
             Base.metadata.remove(db_class.__table__)
         cc_classes.clear()
+        # Cached filters may refer to the custom column classes just dropped
+        cls.clear_filters_cache()
 
         for table in reversed(Base.metadata.sorted_tables):
             name = table.key
@@ -1175,6 +1255,22 @@ class CalibreDB:
         self.setup_db(config.config_calibre_dir, app_db_path)
         self.update_config(config)
 
+    def reconnect_db_if_changed(self, config, app_db_path):
+        """Reconnects only if metadata.db changed on disk since the engine was last set up.
+        Returns True if a reconnect happened"""
+        with self._reconnect_lock:
+            if self._init and self.library_signature == self.get_library_signature(config.config_calibre_dir):
+                self.ensure_session()
+                return False
+            self.reconnect_db(config, app_db_path)
+            return True
+
+
+def _chunks(items, size=500):
+    """Splits items for IN (...) queries, keeping well below SQLite's bound parameter limit"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
 
 def lcase(s):
     try:
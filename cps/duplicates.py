@@ -104,6 +104,10 @@ def find_duplicate_books():
         print(f"[cwa-duplicates] Warning: Processing {len(all_books)} books may take some time", flush=True)
         log.warning("[cwa-duplicates] Processing large library: %s books", len(all_books))
     
+    # Order every book's authors up front with a couple of bulk queries instead of several per book
+    if use_author:
+        calibre_db.order_authors(all_books, list_return=True)
+
     # Group books by configurable criteria combination (case-insensitive)
     grouped_books = {}
     
@@ -120,7 +124,6 @@ def find_duplicate_books():
             # Ensure authors are loaded and not empty
             if book.authors and len(book.authors) > 0:
                 # Get primary author (use Calibre-Web's standard approach)
-                book.ordered_authors = calibre_db.order_authors([book])
                 primary_author = book.ordered_authors[0].name if book.ordered_authors and len(book.ordered_authors) > 0 else "unknown"
                 key_parts.append(primary_author.lower().strip())
             else:
@@ -170,6 +173,10 @@ def find_duplicate_books():
     
     # Filter to only groups with duplicates and prepare display data
     duplicate_groups = []
+    unordered_books = [book for books in grouped_books.values() if len(books) > 1
+                       for book in books if not getattr(book, 'ordered_authors', None)]
+    if unordered_books:
+        calibre_db.order_authors(unordered_books, list_return=True)
     for key, books in grouped_books.items():
         if len(books) > 1:
             # Sort books by timestamp (newest first)
@@ -812,6 +812,7 @@ def do_edit_book(book_id, upload_formats=None):
         # Stage 4: Post-commit operations (like cloud sync)
         if config.config_use_google_drive:
             gdriveutils.updateGdriveCalibreFromLocal()
+        helper.prewarm_embedded_exports([book.id])
 
         if not edit_error and not title_author_error and cover_upload_success is not False:
             flash(_("Metadata successfully updated"), category="success")
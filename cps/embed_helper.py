@@ -68,6 +68,11 @@ def do_calibre_export(book_id, book_format):
         return None, None
 
 
+def calibre_export_settings():
+    """Everything besides the book itself that changes the output of do_calibre_export, for the export cache"""
+    return "calibredb", config.config_binariesdir, config.config_calibre_dir, config.config_calibre_split
+
+
 def get_calibre_binarypath(binary):
     binariesdir = config.config_binariesdir
     if binariesdir:
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""On-disk cache of books with embedded metadata.
+
+Exports are keyed by book id, format, the book's last_modified and a hash of the
+settings the export depends on, so an edit to the book or to those settings makes
+a new entry instead of serving a stale one. Entries are evicted least recently
+used first once the cache grows beyond EXPORT_CACHE_SIZE.
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+from uuid import uuid4
+
+from . import logger
+from .constants import CACHE_TYPE_EXPORTS, EXPORT_CACHE_SIZE
+from .file_helper import get_temp_dir
+from .fs import FileSystem
+
+log = logger.create()
+
+_lock = threading.Lock()
+# one lock per cache key, so concurrent downloads of a new book wait for a single export
+_key_locks = dict()
+
+
+def cache_key(book_id, book_format, last_modified, settings):
+    modified = last_modified.isoformat() if hasattr(last_modified, "isoformat") else str(last_modified)
+    settings_hash = hashlib.sha1(repr(settings).encode("utf-8")).hexdigest()
+    return hashlib.sha1("{}:{}:{}:{}".format(book_id, book_format.lower(), modified, settings_hash)
+                        .encode("utf-8")).hexdigest()
+
+
+def get_cache_dir():
+    return FileSystem().get_cache_dir(CACHE_TYPE_EXPORTS)
+
+
+def get_cached_export(book_id, book_format, last_modified, settings):
+    """Returns the path of a cached export, or None if there is none yet"""
+    path = os.path.join(get_cache_dir(),
+                        cache_key(book_id, book_format, last_modified, settings) + "." + book_format.lower())
+    if not os.path.isfile(path):
+        return None
+    try:
+        # mtime tracks the last use for the LRU eviction, atime is unreliable on noatime mounts
+        os.utime(path)
+    except OSError:
+        pass
+    return path
+
+
+def get_export(book_id, book_format, last_modified, settings, export):
+    """Returns the path of the export of a book in book_format, producing it with export() on a cache miss.
+
+    export() has to return (directory, file name without extension) of a temporary export like
+    do_calibre_export does. Returns None if the export failed.
+    """
+    key = cache_key(book_id, book_format, last_modified, settings)
+    with _lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        try:
+            path = get_cached_export(book_id, book_format, last_modified, settings)
+            if path:
+                return path
+            path = _store(key, book_format, export())
+            if path:
+                _store_checksum(book_id, book_format, path)
+                evict()
+            return path
+        finally:
+            with _lock:
+                _key_locks.pop(key, None)
+
+
+def _store(key, book_format, exported):
+    export_dir, export_name = exported if exported else (None, None)
+    if not export_dir or not export_name:
+        return None
+    exported_file = os.path.join(export_dir, export_name + "." + book_format.lower())
+    if not os.path.isfile(exported_file):
+        log.error("Export of %s not found", exported_file)
+        return None
+
+    cache_dir = get_cache_dir()
+    path = os.path.join(cache_dir, key + "." + book_format.lower())
+    partial = os.path.join(cache_dir, "{}.{}.part".format(key, uuid4()))
+    try:
+        # the temp dir may be on another file system, move next to the entry first and rename atomically
+        shutil.move(exported_file, partial)
+        os.replace(partial, path)
+    except OSError as ex:
+        log.error("Failed to store export in cache: %s", ex)
+        if os.path.exists(partial):
+            os.remove(partial)
+        return None
+    finally:
+        # calibredb export may leave a per-export subdirectory behind
+        if os.path.normpath(export_dir) != os.path.normpath(get_temp_dir()):
+            shutil.rmtree(export_dir, ignore_errors=True)
+    return path
+
+
+def _store_checksum(book_id, book_format, path):
+    # KOReader identifies books by a checksum of the file it downloaded, which is the cached export
+    try:
+        from .progress_syncing import calculate_and_store_checksum
+        calculate_and_store_checksum(book_id=book_id, book_format=book_format, file_path=path)
+    except Exception as e:
+        log.error(f"Failed to calculate/store checksum for book {book_id}: {e}")
+
+
+def evict(max_size=None):
+    """Removes least recently used exports until the cache fits into max_size bytes"""
+    max_size = EXPORT_CACHE_SIZE if max_size is None else max_size
+    cache_dir = get_cache_dir()
+    entries = list()
+    total = 0
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if not entry.is_file() or entry.name.endswith(".part"):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    for __, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError as ex:
+            log.debug("Failed to evict cached export %s: %s", path, ex)
@@ -22,10 +22,11 @@ from uuid import uuid4
 from flask import send_from_directory, make_response, abort, url_for, Response
 from flask_babel import gettext as _
 from flask_babel import lazy_gettext as N_
-from flask_babel import get_locale
+from flask_babel import get_locale, force_locale
 from .cw_login import current_user
 from sqlalchemy.sql.expression import true, false, and_, or_, text, func
 from sqlalchemy.exc import InvalidRequestError, OperationalError
+from sqlalchemy.orm import object_session
 from werkzeug.datastructures import Headers
 from werkzeug.security import generate_password_hash
 from markupsafe import escape
@@ -50,11 +51,15 @@ from .constants import (STATIC_DIR as _STATIC_DIR, CACHE_TYPE_THUMBNAILS, THUMBN
 from .subproc_wrapper import process_wait
 from .services.worker import WorkerThread
 from .tasks.mail import TaskEmail
-from .tasks.thumbnail import TaskClearCoverThumbnailCache, TaskGenerateCoverThumbnails
+from .tasks.thumbnail import (TaskClearCoverThumbnailCache, TaskGenerateCoverThumbnails,
+                              TaskGenerateMissingCoverThumbnails, missing_cover_thumbnails, get_resize_height,
+                              get_resize_width)
 from .tasks.metadata_backup import TaskBackupMetadata
+from .tasks.prewarm import TaskPrewarmExports, pending_prewarm
 from .file_helper import get_temp_dir
 from .epub_helper import get_content_opf, create_new_metadata_backup, updateEpub, replace_metadata
-from .embed_helper import do_calibre_export
+from .embed_helper import do_calibre_export, calibre_export_settings
+from . import export_cache
 
 log = logger.create()
 
@@ -774,61 +779,35 @@ def get_book_cover_with_uuid(book_uuid, resolution=None):
 
 
 def get_book_cover_internal(book, resolution=None):
-    """Serve book cover with improved thumbnail generation fallback.
+    """Serve book cover, preferring a cached thumbnail.
 
-    When a thumbnail is requested but missing, generate it synchronously
-    instead of falling back to the original cover.jpg.
+    Missing thumbnails are never generated inside the request. The closest larger cached thumbnail,
+    or else the original cover (cheaply scaled down when it is much bigger), is served right away and
+    the book is put on the background queue of missing thumbnails.
     """
     if book and book.has_cover:
 
         # Send the book cover thumbnail if it exists in cache
         if resolution:
             cache = fs.FileSystem()
-            # Check for both webp and jpg thumbnails, generate missing ones
-            webp_thumb = get_book_cover_thumbnail_by_format(book, resolution, 'webp')
-            jpg_thumb = get_book_cover_thumbnail_by_format(book, resolution, 'jpg')
-
-            # Check if files actually exist on disk
-            webp_exists = webp_thumb and cache.get_cache_file_exists(webp_thumb.filename, CACHE_TYPE_THUMBNAILS)
-            jpg_exists = jpg_thumb and cache.get_cache_file_exists(jpg_thumb.filename, CACHE_TYPE_THUMBNAILS)
-
-            # Generate missing thumbnails on-demand (skip for Kobo requests to avoid delays)
-            if not webp_exists or not jpg_exists:
-                try:
-                    from flask import has_request_context, request
-                    is_kobo_request = (has_request_context() and
-                                     request.path and
-                                     '/kobo/' in request.path)
-
-                    if not is_kobo_request and use_IM:
-                        from .tasks.thumbnail import TaskGenerateCoverThumbnails
-                        # Create and run thumbnail generation for this book
-                        thumbnail_task = TaskGenerateCoverThumbnails(book_id=book.id)
-                        thumbnail_task.create_book_cover_thumbnails(book)
-
-                        # Refresh thumbnail references after generation
-                        webp_thumb = get_book_cover_thumbnail_by_format(book, resolution, 'webp')
-                        jpg_thumb = get_book_cover_thumbnail_by_format(book, resolution, 'jpg')
-                        webp_exists = webp_thumb and cache.get_cache_file_exists(webp_thumb.filename, CACHE_TYPE_THUMBNAILS)
-                        jpg_exists = jpg_thumb and cache.get_cache_file_exists(jpg_thumb.filename, CACHE_TYPE_THUMBNAILS)
-                except Exception as ex:
-                    log.debug(f'Failed to generate thumbnail on-demand for book {book.id}: {ex}')
-
-            # Determine which thumbnail format to serve based on request context
+            thumbnail_to_serve = None
             try:
                 from flask import has_request_context, request
                 is_kobo_request = (has_request_context() and
-                                 request.path and
-                                 '/kobo/' in request.path)
-
-                # Prefer jpg for Kobo requests, webp for web requests
-                if is_kobo_request:
-                    thumbnail_to_serve = jpg_thumb if jpg_exists else (webp_thumb if webp_exists else None)
-                else:
-                    thumbnail_to_serve = webp_thumb if webp_exists else (jpg_thumb if jpg_exists else None)
-            except:
-                # Fallback if we can't determine request context
-                thumbnail_to_serve = webp_thumb if webp_exists else (jpg_thumb if jpg_exists else None)
+                                   request.path and
+                                   '/kobo/' in request.path)
+            except Exception:
+                is_kobo_request = False
+            # Prefer jpg for Kobo requests, webp for web requests
+            preferred_format = 'jpg' if is_kobo_request else 'webp'
+
+            available = [thumbnail for thumbnail in get_book_cover_thumbnails(book)
+                         if thumbnail.resolution >= resolution
+                         and cache.get_cache_file_exists(thumbnail.filename, CACHE_TYPE_THUMBNAILS)]
+            if not any(thumbnail.resolution == resolution for thumbnail in available):
+                queue_missing_cover_thumbnails(book.id)
+            if available:
+                thumbnail_to_serve = min(available, key=lambda t: (t.resolution, t.format != preferred_format))
             if thumbnail_to_serve:
                 return send_from_directory(cache.get_cache_file_dir(thumbnail_to_serve.filename, CACHE_TYPE_THUMBNAILS),
                                            thumbnail_to_serve.filename)
@@ -852,6 +831,10 @@ def get_book_cover_internal(book, resolution=None):
         else:
             cover_file_path = os.path.join(config.get_book_path(), book.path)
             if os.path.isfile(os.path.join(cover_file_path, "cover.jpg")):
+                if resolution:
+                    scaled_cover = get_scaled_cover(os.path.join(cover_file_path, "cover.jpg"), resolution)
+                    if scaled_cover:
+                        return Response(scaled_cover, mimetype='image/jpeg')
                 return send_from_directory(cover_file_path, "cover.jpg")
             else:
                 return get_cover_on_failure()
@@ -859,26 +842,51 @@ def get_book_cover_internal(book, resolution=None):
         return get_cover_on_failure()
 
 
-def get_book_cover_thumbnail(book, resolution):
-    if book and book.has_cover:
-        return (ub.session
-                .query(ub.Thumbnail)
-                .filter(ub.Thumbnail.type == THUMBNAIL_TYPE_COVER)
-                .filter(ub.Thumbnail.entity_id == book.id)
-                .filter(ub.Thumbnail.resolution == resolution)
-                .filter(or_(ub.Thumbnail.expiration.is_(None), ub.Thumbnail.expiration > datetime.now(timezone.utc)))
-                .first())
+def get_scaled_cover(cover_path, resolution):
+    """Scales a cover that is much larger than the requested thumbnail down for a single response.
+
+    JPEG covers are decoded at a reduced size straight away and then sampled, which is far cheaper than
+    the quality resize of the thumbnail task. Returns None when the original is small enough to be sent as is.
+    """
+    if not use_IM:
+        return None
+    try:
+        height = get_resize_height(resolution)
+        with Image() as probe:
+            probe.ping(filename=cover_path)
+            original_width, original_height = probe.width, probe.height
+        if original_height <= height * 2:
+            return None
+        width = get_resize_width(resolution, original_width, original_height)
+        with Image() as img:
+            img.options['jpeg:size'] = '{}x{}'.format(width, height)
+            img.read(filename=cover_path)
+            img.sample(width, height)
+            img.format = 'jpeg'
+            img.compression_quality = 75
+            return img.make_blob()
+    except Exception as ex:
+        log.debug('Failed to scale cover {}: {}'.format(cover_path, ex))
+        return None
 
 
-def get_book_cover_thumbnail_by_format(book, resolution, format):
-    """Get thumbnail for specific book, resolution, and format (webp/jpg)"""
+def get_book_cover_thumbnails(book):
+    """All cached thumbnails of the book's cover, in every resolution and format"""
+    return (ub.session
+            .query(ub.Thumbnail)
+            .filter(ub.Thumbnail.type == THUMBNAIL_TYPE_COVER)
+            .filter(ub.Thumbnail.entity_id == book.id)
+            .filter(or_(ub.Thumbnail.expiration.is_(None), ub.Thumbnail.expiration > datetime.now(timezone.utc)))
+            .all())
+
+
+def get_book_cover_thumbnail(book, resolution):
     if book and book.has_cover:
         return (ub.session
                 .query(ub.Thumbnail)
                 .filter(ub.Thumbnail.type == THUMBNAIL_TYPE_COVER)
                 .filter(ub.Thumbnail.entity_id == book.id)
                 .filter(ub.Thumbnail.resolution == resolution)
-                .filter(ub.Thumbnail.format == format)
                 .filter(or_(ub.Thumbnail.expiration.is_(None), ub.Thumbnail.expiration > datetime.now(timezone.utc)))
                 .first())
 
@@ -1048,103 +1056,89 @@ def save_cover_with_thumbnail_update(img, book_path, book_id=None):
 
 def do_download_file(book, book_format, client, data, headers):
     book_name = data.name
-    download_name = filename = None
-    metadata_was_embedded = False  # Track if we embedded metadata
+    embed_metadata = config.config_embed_metadata and (
+        (book_format == "kepub" and config.config_kepubifypath) or
+        (book_format != "kepub" and config.config_binariesdir))
 
     if config.config_use_google_drive:
         # startTime = time.time()
         df = gd.getFileFromEbooksFolder(book.path, data.name + "." + book_format)
         # log.debug('%s', time.time() - startTime)
-        if df:
-            if config.config_embed_metadata and (
-                 (book_format == "kepub" and config.config_kepubifypath) or
-                 (book_format != "kepub" and config.config_binariesdir)):
-                output_path = os.path.join(config.config_calibre_dir, book.path)
-                if not os.path.exists(output_path):
-                    os.makedirs(output_path)
-                output = os.path.join(config.config_calibre_dir, book.path, book_name + "." + book_format)
-                gd.downloadFile(book.path, book_name + "." + book_format, output)
-                if book_format == "kepub" and config.config_kepubifypath:
-                    filename, download_name = do_kepubify_metadata_replace(book, output)
-                    metadata_was_embedded = True
-                elif book_format != "kepub" and config.config_binariesdir:
-                    filename, download_name = do_calibre_export(book.id, book_format)
-                    metadata_was_embedded = True
-            else:
-                return gd.do_gdrive_download(df, headers)
-        else:
+        if not df:
             abort(404)
+        if not embed_metadata:
+            return gd.do_gdrive_download(df, headers)
+
+        def get_book_file():
+            output_path = os.path.join(config.config_calibre_dir, book.path)
+            if not os.path.exists(output_path):
+                os.makedirs(output_path)
+            output = os.path.join(config.config_calibre_dir, book.path, book_name + "." + book_format)
+            gd.downloadFile(book.path, book_name + "." + book_format, output)
+            return output
+
+        exported_file = get_embedded_export(book, book_format, get_book_file)
+        if not exported_file:
+            return gd.do_gdrive_download(df, headers)
+        response = make_response(send_from_directory(os.path.dirname(exported_file),
+                                                     os.path.basename(exported_file)))
     else:
-        filename = os.path.join(config.get_book_path(), book.path)
-        if not os.path.isfile(os.path.join(filename, book_name + "." + book_format)):
+        book_dir = os.path.join(config.get_book_path(), book.path)
+        book_file = os.path.join(book_dir, book_name + "." + book_format)
+        if not os.path.isfile(book_file):
             # ToDo: improve error handling
-            log.error('File not found: %s', os.path.join(filename, book_name + "." + book_format))
+            log.error('File not found: %s', book_file)
 
         if client == "kobo" and book_format == "kepub":
             headers["Content-Disposition"] = headers["Content-Disposition"].replace(".kepub", ".kepub.epub")
 
-        if book_format == "kepub" and config.config_kepubifypath and config.config_embed_metadata:
-            filename, download_name = do_kepubify_metadata_replace(book, os.path.join(filename,
-                                                                                      book_name + "." + book_format))
-            metadata_was_embedded = True
-        elif book_format != "kepub" and config.config_binariesdir and config.config_embed_metadata:
-            filename, download_name = do_calibre_export(book.id, book_format)
-            metadata_was_embedded = True
-
-            # Rename the exported file to match the expected download name (from Content-Disposition)
-            # This ensures KOReader calculates the checksum on the same file we calculated it on
-            if filename and download_name:
-                uuid_file = os.path.join(filename, download_name + "." + book_format)
-                expected_file = os.path.join(filename, book_name + "." + book_format)
-
-                if os.path.exists(uuid_file) and uuid_file != expected_file:
-                    try:
-                        # Remove the target file if it already exists
-                        if os.path.exists(expected_file):
-                            os.remove(expected_file)
-                        # Rename UUID file to expected name
-                        os.rename(uuid_file, expected_file)
-                        download_name = book_name
-                        log.info(f'Renamed exported file to match expected name: {book_name}.{book_format}')
-                    except Exception as e:
-                        log.error(f'Failed to rename exported file: {e}')
+        exported_file = get_embedded_export(book, book_format, lambda: book_file) if embed_metadata else None
+        if exported_file:
+            response = make_response(send_from_directory(os.path.dirname(exported_file),
+                                                         os.path.basename(exported_file)))
         else:
-            download_name = book_name
+            response = make_response(send_from_directory(book_dir, book_name + "." + book_format))
 
-    # Calculate and store checksum if metadata was embedded
-    if metadata_was_embedded and filename and download_name:
-        try:
-            from .progress_syncing import calculate_and_store_checksum
-
-            # Calculate checksum on the EXPORTED file (with embedded metadata)
-            # This is what KOReader actually downloads and calculates the checksum for
-            exported_file = os.path.join(filename, download_name + "." + book_format)
-
-            if os.path.exists(exported_file):
-                calculate_and_store_checksum(
-                    book_id=book.id,
-                    book_format=book_format,
-                    file_path=exported_file  # Use exported file with embedded metadata!
-                )
-        except Exception as e:
-            log.error(f"Failed to calculate/store checksum for book {book.id}: {e}")
-            # Don't fail the download if checksum calculation fails
-
-    response = make_response(send_from_directory(filename, download_name + "." + book_format))
     # ToDo Check headers parameter
     for element in headers:
         response.headers[element[0]] = element[1]
     return response
 
 
-def do_kepubify_metadata_replace(book, file_path):
-    custom_columns = (calibre_db.session.query(db.CustomColumns)
+def get_embedded_export(book, book_format, get_book_file, export_language=None, translated_cover_name=None):
+    """Returns the path of the book with embedded metadata, or None if the export failed.
+
+    Exports are served from the export cache, which also stores the KOReader checksum of each new export.
+    get_book_file() returns the path of the stored book file and is only called on a cache miss. KEPUB
+    metadata is written in export_language with translated_cover_name, those of the current user by default.
+    """
+    if book_format == "kepub":
+        export_language = export_language or current_user.locale
+        translated_cover_name = str(translated_cover_name or _("Cover"))
+        settings = ("kepubify", config.config_kepubifypath, export_language, translated_cover_name)
+
+        def export():
+            return do_kepubify_metadata_replace(book, get_book_file(), export_language, translated_cover_name)
+    else:
+        settings = calibre_export_settings()
+
+        def export():
+            get_book_file()
+            return do_calibre_export(book.id, book_format)
+
+    return export_cache.get_export(book.id, book_format, book.last_modified, settings, export)
+
+
+def do_kepubify_metadata_replace(book, file_path, export_language=None, translated_cover_name=None):
+    # Query through the book's own session, background tasks load books in a session of their own
+    custom_columns = ((object_session(book) or calibre_db.session).query(db.CustomColumns)
                       .filter(db.CustomColumns.mark_for_delete == 0)
                       .filter(db.CustomColumns.datatype.notin_(db.cc_exceptions))
                       .order_by(db.CustomColumns.label).all())
 
     tree, cf_name = get_content_opf(file_path)
-    package = create_new_metadata_backup(book, custom_columns, current_user.locale, _("Cover"), lang_type=2)
+    package = create_new_metadata_backup(book, custom_columns, export_language or current_user.locale,
+                                         translated_cover_name or _("Cover"), lang_type=2)
     content = replace_metadata(tree, package)
     tmp_dir = get_temp_dir()
     temp_file_name = str(uuid4())
@@ -1311,6 +1305,24 @@ def add_book_to_thumbnail_cache(book_id):
     WorkerThread.add(None, TaskGenerateCoverThumbnails(book_id), hidden=True)
 
 
+def queue_missing_cover_thumbnails(book_id):
+    # Covers requested without thumbnails share one background task, requests never wait for them
+    if use_IM and missing_cover_thumbnails.add(book_id):
+        WorkerThread.add(None, TaskGenerateMissingCoverThumbnails(), hidden=True)
+
+
+def prewarm_embedded_exports(book_ids=None):
+    # Prepare the exports devices are going to download, book_ids None checks the whole sync set
+    if not config.config_embed_metadata or config.config_use_google_drive:
+        return
+    if pending_prewarm.add(book_ids):
+        cover_names = dict()
+        for locale, in ub.session.query(ub.User.locale).distinct():
+            with force_locale(locale or "en"):
+                cover_names[locale] = str(_("Cover"))
+        WorkerThread.add(None, TaskPrewarmExports(cover_names), hidden=True)
+
+
 def update_thumbnail_cache():
     # Always allow manual thumbnail cache updates
     task = TaskGenerateCoverThumbnails()
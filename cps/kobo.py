@@ -11,7 +11,8 @@ from datetime import datetime, timezone
 import os
 import uuid
 import zipfile
-from time import gmtime, strftime
+import threading
+from time import gmtime, strftime, perf_counter
 import json
 from urllib.parse import unquote
 
@@ -56,6 +57,51 @@ kobo_auth.register_url_value_preprocessor(kobo)
 log = logger.create()
 
 
+class SyncStats:
+    """Running totals of what library sync requests cost since the server started.
+    Served to admins as JSON by cwa_functions.cwa_kobo_sync_stats"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.syncs = 0
+        self.reconnects = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.reconnect_ms = 0.0
+        self.last = None
+
+    def record(self, user_id, duration_ms, reconnect_ms, reconnected, num_results):
+        with self._lock:
+            self.syncs += 1
+            self.total_ms += duration_ms
+            self.max_ms = max(self.max_ms, duration_ms)
+            if reconnected:
+                self.reconnects += 1
+                self.reconnect_ms += reconnect_ms
+            self.last = {
+                "user_id": user_id,
+                "at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "duration_ms": round(duration_ms, 1),
+                "reconnected": reconnected,
+                "reconnect_ms": round(reconnect_ms, 1),
+                "results": num_results,
+            }
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "syncs": self.syncs,
+                "library_reconnects": self.reconnects,
+                "avg_ms": round(self.total_ms / self.syncs, 1) if self.syncs else 0.0,
+                "max_ms": round(self.max_ms, 1),
+                "avg_reconnect_ms": round(self.reconnect_ms / self.reconnects, 1) if self.reconnects else 0.0,
+                "last": self.last,
+            }
+
+
+sync_stats = SyncStats()
+
+
 def get_store_url_for_current_request():
     # Programmatically modify the current url to point to the official Kobo store
     __, __, request_path_with_auth_token = request.full_path.rpartition("/kobo/")
@@ -134,6 +180,7 @@ def HandleSyncRequest():
         log.info("Users need download permissions for syncing library to Kobo reader")
         return abort(403)
 
+    sync_started = perf_counter()
     sync_token = SyncToken.SyncToken.from_headers(request.headers)
     log.info("Kobo library sync request received")
     log.debug("SyncToken: {}".format(sync_token))
@@ -154,7 +201,10 @@ def HandleSyncRequest():
     new_archived_last_modified = datetime.min
     sync_results = []
 
-    calibre_db.reconnect_db(config, ub.app_DB_path)
+    # Only rebuild the engine (which drops every other request's session) if the library changed since the last sync
+    reconnect_started = perf_counter()
+    reconnected = calibre_db.reconnect_db_if_changed(config, ub.app_DB_path)
+    reconnect_ms = (perf_counter() - reconnect_started) * 1000
 
 
     # Two-Way-Sync Deletion Logic
@@ -333,7 +383,13 @@ def HandleSyncRequest():
     sync_token.archive_last_modified = new_archived_last_modified
     sync_token.reading_state_last_modified = new_reading_state_last_modified
 
-    return generate_sync_response(sync_token, sync_results, cont_sync)
+    response = generate_sync_response(sync_token, sync_results, cont_sync)
+    sync_ms = (perf_counter() - sync_started) * 1000
+    sync_stats.record(current_user.id, sync_ms, reconnect_ms, reconnected, len(sync_results))
+    response.headers["Server-Timing"] = "db-reconnect;dur={:.1f}, sync;dur={:.1f}".format(reconnect_ms, sync_ms)
+    log.debug("Kobo library sync took {:.1f}ms (library {} in {:.1f}ms)".format(
+        sync_ms, "reconnected" if reconnected else "unchanged", reconnect_ms))
+    return response
 
 
 def generate_sync_response(sync_token, sync_results, set_cont=False):
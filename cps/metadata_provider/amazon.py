@@ -16,7 +16,7 @@ try:
 except ImportError:
     pass
 
-from cps.services.Metadata import MetaRecord, MetaSourceInfo, Metadata
+from cps.services.Metadata import MetaRecord, MetaSourceInfo, Metadata, detail_executor
 import cps.logger as logger
 
 #from time import time
@@ -195,12 +195,11 @@ class Amazon(Metadata):
             if len(links_list) == 0:
                 log.info(f"No Amazon search results found for query: {query}")
                 return []
-            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                fut = {executor.submit(inner, link, index) for index, link in enumerate(links_list[:3])}
-                try:
-                    val = list(map(lambda x : x.result(), concurrent.futures.as_completed(fut, timeout=15)))
-                except concurrent.futures.TimeoutError:
-                    log.warning("Amazon search timeout after 15 seconds")
-                    val = []
+            fut = {detail_executor.submit(inner, link, index) for index, link in enumerate(links_list[:3])}
+            try:
+                val = list(map(lambda x : x.result(), concurrent.futures.as_completed(fut, timeout=15)))
+            except concurrent.futures.TimeoutError:
+                log.warning("Amazon search timeout after 15 seconds")
+                val = []
         result = list(filter(lambda x: x, val))
         return [x[0] for x in sorted(result, key=itemgetter(1))] #sort by amazons listing order for best relevance
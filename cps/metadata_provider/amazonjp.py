@@ -20,7 +20,7 @@ try:
 except ImportError:
     pass
 
-from cps.services.Metadata import MetaRecord, MetaSourceInfo, Metadata
+from cps.services.Metadata import MetaRecord, MetaSourceInfo, Metadata, detail_executor
 import cps.logger as logger
 from operator import itemgetter
 log = logger.create()
@@ -108,13 +108,12 @@ class AmazonJp(Metadata):
             soup = BS(results.text, 'html.parser')
             links_list = [next(filter(lambda i: "digital-text" in i["href"], x.findAll("a")))["href"] for x in
                           soup.findAll("div", attrs={"data-component-type": "s-search-result"})]
-            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                fut = {executor.submit(inner, link, index) for index, link in enumerate(links_list[:10])}
-                try:
-                    val = list(map(lambda x : x.result(), concurrent.futures.as_completed(fut, timeout=15)))
-                except concurrent.futures.TimeoutError:
-                    log.warning("Amazon search timeout after 15 seconds")
-                    val = []
+            fut = {detail_executor.submit(inner, link, index) for index, link in enumerate(links_list[:10])}
+            try:
+                val = list(map(lambda x : x.result(), concurrent.futures.as_completed(fut, timeout=15)))
+            except concurrent.futures.TimeoutError:
+                log.warning("Amazon search timeout after 15 seconds")
+                val = []
         result = list(filter(lambda x: x, val))
         return [x[0] for x in sorted(result, key=itemgetter(1))] #sort by amazons listing order for best relevance
 
@@ -21,7 +21,6 @@ from cps import logger, constants
 from cps.services.Metadata import MetaRecord, MetaSourceInfo, Metadata
 
 from cps import isoLanguages
-from flask_babel import get_locale
 
 log = logger.create()
 
@@ -87,7 +86,7 @@ class DNB(Metadata):
                     log.info("Parsing DNB records")
 
                     for record in results:
-                        book_data = self._parse_marc21_record(record)
+                        book_data = self._parse_marc21_record(record, locale)
                         if book_data:
                             meta_record = self._create_meta_record(book_data, generic_cover)
                             if meta_record:
@@ -158,7 +157,7 @@ class DNB(Metadata):
         log.info(f'DNB Query URL: {query_url}')
 
         try:
-            response = requests.get(query_url, headers=headers, timeout=timeout)
+            response = self.get_session().get(query_url, headers=headers, timeout=timeout)
             response.raise_for_status()
 
             xml_data = etree.XML(response.content)
@@ -176,7 +175,7 @@ class DNB(Metadata):
             log.error(f'DNB query error: {e}')
             return []  # Return empty list, not None
 
-    def _parse_marc21_record(self, record):
+    def _parse_marc21_record(self, record, locale):
         """Parse MARC21 XML record into book data"""
         ns = {'marc21': 'http://www.loc.gov/MARC21/slim'}
 
@@ -235,7 +234,7 @@ class DNB(Metadata):
         self._extract_subjects(record, book, ns)
 
         # Extract languages from field 041
-        self._extract_languages(record, book, ns)
+        self._extract_languages(record, book, ns, locale)
 
         # Extract comments from field 856
         self._extract_comments(record, book, ns)
@@ -383,7 +382,7 @@ class DNB(Metadata):
             # lang_code = self._iso639_2b_as_iso639_3(i.text.strip())
             # book['languages'].append(lang_code)
 
-    def _extract_languages(self, record, book, ns):
+    def _extract_languages(self, record, book, ns, locale):
         """Extract languages from MARC21 field 041"""
         raw_languages = []
         for i in record.xpath("./marc21:datafield[@tag='041']/marc21:subfield[@code='a']", namespaces=ns):
@@ -393,7 +392,7 @@ class DNB(Metadata):
                 lang_code = 'deu'
 
             # Convert ISO code to English language name
-            language_name = isoLanguages.get_language_name(get_locale(), lang_code)
+            language_name = isoLanguages.get_language_name(locale, lang_code)
             if language_name != "Unknown":
                 raw_languages.append(language_name)
                 #log.info(f"Converted {lang_code} to {language_name}")
@@ -408,7 +407,7 @@ class DNB(Metadata):
             url = url_elem.text.strip()
             if url.startswith("http://deposit.dnb.de/") or url.startswith("https://deposit.dnb.de/"):
                 try:
-                    response = requests.get(url, timeout=15)
+                    response = self.get_session().get(url, timeout=15)
                     response.raise_for_status()
 
                     comments_text = response.text
@@ -439,7 +438,7 @@ class DNB(Metadata):
 
         try:
             # Test the actual response from DNB
-            response = requests.head(cover_url, timeout=10)
+            response = self.get_session().head(cover_url, timeout=10)
             #log.info(f"DNB cover response status: {response.status_code}")
             #log.info(f"DNB cover content-type: {response.headers.get('content-type')}")
 
@@ -481,7 +480,7 @@ class DNB(Metadata):
         cover_url = self.COVERURL % book_data['isbn']
 
         try:
-            response = requests.get(cover_url, timeout=10)
+            response = self.get_session().get(cover_url, timeout=10)
             response.raise_for_status()
 
             content_type = response.headers.get('content-type').lower()
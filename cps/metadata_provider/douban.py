@@ -14,7 +14,7 @@ from html2text import HTML2Text
 from lxml import etree
 
 from cps import logger
-from cps.services.Metadata import Metadata, MetaRecord, MetaSourceInfo
+from cps.services.Metadata import Metadata, MetaRecord, MetaSourceInfo, detail_executor
 
 log = logger.create()
 
@@ -75,18 +75,15 @@ class Douban(Metadata):
                 log.debug("No search results in Douban")
                 return []
 
-            with futures.ThreadPoolExecutor(
-                    max_workers=5, thread_name_prefix='douban') as executor:
+            fut = [
+                detail_executor.submit(self._parse_single_book, book_id,
+                                       generic_cover) for book_id in book_id_list
+            ]
 
-                fut = [
-                    executor.submit(self._parse_single_book, book_id,
-                                    generic_cover) for book_id in book_id_list
-                ]
-
-                val = [
-                    future.result() for future in futures.as_completed(fut)
-                    if future.result()
-                ]
+            val = [
+                future.result() for future in futures.as_completed(fut)
+                if future.result()
+            ]
 
         return val
 
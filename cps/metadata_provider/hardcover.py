@@ -10,6 +10,7 @@
 
 # Hardcover api document: https://Hardcover.gamespot.com/api/documentation
 """
+import functools
 from typing import Dict, List, Optional, Union
 
 import requests
@@ -128,15 +129,19 @@ class Hardcover(Metadata):
         "} }"
     )
 
+    def request_search(self):
+        return functools.partial(self.search, user_token=getattr(current_user, "hardcover_token", None))
+
     def search(
-        self, query: str, generic_cover: str = "", locale: str = "en"
+        self, query: str, generic_cover: str = "", locale: str = "en", user_token: Optional[str] = None
     ) -> Optional[List[MetaRecord]]:
         val: List[MetaRecord] = []
         if not self.active:
             return val
 
         token = (
-            getattr(current_user, "hardcover_token", None)
+            user_token
+            or getattr(current_user, "hardcover_token", None)
             or getattr(config, "config_hardcover_token", None)
             or getenv("HARDCOVER_TOKEN")
         )
@@ -147,7 +152,7 @@ class Hardcover(Metadata):
         try:
             edition_search = query.split(":")[0] == "hardcover-id"
             Hardcover.HEADERS["Authorization"] = "Bearer %s" % token.replace("Bearer ", "")
-            resp = requests.post(
+            resp = self.get_session().post(
                 Hardcover.BASE_URL,
                 json={
                     "query": Hardcover.EDITION_QUERY if edition_search else Hardcover.SEARCH_QUERY,
@@ -10,8 +10,6 @@ from typing import Dict, List, Optional
 from urllib.parse import quote
 from datetime import datetime
 
-import requests
-
 from cps import logger
 from cps.isoLanguages import get_lang3, get_language_name
 from cps.services.Metadata import MetaRecord, MetaSourceInfo, Metadata
@@ -38,7 +36,7 @@ class IBDb(Metadata):
                 tokens = [quote(t.encode("utf-8")) for t in title_tokens]
                 query = "+".join(tokens)
             try:
-                results = requests.get(IBDb.SEARCH_URL + query, timeout=15)
+                results = self.get_session().get(IBDb.SEARCH_URL + query, timeout=15)
                 results.raise_for_status()
             except Exception as e:
                 log.warning(e)
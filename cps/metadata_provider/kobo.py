@@ -23,7 +23,7 @@ from bs4 import BeautifulSoup as BS
 from bs4.element import Tag
 from cps import logger
 from cps.isoLanguages import get_lang3, get_language_name
-from cps.services.Metadata import MetaRecord, MetaSourceInfo, Metadata
+from cps.services.Metadata import MetaRecord, MetaSourceInfo, Metadata, detail_executor
 
 log = logger.create()
 
@@ -203,15 +203,14 @@ class Kobo(Metadata):
         if not links:
             return []
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-            futs = {executor.submit(fetch_and_parse, link, i): i for i, link in enumerate(links)}
-            try:
-                for fut in concurrent.futures.as_completed(futs, timeout=self.DETAIL_TIMEOUT):
-                    item = fut.result()
-                    if item:
-                        results.append(item)
-            except concurrent.futures.TimeoutError:
-                log.warning("Kobo search detail timeout after %ss", self.DETAIL_TIMEOUT)
+        futs = {detail_executor.submit(fetch_and_parse, link, i): i for i, link in enumerate(links)}
+        try:
+            for fut in concurrent.futures.as_completed(futs, timeout=self.DETAIL_TIMEOUT):
+                item = fut.result()
+                if item:
+                    results.append(item)
+        except concurrent.futures.TimeoutError:
+            log.warning("Kobo search detail timeout after %ss", self.DETAIL_TIMEOUT)
 
         results.sort(key=lambda x: x[1])
         return [x[0] for x in results]
@@ -18,7 +18,8 @@ from .manager import (
     store_checksum,
     calculate_and_store_checksum,
     get_latest_checksum,
-    get_checksum_history
+    get_checksum_history,
+    checksum_lookup_cache
 )
 
 __all__ = [
@@ -28,4 +29,5 @@ __all__ = [
     'calculate_and_store_checksum',
     'get_latest_checksum',
     'get_checksum_history',
+    'checksum_lookup_cache',
 ]
@@ -22,6 +22,9 @@ together and any can be matched for sync purposes.
 """
 
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 from typing import Optional, List, Tuple
 
@@ -30,13 +33,70 @@ from .koreader import calculate_koreader_partial_md5, CHECKSUM_VERSION
 
 log = logger.create()
 
+# Checksum lookup cache settings
+LOOKUP_CACHE_TTL = 300  # seconds
+LOOKUP_CACHE_SIZE = 1024
+
+
+class ChecksumLookupCache:
+    """
+    In-process LRU of checksum -> book lookups for KOSync.
+
+    Every progress pull and push looks the document checksum up, usually for the same handful of books.
+    Only matches are cached: checksums stored by other processes (ingest, the checksum generator) would
+    otherwise stay invisible until a cached miss expired. store_checksum() drops the entries for a checksum
+    it writes, and entries expire after a few minutes so renamed or deleted books are picked up.
+    """
+
+    def __init__(self, ttl: int = LOOKUP_CACHE_TTL, max_size: int = LOOKUP_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[str, Optional[str]], Tuple[tuple, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, checksum: str, version: Optional[str] = None) -> Optional[tuple]:
+        """Return the cached lookup result, or None if it needs looking up"""
+        key = (checksum, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def add(self, checksum: str, version: Optional[str], result: tuple) -> None:
+        """Remember the lookup result for a checksum"""
+        key = (checksum, version)
+        with self._lock:
+            self._entries[key] = (result, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, checksum: str) -> None:
+        """Drop every cached lookup of a checksum, whatever version it was filtered by"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == checksum]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+checksum_lookup_cache = ChecksumLookupCache()
+
 
 def store_checksum(
     book_id: int,
     book_format: str,
     checksum: str,
     version: str = CHECKSUM_VERSION,
-    db_connection=None
+    db_connection=None,
+    commit: bool = True
 ) -> bool:
     """
     Store a checksum in the database with history tracking.
@@ -50,6 +110,7 @@ def store_checksum(
         checksum: MD5 checksum string
         version: Algorithm version identifier
         db_connection: Optional SQLAlchemy connection (uses calibre_db if None)
+        commit: Commit straight away, pass False to commit a batch of checksums at once
 
     Returns:
         True if successful, False otherwise
@@ -117,7 +178,9 @@ def store_checksum(
                     VALUES (?, ?, ?, ?, ?)
                 ''', (book_id, book_format.upper(), checksum, version, timestamp))
 
-            db_connection.commit()
+            if commit:
+                db_connection.commit()
+            checksum_lookup_cache.invalidate(checksum)
             return True
 
         finally:
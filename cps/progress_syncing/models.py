@@ -136,9 +136,16 @@ def ensure_checksum_table(conn):
             execute_sql(f"CREATE INDEX {table_prefix}idx_checksum_version ON book_format_checksums(checksum, version)")
             execute_sql(f"CREATE INDEX {table_prefix}idx_book_format ON book_format_checksums(book, format)")
             execute_sql(f"CREATE INDEX {table_prefix}idx_created ON book_format_checksums(created)")
-            conn.commit()
             log.info(f"Created {table_name} table with indexes")
 
+        # Covering index for KOSync lookups, answers checksum -> latest (book, format, version) from the
+        # index alone. Also added to tables created before it existed.
+        execute_sql(
+            f"CREATE INDEX IF NOT EXISTS {table_prefix}idx_checksum_lookup "
+            f"ON book_format_checksums(checksum, created, version, book, format)"
+        )
+        conn.commit()
+
     except Exception as e:
         log.error(f"Could not create book_format_checksums table: {e}")
         import traceback
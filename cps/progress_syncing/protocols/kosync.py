@@ -37,6 +37,12 @@ Reference: https://github.com/koreader/koreader-sync-server
 """
 
 import base64
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 from typing import Dict, Optional, Any, Tuple
 
@@ -49,6 +55,7 @@ from sqlalchemy.exc import SQLAlchemyError
 from ... import logger, ub, csrf, config, constants, services
 from ...render_template import render_title_template
 from ..models import KOSyncProgress
+from ..checksums import checksum_lookup_cache
 
 log = logger.create()
 
@@ -76,6 +83,10 @@ MAX_PROGRESS_LENGTH = 255  # Maximum progress string length
 MAX_DEVICE_LENGTH = 100    # Maximum device name length
 MAX_DEVICE_ID_LENGTH = 100 # Maximum device ID length
 
+# Credential verification cache
+AUTH_CACHE_TTL = 300       # Seconds a successful verification is reused
+AUTH_CACHE_SIZE = 256      # Maximum number of cached verifications
+
 
 class KOSyncError(Exception):
     """Custom exception for KOSync protocol errors"""
@@ -115,6 +126,75 @@ def is_valid_key_field(field: Any, max_length: int = MAX_DOCUMENT_LENGTH) -> boo
     return is_valid_field(field) and ":" not in field and len(field) <= max_length
 
 
+class CredentialCache:
+    """
+    Short-lived cache of successful Basic Auth verifications.
+
+    KOReader sends credentials with every progress update, and verifying them means a full password
+    hash (or an LDAP bind) each time. Entries are keyed on an HMAC of the credentials with a per-process
+    key, so no password is ever held, and remember the user's password hash at verification time. An entry
+    only counts when that user still exists with the same hash, so a changed password or a deleted user
+    invalidates it straight away. LDAP passwords changed on the directory side are picked up once the
+    entry expires.
+    """
+
+    def __init__(self, ttl: int = AUTH_CACHE_TTL, max_size: int = AUTH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._key = secrets.token_bytes(32)
+        self._entries: "OrderedDict[bytes, Tuple[int, str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, username: str, password: str) -> bytes:
+        message = username.lower().encode('utf-8') + b'\0' + password.encode('utf-8')
+        return hmac.new(self._key, message, hashlib.sha256).digest()
+
+    def get(self, username: str, password: str) -> Optional[ub.User]:
+        """Return the user these credentials were verified for, or None if they need verifying"""
+        digest = self._digest(username, password)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry[2] < time.monotonic():
+                del self._entries[digest]
+                entry = None
+        user = None
+        if entry is not None:
+            user_id, password_hash, _ = entry
+            try:
+                user = ub.session.get(ub.User, user_id)
+            except SQLAlchemyError as e:
+                log.error(f"Database error during cached user lookup: {e}")
+            if user is None or str(user.password) != password_hash:
+                user = None
+                with self._lock:
+                    self._entries.pop(digest, None)
+        with self._lock:
+            if user is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(digest)
+        return user
+
+    def add(self, username: str, password: str, user: ub.User) -> None:
+        """Remember a successful verification"""
+        digest = self._digest(username, password)
+        with self._lock:
+            self._entries[digest] = (user.id, str(user.password), time.monotonic() + self.ttl)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+credential_cache = CredentialCache()
+
+
 def authenticate_user() -> Optional[ub.User]:
     """
     Authenticate user using HTTP Basic Authentication (RFC 7617).
@@ -125,6 +205,7 @@ def authenticate_user() -> Optional[ub.User]:
         - Uses constant-time password comparison via check_password_hash
         - Case-insensitive username lookup for consistency with Calibre-Web
         - Validates credential format before database lookup
+        - Successful verifications are reused for a few minutes via credential_cache
 
     Returns:
         User object if authentication succeeds, None otherwise
@@ -156,6 +237,10 @@ def authenticate_user() -> Optional[ub.User]:
         log.debug(f"Invalid username or password format")
         return None
 
+    user = credential_cache.get(username, password)
+    if user:
+        return user
+
     # Find user by username (case-insensitive for Calibre-Web compatibility)
     try:
         user = ub.session.query(ub.User).filter(
@@ -175,6 +260,7 @@ def authenticate_user() -> Optional[ub.User]:
         login_result, error = services.ldap.bind_user(user.name, password)
         if login_result:
             log.info(f"authenticate_user: Successfully authenticated user via LDAP: {user.name}")
+            credential_cache.add(username, password, user)
             return user
         
         # Log LDAP failure but continue to local check (fallback)
@@ -186,6 +272,7 @@ def authenticate_user() -> Optional[ub.User]:
     # Check if user has a local password set before attempting verification
     if user.password and check_password_hash(str(user.password), password):
         log.info(f"User authenticated successfully: {username}")
+        credential_cache.add(username, password, user)
         return user
 
     log.debug(f"Invalid password for user: {username}")
@@ -241,10 +328,15 @@ def get_book_by_checksum(document_checksum: str, version: str = None):
     Note:
         Uses parameterized queries to prevent SQL injection.
         Orders by created DESC (latest first), then version DESC.
+        Matches are served from checksum_lookup_cache for a few minutes.
     """
     from ... import calibre_db
     from ...db import BookFormatChecksum, Books
 
+    cached = checksum_lookup_cache.get(document_checksum, version)
+    if cached is not None:
+        return cached
+
     try:
         query = calibre_db.session.query(
             BookFormatChecksum.book,
@@ -273,7 +365,9 @@ def get_book_by_checksum(document_checksum: str, version: str = None):
         if result:
             book_id, book_format, checksum_version, book_title, book_path = result
             log.debug(f"Found book match: {book_title} (ID {book_id}, format {book_format}, checksum v{checksum_version})")
-            return book_id, book_format, book_title, book_path, checksum_version
+            match = (book_id, book_format, book_title, book_path, checksum_version)
+            checksum_lookup_cache.add(document_checksum, version, match)
+            return match
 
         # No match found
         log.debug(f"No book found for checksum: {document_checksum}")
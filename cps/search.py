@@ -357,10 +357,8 @@ def render_adv_search_results(term, offset=None, order=None, limit=None):
         pagination = Pagination(page=1, per_page=limit, total_count=result_count)
         results = q.all()
 
-    # Note: store_combo_ids will now only contain the IDs of the currently visible page.
-    # This improves performance drastically for large search results, but affects
-    # functionality that relies on having all search result IDs (e.g., "download all").
-    ub.store_combo_ids(results)
+    # Keep the ids of the whole result for adding it to a shelf, fetched without loading the books
+    ub.store_book_ids(book_id for book_id, in q.with_entities(db.Books.id).yield_per(1000))
 
     entries = calibre_db.order_authors(results, list_return=True, combined=True)
     return render_title_template('search.html',
@@ -11,8 +11,11 @@ import inspect
 import json
 import os
 import sys
+import threading
+import time
+from collections import OrderedDict
 
-from flask import Blueprint, request, url_for, make_response, jsonify, copy_current_request_context
+from flask import Blueprint, request, url_for, make_response, jsonify
 from .cw_login import current_user
 from flask_babel import get_locale
 from sqlalchemy.exc import InvalidRequestError, OperationalError
@@ -69,6 +72,100 @@ cl = list_classes(new_list)
 # Alphabetises the list of Metadata providers
 cl.sort(key=lambda x: x.__class__.__name__)
 
+# Metadata search settings
+SEARCH_TIMEOUT = 12  # seconds a search waits for the providers before answering with what it has
+SEARCH_CACHE_TTL = 600  # seconds
+SEARCH_CACHE_SIZE = 256
+
+# Long-lived pool the provider searches run on, providers still running at the deadline finish in the
+# background and land in the cache for the next search
+search_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2 * max(len(cl), 1),
+                                                        thread_name_prefix="metadata-search")
+
+
+class SearchCache:
+    """
+    Short-lived cache of provider search results, keyed by (provider, query, locale).
+
+    Editors tend to search the same title several times while fixing up a book. Only non-empty results
+    are kept, most providers answer an error with an empty list and that should not stick.
+    """
+
+    def __init__(self, ttl: int = SEARCH_CACHE_TTL, max_size: int = SEARCH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, provider_id, query, locale):
+        key = (provider_id, query, str(locale))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def add(self, provider_id, query, locale, records):
+        if not records:
+            return
+        key = (provider_id, query, str(locale))
+        with self._lock:
+            self._entries[key] = (records, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+search_cache = SearchCache()
+
+
+def collect_search_result(future, provider_id, query, locale):
+    """Records of a finished provider search, which are also cached for the next search"""
+    try:
+        records = [asdict(x) for x in future.result() or [] if x]
+    except Exception as e:
+        log.warning("Metadata provider {} failed: {}".format(provider_id, e))
+        records = []
+    search_cache.add(provider_id, query, locale, records)
+    return records
+
+
+def search_providers(searches, query, static_cover, locale, timeout=SEARCH_TIMEOUT):
+    """Runs (provider_id, search function) pairs on the shared pool and returns the records of every
+    provider that answered from the cache or within the timeout, in provider order"""
+    results = dict()
+    pending = dict()
+    for provider_id, search in searches:
+        cached = search_cache.get(provider_id, query, locale)
+        if cached is not None:
+            results[provider_id] = cached
+        else:
+            pending[search_executor.submit(search, query, static_cover, locale)] = provider_id
+
+    if pending:
+        done, not_done = concurrent.futures.wait(pending, timeout=timeout)
+        for future in done:
+            results[pending[future]] = collect_search_result(future, pending[future], query, locale)
+        for future in not_done:
+            future.add_done_callback(lambda f, provider_id=pending[future]:
+                                     collect_search_result(f, provider_id, query, locale))
+        if not_done:
+            log.info("Metadata search answered without {} after {}s".format(
+                ", ".join(sorted(pending[future] for future in not_done)), timeout))
+
+    data = list()
+    for provider_id, _ in searches:
+        data.extend(results.get(provider_id, []))
+    return data
+
 
 # Helper to load global provider enablement map from CWA settings
 def _get_global_provider_enabled_map() -> dict:
@@ -93,6 +190,7 @@ def _get_global_provider_enabled_map() -> dict:
         return {}
     # Remove redundant return
 
+
 @meta.route("/metadata/provider")
 @user_login_required
 def metadata_provider():
@@ -155,12 +253,10 @@ def metadata_search():
     if query:
         static_cover = url_for("static", filename="generic_cover.jpg")
         # ret = cl[0].search(query, static_cover, locale)
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            meta = {
-                executor.submit(copy_current_request_context(c.search), query, static_cover, locale): c
-                for c in cl
-                if active.get(c.__id__, True) and bool(global_enabled.get(c.__id__, True))
-            }
-            for future in concurrent.futures.as_completed(meta):
-                data.extend([asdict(x) for x in future.result() if x])
+        searches = [
+            (c.__id__, c.request_search())
+            for c in cl
+            if active.get(c.__id__, True) and bool(global_enabled.get(c.__id__, True))
+        ]
+        data = search_providers(searches, query, static_cover, locale)
     return  make_response(jsonify(data))
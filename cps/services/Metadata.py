@@ -9,10 +9,20 @@ import abc
 import dataclasses
 import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Generator, List, Optional, Union
 
+import requests
+
 from cps import constants
 
+_session_lock = threading.Lock()
+
+# Long-lived pool shared by the providers for fetching detail pages of their search hits. Kept apart
+# from the pool the searches themselves run on, so a search never waits on its own pool
+detail_executor = ThreadPoolExecutor(max_workers=10, thread_name_prefix="metadata-detail")
+
 
 @dataclasses.dataclass
 class MetaSourceInfo:
@@ -51,12 +61,29 @@ class Metadata:
     def set_status(self, state):
         self.active = state
 
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        """Keep-alive HTTP session shared by every search of this provider"""
+        session = cls.__dict__.get("_http_session")
+        if session is None:
+            with _session_lock:
+                session = cls.__dict__.get("_http_session")
+                if session is None:
+                    session = requests.Session()
+                    cls._http_session = session
+        return session
+
     @abc.abstractmethod
     def search(
         self, query: str, generic_cover: str = "", locale: str = "en"
     ) -> Optional[List[MetaRecord]]:
         pass
 
+    def request_search(self):
+        """The search to run on the search pool, where it may still be running after the request is gone.
+        Providers reading the logged in user override this to read it while the request is still there"""
+        return self.search
+
     @staticmethod
     def get_title_tokens(
         title: str, strip_joiners: bool = True
@@ -52,6 +52,40 @@ class ImprovedQueue(queue.Queue):
             return list(self.queue)
 
 
+class CoalescingQueue:
+    """Work for a single hidden task. Requests arriving while the task runs are added to its queue
+    instead of starting another task.
+
+    The task calls take() until it comes back empty, which is the only place the queue is handed
+    back, so a request arriving as the task finishes starts a new one. A task stopping before that
+    (cancelled or failed) calls release() instead"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = set()
+        self._scheduled = False
+
+    def add(self, items):
+        """Queues the items, returns True when a task has to be started to work the queue off"""
+        with self._lock:
+            self._items.update(items)
+            if self._scheduled:
+                return False
+            self._scheduled = True
+            return True
+
+    def take(self):
+        """Returns the items queued since the last call"""
+        with self._lock:
+            items, self._items = self._items, set()
+            if not items:
+                self._scheduled = False
+            return items
+
+    def release(self):
+        with self._lock:
+            self._scheduled = False
+
+
 # Class for all worker tasks in the background
 class WorkerThread(threading.Thread):
     _instance = None
@@ -6,22 +6,27 @@
 # See CONTRIBUTORS for full list of authors.
 
 import os
+import re
+import base64
 import smtplib
 import ssl
 import threading
 import socket
 import mimetypes
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
-from io import StringIO
+from io import BytesIO
 from email.message import EmailMessage
 from email.utils import formatdate, parseaddr, make_msgid
-from email.generator import Generator
+from email.generator import BytesGenerator
 from flask_babel import lazy_gettext as N_
 
 from cps.services.worker import CalibreTask
 from cps.services import gmail
-from cps.embed_helper import do_calibre_export
-from cps import logger, config
+from cps.embed_helper import do_calibre_export, calibre_export_settings
+from cps import logger, config, db, export_cache
 from cps import gdriveutils
 from cps.string_helper import strip_whitespaces
 import uuid
@@ -29,6 +34,13 @@ import uuid
 log = logger.create()
 
 CHUNKSIZE = 8192
+# attachment bytes encoded at once, a multiple of the 57 bytes base64 puts on one 76 character line
+ATTACHMENT_CHUNKSIZE = 57 * 1024
+CRLF = b"\r\n"
+# seconds an authenticated SMTP connection is kept open for the next e-mail to the same server
+SMTP_IDLE_TIMEOUT = 60
+# e-mails sent at the same time, they run next to the worker queue instead of blocking it
+MAIL_WORKERS = max(1, int(os.environ.get('CWA_MAIL_WORKERS', 3)))
 
 
 # Class for sending email with ability to get current progress
@@ -37,53 +49,104 @@ class EmailBase:
     transferSize = 0
     progress = 0
 
-    def data(self, msg):
-        self.transferSize = len(msg)
-        (code, resp) = smtplib.SMTP.data(self, msg)
-        self.progress = 0
-        return (code, resp)
-
     def send(self, strg):
         """Send `strg' to the server."""
         log.debug_no_auth('send: {}'.format(strg[:300]))
+        self._send_raw(strg.encode('utf-8') if isinstance(strg, str) else strg)
+
+    def _send_raw(self, data):
         if hasattr(self, 'sock') and self.sock:
             try:
-                if self.transferSize:
-                    lock = threading.Lock()
-                    lock.acquire()
-                    self.transferSize = len(strg)
-                    lock.release()
-                    for i in range(0, self.transferSize, CHUNKSIZE):
-                        if isinstance(strg, bytes):
-                            self.sock.send((strg[i:i + CHUNKSIZE]))
-                        else:
-                            self.sock.send((strg[i:i + CHUNKSIZE]).encode('utf-8'))
-                        lock.acquire()
-                        self.progress = i
-                        lock.release()
-                else:
-                    self.sock.sendall(strg.encode('utf-8'))
+                self.sock.sendall(data)
             except socket.error:
                 self.close()
                 raise smtplib.SMTPServerDisconnected('Server not connected')
         else:
             raise smtplib.SMTPServerDisconnected('please run connect() first')
 
+    def _send_data(self, data):
+        for i in range(0, len(data), CHUNKSIZE):
+            chunk = data[i:i + CHUNKSIZE]
+            self._send_raw(chunk)
+            self.progress += len(chunk)
+
+    def send_streamed(self, from_addr, to_addrs, head, attachment_file=None, tail=b""):
+        """Like sendmail, but the attachment body is base64 encoded from disk while it's sent, so memory use
+        doesn't grow with the size of the attachment. head and tail are the flattened message before and after
+        the attachment body, with CRLF line endings"""
+        self.ehlo_or_helo_if_needed()
+        if isinstance(to_addrs, str):
+            to_addrs = [to_addrs]
+        (code, resp) = self.mail(from_addr)
+        if code != 250:
+            if code == 421:
+                self.close()
+            else:
+                self._rset()
+            raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+        senderrs = {}
+        for each in to_addrs:
+            (code, resp) = self.rcpt(each)
+            if (code != 250) and (code != 251):
+                senderrs[each] = (code, resp)
+            if code == 421:
+                self.close()
+                raise smtplib.SMTPRecipientsRefused(senderrs)
+        if len(senderrs) == len(to_addrs):
+            self._rset()
+            raise smtplib.SMTPRecipientsRefused(senderrs)
+
+        (code, resp) = self.docmd("data")
+        if code != 354:
+            raise smtplib.SMTPDataError(code, resp)
+        head = quote_periods(head)
+        tail = quote_periods(tail)
+        attachment_size = os.path.getsize(attachment_file) if attachment_file else 0
+        self.transferSize = len(head) + encoded_size(attachment_size) + len(tail)
+        self.progress = 0
+        self._send_data(head)
+        if attachment_file:
+            with open(attachment_file, 'rb') as file_:
+                while True:
+                    chunk = file_.read(ATTACHMENT_CHUNKSIZE)
+                    if not chunk:
+                        break
+                    self._send_data(base64.encodebytes(chunk).replace(b"\n", CRLF))
+        self._send_data(tail)
+        last = tail or (head if not attachment_size else CRLF)
+        self._send_raw(b"." + CRLF if last.endswith(CRLF) else CRLF + b"." + CRLF)
+        (code, resp) = self.getreply()
+        if code != 250:
+            if code == 421:
+                self.close()
+            else:
+                self._rset()
+            raise smtplib.SMTPDataError(code, resp)
+        return senderrs
+
     @classmethod
     def _print_debug(cls, *args):
         log.debug(args)
 
     def getTransferStatus(self):
         if self.transferSize:
-            lock2 = threading.Lock()
-            lock2.acquire()
             value = int((float(self.progress) / float(self.transferSize))*100)
-            lock2.release()
             return value / 100
         else:
             return 1
 
 
+def quote_periods(data):
+    # SMTP transparency: lines starting with a period get a second one
+    return re.sub(br'(?m)^\.', b'..', data)
+
+
+def encoded_size(size):
+    """Size of size bytes base64 encoded in lines of 76 characters ending in CRLF"""
+    lines, rest = divmod(size, 57)
+    return lines * 78 + ((rest + 2) // 3 * 4 + 2 if rest else 0)
+
+
 # Class for sending email with ability to get current progress, derived from emailbase class
 class Email(EmailBase, smtplib.SMTP):
 
@@ -98,6 +161,77 @@ class EmailSSL(EmailBase, smtplib.SMTP_SSL):
         smtplib.SMTP_SSL.__init__(self, *args, **kwargs)
 
 
+class SMTPConnectionPool:
+    """Authenticated SMTP connections kept open between e-mails. Consecutive e-mails with the same server
+    settings reuse a connection instead of doing the TLS handshake and login again, connections idle for
+    longer than SMTP_IDLE_TIMEOUT are closed"""
+    def __init__(self, idle_timeout=SMTP_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._idle = dict()
+        self._timer = None
+
+    def acquire(self, key, connect):
+        """Returns an open connection for key, made with connect() if there is no usable idle one"""
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                connection, last_used = idle.pop() if idle else (None, None)
+            if connection is None:
+                return connect()
+            if time.monotonic() - last_used < self.idle_timeout and self._is_alive(connection):
+                return connection
+            self.close(connection)
+
+    def release(self, key, connection):
+        """Hands a connection back after a successful send"""
+        connection.transferSize = 0
+        connection.progress = 0
+        with self._lock:
+            self._idle.setdefault(key, list()).append((connection, time.monotonic()))
+            if self._timer is None:
+                self._timer = threading.Timer(self.idle_timeout, self.expire)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def expire(self):
+        """Closes connections that have been idle for too long"""
+        now = time.monotonic()
+        expired = list()
+        with self._lock:
+            self._timer = None
+            for key, idle in list(self._idle.items()):
+                expired.extend(connection for connection, last_used in idle
+                               if now - last_used >= self.idle_timeout)
+                idle[:] = [entry for entry in idle if now - entry[1] < self.idle_timeout]
+                if not idle:
+                    del self._idle[key]
+            if self._idle:
+                self._timer = threading.Timer(self.idle_timeout, self.expire)
+                self._timer.daemon = True
+                self._timer.start()
+        for connection in expired:
+            self.close(connection)
+
+    @staticmethod
+    def _is_alive(connection):
+        try:
+            return connection.noop()[0] == 250
+        except (smtplib.SMTPException, socket.error):
+            return False
+
+    @staticmethod
+    def close(connection):
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, socket.error):
+            connection.close()
+
+
+smtp_pool = SMTPConnectionPool()
+mail_executor = ThreadPoolExecutor(max_workers=MAIL_WORKERS, thread_name_prefix="mail")
+
+
 class TaskEmail(CalibreTask):
     def __init__(self, subject, filepath, attachment, settings, recipient, task_message, text, id=0, internal=False):
         super(TaskEmail, self).__init__(task_message)
@@ -110,6 +244,10 @@ class TaskEmail(CalibreTask):
         self.asyncSMTP = None
         self.book_id = id
         self.results = dict()
+        # attachment streamed from disk while sending, see prepare_message
+        self.attachment_file = None
+        self.attachment_temporary = False
+        self.attachment_placeholder = None
 
     # from calibre code:
     # https://github.com/kovidgoyal/calibre/blob/731ccd92a99868de3e2738f65949f19768d9104c/src/calibre/utils/smtp.py#L60
@@ -124,7 +262,7 @@ class TaskEmail(CalibreTask):
             msgid_domain = ''
         return msgid_domain or 'calibre-web.com'
 
-    def prepare_message(self):
+    def prepare_message(self, stream_attachment=False):
         message = EmailMessage()
         # message = MIMEMultipart()
         message['From'] = self.settings["mail_from"]
@@ -134,13 +272,23 @@ class TaskEmail(CalibreTask):
         message['Message-ID'] = make_msgid(domain=self.get_msgid_domain())
         message.set_content(self.text.encode('UTF-8'), "text", "plain")
         if self.attachment:
-            data = self._get_attachment(self.filepath, self.attachment)
-            if data:
+            attachment_file, temporary = self._get_attachment(self.filepath, self.attachment)
+            if attachment_file:
                 # Set mimetype
                 content_type, encoding = mimetypes.guess_type(self.attachment)
                 if content_type is None or encoding is not None:
                     content_type = 'application/octet-stream'
                 main_type, sub_type = content_type.split('/', 1)
+                if stream_attachment:
+                    # Only a placeholder goes into the message, the file is encoded while it's sent
+                    self.attachment_file, self.attachment_temporary = attachment_file, temporary
+                    self.attachment_placeholder = os.urandom(24)
+                    data = self.attachment_placeholder
+                else:
+                    with open(attachment_file, 'rb') as file_:
+                        data = file_.read()
+                    if temporary:
+                        os.remove(attachment_file)
                 message.add_attachment(data, maintype=main_type, subtype=sub_type, filename=self.attachment)
             else:
                 self._handleError("Attachment not found")
@@ -148,9 +296,13 @@ class TaskEmail(CalibreTask):
         return message
 
     def run(self, worker_thread):
+        # Sent next to the worker queue, the task stays started until _send finishes and sets its end time
+        mail_executor.submit(self._send)
+
+    def _send(self):
         try:
-            # create MIME message
-            msg = self.prepare_message()
+            # create MIME message, the Gmail API needs the whole message in memory
+            msg = self.prepare_message(stream_attachment=self.settings['mail_server_type'] == 0)
             if not msg:
                 return
             if self.settings['mail_server_type'] == 0:
@@ -177,43 +329,67 @@ class TaskEmail(CalibreTask):
         except Exception as ex:
             log.error_or_exception(ex, stacklevel=3)
             self._handleError('Error sending e-mail: {}'.format(ex))
+        finally:
+            if self.attachment_temporary and self.attachment_file and os.path.exists(self.attachment_file):
+                os.remove(self.attachment_file)
+            self.end_time = datetime.now()
 
-    def send_standard_email(self, msg):
+    def _connection_key(self):
+        return (int(self.settings.get('mail_use_ssl', 0)), self.settings["mail_server"], self.settings["mail_port"],
+                self.settings["mail_login"], self.settings["mail_password_e"],
+                os.getenv("SMTP_ALLOW_UNVERIFIED_SSL", "false").strip().lower())
+
+    def _connect(self):
         use_ssl = int(self.settings.get('mail_use_ssl', 0))
         timeout = 600  # set timeout to 5mins
         use_unverified_context = os.getenv("SMTP_ALLOW_UNVERIFIED_SSL", "false").strip().lower() in ("1", "true", "yes", "on")
 
-        # on python3 debugoutput is caught with overwritten _print_debug function
-        log.debug("Start sending e-mail")
         if use_ssl == 2:
             context = ssl.create_default_context()
             if use_unverified_context:
                 context.check_hostname = False
                 context.verify_mode = ssl.CERT_NONE
-            self.asyncSMTP = EmailSSL(self.settings["mail_server"], self.settings["mail_port"],
-                                       timeout=timeout, context=context)
+            connection = EmailSSL(self.settings["mail_server"], self.settings["mail_port"],
+                                  timeout=timeout, context=context)
         else:
-            self.asyncSMTP = Email(self.settings["mail_server"], self.settings["mail_port"], timeout=timeout)
+            connection = Email(self.settings["mail_server"], self.settings["mail_port"], timeout=timeout)
 
         # link to logginglevel
         if logger.is_debug_enabled():
-            self.asyncSMTP.set_debuglevel(1)
+            connection.set_debuglevel(1)
         if use_ssl == 1:
             context = ssl.create_default_context()
             if use_unverified_context:
                 context.check_hostname = False
                 context.verify_mode = ssl.CERT_NONE
-            self.asyncSMTP.starttls(context=context)
+            connection.starttls(context=context)
         if self.settings["mail_password_e"]:
-            self.asyncSMTP.login(str(self.settings["mail_login"]), str(self.settings["mail_password_e"]))
+            connection.login(str(self.settings["mail_login"]), str(self.settings["mail_password_e"]))
+        return connection
+
+    def send_standard_email(self, msg):
+        # on python3 debugoutput is caught with overwritten _print_debug function
+        log.debug("Start sending e-mail")
+        key = self._connection_key()
+        connection = smtp_pool.acquire(key, self._connect)
 
         # Convert message to something to send
-        fp = StringIO()
-        gen = Generator(fp, mangle_from_=False)
+        fp = BytesIO()
+        gen = BytesGenerator(fp, mangle_from_=False, policy=msg.policy.clone(linesep="\r\n"))
         gen.flatten(msg)
+        head, tail = fp.getvalue(), b""
+        if self.attachment_file:
+            # the placeholder is a single base64 line, the attachment body is streamed in its place
+            head, __, tail = head.partition(base64.b64encode(self.attachment_placeholder) + CRLF)
 
-        self.asyncSMTP.sendmail(self.settings["mail_from"], self.recipient, fp.getvalue())
-        self.asyncSMTP.quit()
+        self.asyncSMTP = connection
+        try:
+            connection.send_streamed(self.settings["mail_from"], self.recipient, head, self.attachment_file, tail)
+        except Exception:
+            # a connection in an unknown state is not handed to the next e-mail
+            smtp_pool.close(connection)
+            raise
+        smtp_pool.release(key, connection)
         self._handleSuccess()
         log.debug("E-mail send successfully")
 
@@ -236,39 +412,54 @@ class TaskEmail(CalibreTask):
             self._progress = x
 
     def _get_attachment(self, book_path, filename):
-        """Get file as MIMEBase message"""
+        """Returns the path of the file to attach and whether it's a temporary copy to delete after sending"""
         calibre_path = config.get_book_path()
         extension = os.path.splitext(filename)[1][1:]
+        datafile = os.path.join(calibre_path, book_path, filename)
+        embed_metadata = config.config_binariesdir and config.config_embed_metadata
         if config.config_use_google_drive:
             df = gdriveutils.getFileFromEbooksFolder(book_path, filename)
-            if df:
-                datafile = os.path.join(calibre_path, book_path, filename)
+            if not df:
+                return None, False
+
+            def get_book_file():
                 if not os.path.exists(os.path.join(calibre_path, book_path)):
                     os.makedirs(os.path.join(calibre_path, book_path))
                 df.GetContentFile(datafile)
-            else:
-                return None
-            if config.config_binariesdir and config.config_embed_metadata:
-                data_path, data_file = do_calibre_export(self.book_id, extension)
-                datafile = os.path.join(data_path, data_file + "." + extension)
-            with open(datafile, 'rb') as file_:
-                data = file_.read()
-            os.remove(datafile)
         else:
-            datafile = os.path.join(calibre_path, book_path, filename)
-            try:
-                if config.config_binariesdir and config.config_embed_metadata:
-                    data_path, data_file = do_calibre_export(self.book_id, extension)
-                    datafile = os.path.join(data_path, data_file + "." + extension)
-                with open(datafile, 'rb') as file_:
-                    data = file_.read()
-                if config.config_binariesdir and config.config_embed_metadata:
-                    os.remove(datafile)
-            except IOError as e:
-                log.error_or_exception(e, stacklevel=3)
-                log.error('The requested file could not be read. Maybe wrong permissions?')
-                return None
-        return data
+            def get_book_file():
+                pass
+        try:
+            if embed_metadata:
+                datafile = self._get_embedded_export(extension, get_book_file)
+                if not datafile:
+                    return None, False
+            else:
+                get_book_file()
+            if not os.access(datafile, os.R_OK):
+                raise IOError("Can't read {}".format(datafile))
+        except IOError as e:
+            log.error_or_exception(e, stacklevel=3)
+            log.error('The requested file could not be read. Maybe wrong permissions?')
+            return None, False
+        return datafile, bool(config.config_use_google_drive and not embed_metadata)
+
+    def _get_embedded_export(self, extension, get_book_file):
+        worker_db = db.CalibreDB(expire_on_commit=False, init=True)
+        try:
+            book = worker_db.get_book(self.book_id)
+            last_modified = book.last_modified if book else None
+        finally:
+            worker_db.session.close()
+        if last_modified is None:
+            log.error("Book id {} not found for sending".format(self.book_id))
+            return None
+
+        def export():
+            get_book_file()
+            return do_calibre_export(self.book_id, extension)
+
+        return export_cache.get_export(self.book_id, extension, last_modified, calibre_export_settings(), export)
 
     @property
     def name(self):
@@ -6,14 +6,22 @@
 # See CONTRIBUTORS for full list of authors.
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from lxml import etree
+from sqlalchemy import insert, select, delete
+from sqlalchemy.orm import selectinload
 
 from cps import config, db, gdriveutils, logger
-from cps.services.worker import CalibreTask
+from cps.services.worker import CalibreTask, STAT_CANCELLED, STAT_ENDED
 from flask_babel import lazy_gettext as N_
 
 from ..epub_helper import create_new_metadata_backup
 
+# dirty books backed up and committed at once
+BACKUP_BATCH_SIZE = 200
+# metadata.opf files written at the same time, writing is I/O bound
+BACKUP_WORKERS = max(1, int(os.environ.get('CWA_METADATA_BACKUP_WORKERS', 4)))
+
 
 class TaskBackupMetadata(CalibreTask):
 
@@ -36,9 +44,9 @@ class TaskBackupMetadata(CalibreTask):
 
     def set_all_books_dirty(self):
         try:
-            books = self.calibre_db.session.query(db.Books).all()
-            for book in books:
-                self.calibre_db.set_metadata_dirty(book.id)
+            # one statement for the whole library, books already marked are skipped by the unique constraint
+            self.calibre_db.session.execute(insert(db.Metadata_Dirtied).prefix_with("OR IGNORE")
+                                            .from_select(["book"], select(db.Books.id)))
             self.calibre_db.session.commit()
             self._handleSuccess()
         except Exception as ex:
@@ -48,43 +56,83 @@ class TaskBackupMetadata(CalibreTask):
         self.calibre_db.session.close()
 
     def backup_metadata(self):
+        book_id = None
         try:
-            metadata_backup = self.calibre_db.session.query(db.Metadata_Dirtied).all()
-            custom_columns = (self.calibre_db.session.query(db.CustomColumns)
+            session = self.calibre_db.session
+            custom_columns = (session.query(db.CustomColumns)
                               .filter(db.CustomColumns.mark_for_delete == 0)
                               .filter(db.CustomColumns.datatype.notin_(db.cc_exceptions))
                               .order_by(db.CustomColumns.label).all())
-            count = len(metadata_backup)
-            i = 0
-            for backup in metadata_backup:
-                book = self.calibre_db.session.query(db.Books).filter(db.Books.id == backup.book).one_or_none()
-                self.calibre_db.session.query(db.Metadata_Dirtied).filter(
-                    db.Metadata_Dirtied.book == backup.book).delete()
-                self.calibre_db.session.commit()
-                if book:
-                    self.open_metadata(book, custom_columns)
-                else:
-                    self.log.error("Book {} not found in database".format(backup.book))
-                i += 1
-                self.progress = (1.0 / count) * i
-            self._handleSuccess()
+            eager = [selectinload(getattr(db.Books, relation))
+                     for relation in ('authors', 'tags', 'comments', 'series', 'ratings', 'languages', 'publishers',
+                                      'identifiers')]
+            eager.extend(selectinload(getattr(db.Books, 'custom_column_' + str(cc.id)))
+                         for cc in custom_columns if hasattr(db.Books, 'custom_column_' + str(cc.id)))
+            count = session.query(db.Metadata_Dirtied).count()
+            # Google Drive uploads share one client, they stay sequential
+            workers = 1 if config.config_use_google_drive else BACKUP_WORKERS
+            done = 0
+            last_book_id = -1
+            failed = list()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                while self.stat != STAT_CANCELLED and self.stat != STAT_ENDED:
+                    book_ids = [book_id for book_id, in (session.query(db.Metadata_Dirtied.book)
+                                                         .filter(db.Metadata_Dirtied.book > last_book_id)
+                                                         .order_by(db.Metadata_Dirtied.book)
+                                                         .limit(BACKUP_BATCH_SIZE))]
+                    if not book_ids:
+                        break
+                    last_book_id = book_ids[-1]
+                    books = session.query(db.Books).options(*eager).filter(db.Books.id.in_(book_ids)).all()
+                    for book_id in set(book_ids) - {book.id for book in books}:
+                        self.log.error("Book {} not found in database".format(book_id))
+
+                    # packages are built here, the session is not shared with the writer threads
+                    futures = dict()
+                    for book in books:
+                        book_id = book.id
+                        package = create_new_metadata_backup(book, custom_columns, self.export_language,
+                                                             self.translated_title)
+                        futures[book_id] = executor.submit(self.write_metadata, book.path, package)
+                    book_id = None
+                    # books whose metadata.opf failed stay dirty for the next backup, the others are done
+                    batch_failed = set()
+                    for failed_id, future in futures.items():
+                        try:
+                            future.result()
+                        except Exception as ex:
+                            self.log.error("Error creating metadata backup for book {}: {}".format(failed_id, ex))
+                            batch_failed.add(failed_id)
+                            failed.append((failed_id, ex))
+                    session.execute(delete(db.Metadata_Dirtied)
+                                    .where(db.Metadata_Dirtied.book.in_([book_id for book_id in book_ids
+                                                                         if book_id not in batch_failed])))
+                    session.commit()
+                    session.expunge_all()
+                    done += len(book_ids)
+                    self.progress = min(1.0, done / count) if count else 1.0
+            if failed:
+                failed_id, ex = failed[0]
+                self._handleError('Error creating metadata backup for {} books, first book {}: {}'.format(
+                    len(failed), failed_id, ex))
+            else:
+                self._handleSuccess()
             self.calibre_db.session.close()
 
         except Exception as ex:
-            b = "NaN" if not hasattr(book, 'id') else book.id
+            b = "NaN" if book_id is None else book_id
             self.log.debug('Error creating metadata backup for book {}: '.format(b) + str(ex))
             self._handleError('Error creating metadata backup: ' + str(ex))
             self.calibre_db.session.rollback()
             self.calibre_db.session.close()
 
-    def open_metadata(self, book, custom_columns):
-        # package = self.create_new_metadata_backup(book, custom_columns)
-        package = create_new_metadata_backup(book, custom_columns, self.export_language, self.translated_title)
+    @staticmethod
+    def write_metadata(book_path, package):
         if config.config_use_google_drive:
             if not gdriveutils.is_gdrive_ready():
                 raise Exception('Google Drive is configured but not ready')
 
-            gdriveutils.uploadFileToEbooksFolder(os.path.join(book.path, 'metadata.opf').replace("\\", "/"),
+            gdriveutils.uploadFileToEbooksFolder(os.path.join(book_path, 'metadata.opf').replace("\\", "/"),
                                                  etree.tostring(package,
                                                                 xml_declaration=True,
                                                                 encoding='utf-8',
@@ -92,7 +140,7 @@ class TaskBackupMetadata(CalibreTask):
                                                  True)
         else:
             # ToDo: Handle book folder not found or not readable
-            book_metadata_filepath = os.path.join(config.get_book_path(), book.path, 'metadata.opf')
+            book_metadata_filepath = os.path.join(config.get_book_path(), book_path, 'metadata.opf')
             # prepare finalize everything and output
             doc = etree.ElementTree(package)
             try:
@@ -6,28 +6,43 @@
 # See CONTRIBUTORS for full list of authors.
 
 import os
+import sys
 import time
-import re
 
 from flask_babel import lazy_gettext as N_
 
 from cps.services.worker import CalibreTask, STAT_CANCELLED, STAT_ENDED
 from cps import logger, helper
 
+sys.path.insert(1, '/app/calibre-web-automated/scripts/')
+from run_status import read_run_status, FINAL_STATES, CONVERT_LIBRARY_STATUS, EPUB_FIXER_STATUS
+
 log = logger.create()
 
 
+def follow_run_status(task, status_path):
+    """Mirrors the run's published progress onto the task until the run is over. Returns the state
+    the run ended in"""
+    record = read_run_status(status_path)
+    if record['state'] in FINAL_STATES:
+        return record['state']
+    if record['total'] > 0:
+        current = max(0, min(record['current'], record['total']))
+        # cap below 0.99 until finished to avoid flicker
+        task.progress = min(0.99, max(task.progress, current / float(record['total'])))
+    return None
+
+
 class TaskConvertLibraryRun(CalibreTask):
     """Lightweight wrapper to surface Convert Library run in Tasks UI.
 
-    It triggers the existing web endpoint and then tails the log for completion,
-    updating progress heuristically if counts are present in the log.
+    It triggers the existing web endpoint and then follows the run status the script publishes
+    until it is over.
     """
 
     def __init__(self):
         super(TaskConvertLibraryRun, self).__init__(N_(u"Convert Library – full run"))
-        self.log_path = "/config/convert-library.log"
-        self._finished_marker = "CWA Convert Library Service - Run Ended: "
+        self.status_path = CONVERT_LIBRARY_STATUS
 
     def run(self, worker_thread):
         # trigger run via internal route
@@ -39,8 +54,7 @@ class TaskConvertLibraryRun(CalibreTask):
             self._handleError(f"Failed to start Convert Library: {e}")
             return
 
-        # poll log until finished or cancelled
-        last_progress = 0.0
+        # poll run status until finished or cancelled
         while True:
             # cancellation check
             if self.stat in (STAT_CANCELLED, STAT_ENDED):
@@ -53,29 +67,14 @@ class TaskConvertLibraryRun(CalibreTask):
                 # treat as clean end; UI already shows cancelled/ended state
                 return
 
-            # update progress heuristically
-            try:
-                with open(self.log_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                # finished?
-                if self._finished_marker in content:
-                    self._handleSuccess()
-                    return
-                # progress like "12/57" anywhere in log
-                matches = re.findall(r"(\d+)/(\d+)", content)
-                if matches:
-                    cur, total = matches[-1]
-                    total_i = max(1, int(total))
-                    cur_i = max(0, min(int(cur), total_i))
-                    last_progress = max(last_progress, cur_i / float(total_i))
-                    # cap below 0.99 until finished marker to avoid flicker
-                    self.progress = min(0.99, last_progress)
-            except FileNotFoundError:
-                # log may not exist yet; keep waiting
-                pass
-            except Exception:
-                # ignore parse errors; keep running
-                pass
+            state = follow_run_status(self, self.status_path)
+            if state == 'finished':
+                self._handleSuccess()
+                return
+            if state is not None:
+                # cancelled from the Convert Library page, or the script died
+                self._handleError(f"Convert Library run {state}")
+                return
 
             time.sleep(0.5)
 
@@ -93,8 +92,7 @@ class TaskEpubFixerRun(CalibreTask):
 
     def __init__(self):
         super(TaskEpubFixerRun, self).__init__(N_(u"EPUB Fixer – full run"))
-        self.log_path = "/config/epub-fixer.log"
-        self._finished_marker = "CWA Kindle EPUB Fixer Service - Run Ended: "
+        self.status_path = EPUB_FIXER_STATUS
 
     def run(self, worker_thread):
         # trigger run via internal route
@@ -106,7 +104,6 @@ class TaskEpubFixerRun(CalibreTask):
             self._handleError(f"Failed to start EPUB Fixer: {e}")
             return
 
-        last_progress = 0.0
         while True:
             if self.stat in (STAT_CANCELLED, STAT_ENDED):
                 try:
@@ -117,23 +114,13 @@ class TaskEpubFixerRun(CalibreTask):
                     pass
                 return
 
-            try:
-                with open(self.log_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                if self._finished_marker in content:
-                    self._handleSuccess()
-                    return
-                matches = re.findall(r"(\d+)/(\d+)", content)
-                if matches:
-                    cur, total = matches[-1]
-                    total_i = max(1, int(total))
-                    cur_i = max(0, min(int(cur), total_i))
-                    last_progress = max(last_progress, cur_i / float(total_i))
-                    self.progress = min(0.99, last_progress)
-            except FileNotFoundError:
-                pass
-            except Exception:
-                pass
+            state = follow_run_status(self, self.status_path)
+            if state == 'finished':
+                self._handleSuccess()
+                return
+            if state is not None:
+                self._handleError(f"EPUB Fixer run {state}")
+                return
 
             time.sleep(0.5)
 
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+
+from flask_babel import lazy_gettext as N_
+
+from cps import config, db, helper, logger, ub
+from cps.constants import EXPORT_PREWARM_SIZE, EXPORT_PREWARM_WORKERS, EXPORT_PREWARM_DAYS
+from cps.services.worker import CalibreTask, CoalescingQueue, STAT_CANCELLED, STAT_ENDED
+
+# checksums looked up per query, stays below SQLite's bound parameter limit
+CHECKSUM_CHUNK_SIZE = 500
+
+
+# queued in place of a book id when the whole sync set has to be checked
+ALL_BOOKS = None
+
+
+class PendingPrewarm(CoalescingQueue):
+    """Books whose exports should be prepared. A single hidden task works them off, so a burst of
+    ingests or edits queues one task instead of one per book"""
+    def add(self, book_ids=None):
+        """Queues the books, or the whole sync set if book_ids is None. Returns True when a task has to
+        be started to work the queue off"""
+        return super(PendingPrewarm, self).add([ALL_BOOKS] if book_ids is None else book_ids)
+
+    def take(self):
+        """Returns (book ids, whether the whole sync set was asked for) queued since the last call"""
+        book_ids = super(PendingPrewarm, self).take()
+        everything = ALL_BOOKS in book_ids
+        book_ids.discard(ALL_BOOKS)
+        return book_ids, everything
+
+
+pending_prewarm = PendingPrewarm()
+
+
+class TaskPrewarmExports(CalibreTask):
+    """Produces the embedded metadata exports Kobo and KOReader devices are about to download, so the
+    first device doesn't wait for calibredb or kepubify inside its request.
+
+    Candidates are books on Kobo sync shelves, books added recently for users syncing their whole
+    library to a Kobo, and books with KOSync progress in the last EXPORT_PREWARM_DAYS days.
+    """
+    def __init__(self, cover_names=None, task_message=N_('Preparing books for e-reader sync')):
+        super(TaskPrewarmExports, self).__init__(task_message)
+        self.log = logger.create()
+        # translated name of the cover in the OPF guide per user locale, only known in a request
+        self.cover_names = cover_names or dict()
+        self.app_db_session = ub.get_new_session_instance()
+
+    def run(self, worker_thread):
+        exported = 0
+        drained = False
+        try:
+            while self.stat != STAT_CANCELLED and self.stat != STAT_ENDED:
+                book_ids, everything = pending_prewarm.take()
+                if not book_ids and not everything:
+                    drained = True
+                    break
+                if config.config_use_google_drive or not config.config_embed_metadata:
+                    continue
+                exported += self.prewarm(self.get_candidates(None if everything else book_ids))
+        except Exception as ex:
+            self.log.error_or_exception(ex)
+            self._handleError(str(ex))
+            return
+        finally:
+            if not drained:
+                pending_prewarm.release()
+            self.app_db_session.remove()
+
+        if exported == 0:
+            self.self_cleanup = True
+        self._handleSuccess()
+
+    def get_candidates(self, book_ids=None):
+        """Returns (book id, format, user locale) of the exports devices will ask for, most wanted first"""
+        candidates = list()
+        calibre_db = db.CalibreDB(expire_on_commit=False, init=True)
+        try:
+            # naive UTC compares correctly against both databases' stored timestamps
+            since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=EXPORT_PREWARM_DAYS)
+
+            # KOSync progress names documents by the checksum of the downloaded file
+            from cps.progress_syncing.models import KOSyncProgress, BookFormatChecksum
+            progress = (self.app_db_session.query(KOSyncProgress.document, ub.User.locale)
+                        .join(ub.User, ub.User.id == KOSyncProgress.user_id)
+                        .filter(KOSyncProgress.timestamp >= since)
+                        .order_by(KOSyncProgress.timestamp.desc()).all())
+            locales = {document: locale for document, locale in reversed(progress)}
+            documents = list(dict.fromkeys(document for document, __ in progress))
+            for start in range(0, len(documents), CHECKSUM_CHUNK_SIZE):
+                chunk = documents[start:start + CHECKSUM_CHUNK_SIZE]
+                for book_id, book_format, checksum in (calibre_db.session.query(BookFormatChecksum.book,
+                                                                                BookFormatChecksum.format,
+                                                                                BookFormatChecksum.checksum)
+                                                       .filter(BookFormatChecksum.checksum.in_(chunk))):
+                    if book_ids is not None and book_id not in book_ids:
+                        continue
+                    candidates.append((book_id, book_format.lower(), locales[checksum]))
+
+            shelved = (self.app_db_session.query(ub.BookShelf.book_id, ub.User.locale)
+                       .join(ub.Shelf, ub.Shelf.id == ub.BookShelf.shelf)
+                       .join(ub.User, ub.User.id == ub.Shelf.user_id)
+                       .filter(ub.Shelf.kobo_sync == True)
+                       .order_by(ub.BookShelf.date_added.desc()).all())
+            whole_library_locales = [locale for locale, in (self.app_db_session.query(ub.User.locale)
+                                     .join(ub.RemoteAuthToken, ub.RemoteAuthToken.user_id == ub.User.id)
+                                     .filter(ub.RemoteAuthToken.token_type == 1)
+                                     .filter(ub.User.kobo_only_shelves_sync == 0)
+                                     .distinct())]
+            recent = list()
+            if whole_library_locales and book_ids is not None:
+                # edited and newly added books are synced again to the whole library
+                recent = list(book_ids)
+            elif whole_library_locales:
+                recent = [book_id for book_id, in (calibre_db.session.query(db.Books.id)
+                                                   .filter(db.Books.timestamp >= since)
+                                                   .order_by(db.Books.timestamp.desc()))]
+            kobo_books = shelved + [(book_id, locale) for book_id in recent for locale in whole_library_locales]
+            if book_ids is not None:
+                kobo_books = [(book_id, locale) for book_id, locale in kobo_books if book_id in book_ids]
+
+            formats = dict()
+            kobo_ids = list(dict.fromkeys(book_id for book_id, __ in kobo_books))
+            for start in range(0, len(kobo_ids), CHECKSUM_CHUNK_SIZE):
+                for book_id, book_format in (calibre_db.session.query(db.Data.book, db.Data.format)
+                                             .filter(db.Data.book.in_(kobo_ids[start:start + CHECKSUM_CHUNK_SIZE]))
+                                             .filter(db.Data.format.in_(["KEPUB", "EPUB"]))):
+                    # Kobo devices are handed the KEPUB whenever there is one
+                    if formats.get(book_id) != "kepub":
+                        formats[book_id] = book_format.lower()
+            candidates.extend((book_id, formats[book_id], locale)
+                              for book_id, locale in kobo_books if book_id in formats)
+        finally:
+            calibre_db.session.close()
+
+        unique = dict()
+        for book_id, book_format, locale in candidates:
+            if not self.can_export(book_format):
+                continue
+            # only KEPUB metadata is written in the user's language
+            unique.setdefault((book_id, book_format, locale if book_format == "kepub" else None), None)
+        return list(unique)
+
+    @staticmethod
+    def can_export(book_format):
+        if book_format == "kepub":
+            return bool(config.config_kepubifypath)
+        return bool(config.config_binariesdir)
+
+    def prewarm(self, candidates):
+        """Exports the candidates until the disk budget is used up, returns the number of books exported"""
+        used = 0
+        exported = 0
+        with ThreadPoolExecutor(max_workers=EXPORT_PREWARM_WORKERS) as executor:
+            for start in range(0, len(candidates), EXPORT_PREWARM_WORKERS):
+                if used >= EXPORT_PREWARM_SIZE or self.stat == STAT_CANCELLED or self.stat == STAT_ENDED:
+                    break
+                for path in executor.map(self.export, candidates[start:start + EXPORT_PREWARM_WORKERS]):
+                    if path and os.path.isfile(path):
+                        used += os.path.getsize(path)
+                        exported += 1
+                self.progress = min(1.0, (start + EXPORT_PREWARM_WORKERS) / len(candidates))
+        self.log.debug("Prepared %d exports (%d bytes) for e-reader sync", exported, used)
+        return exported
+
+    def export(self, candidate):
+        book_id, book_format, locale = candidate
+        # each pool thread works in a calibre session of its own
+        calibre_db = db.CalibreDB(expire_on_commit=False, init=True)
+        try:
+            book = calibre_db.get_book(book_id)
+            data = calibre_db.get_book_format(book_id, book_format.upper())
+            if not book or not data:
+                return None
+            book_file = os.path.join(config.get_book_path(), book.path, data.name + "." + book_format)
+            if not os.path.isfile(book_file):
+                return None
+            return helper.get_embedded_export(book, book_format, lambda: book_file, locale or "en",
+                                              self.cover_names.get(locale, "Cover"))
+        except Exception as ex:
+            self.log.error("Failed to prepare export of book %s as %s: %s", book_id, book_format, ex)
+            return None
+        finally:
+            calibre_db.session.close()
+
+    @property
+    def name(self):
+        return "Prepare Sync Exports"
+
+    @property
+    def is_cancellable(self):
+        return True
+
+    def __str__(self):
+        return "Prepare Sync Exports"
@@ -6,14 +6,15 @@
 # See CONTRIBUTORS for full list of authors.
 
 import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from shutil import copyfile, copyfileobj
-from urllib.request import urlopen
-from io import BytesIO
 from datetime import datetime, timezone
 
 from .. import constants
 from cps import config, db, fs, gdriveutils, logger, ub
-from cps.services.worker import CalibreTask, STAT_CANCELLED, STAT_ENDED
+from cps.services.worker import CalibreTask, CoalescingQueue, STAT_CANCELLED, STAT_ENDED
 from sqlalchemy import func, text, or_
 from flask_babel import lazy_gettext as N_
 try:
@@ -52,6 +53,141 @@ def get_best_fit(width, height, image_width, image_height):
     return {'width': resize_width, 'height': resize_height}
 
 
+# Every cover thumbnail resolution is generated in both of these formats
+THUMBNAIL_FORMATS = ['webp', 'jpg']
+# Books whose thumbnails are generated, and Thumbnail rows committed, together
+THUMBNAIL_BATCH_SIZE = 50
+
+
+def get_thumbnail_workers():
+    """Number of processes rendering thumbnails, CWA_THUMBNAIL_WORKERS or all but one of the cores"""
+    try:
+        workers = int(os.environ.get('CWA_THUMBNAIL_WORKERS', 0))
+    except ValueError:
+        workers = 0
+    if workers < 1:
+        workers = min(8, (os.cpu_count() or 1) - 1)
+    return max(1, workers)
+
+
+def create_render_pool():
+    """A process pool for the image work of the thumbnail tasks. Spawned rather than forked,
+    as forking the threaded web process (and ImageMagick's own threads) can deadlock the children"""
+    workers = get_thumbnail_workers()
+    if workers < 2:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def run_renders(pool, renders):
+    """Runs (key, function, args) renders on the pool, or inline without one, yielding (key, error)
+    as each one finishes. Falls back to rendering inline if the pool's processes died"""
+    if pool is not None:
+        futures = {pool.submit(function, *args): (key, function, args) for key, function, args in renders}
+        for future in as_completed(futures):
+            key, function, args = futures[future]
+            error = future.exception()
+            if not isinstance(error, BrokenProcessPool):
+                yield key, error
+                continue
+            try:
+                function(*args)
+                yield key, None
+            except Exception as ex:
+                yield key, ex
+        return
+
+    for key, function, args in renders:
+        try:
+            function(*args)
+            yield key, None
+        except Exception as ex:
+            yield key, ex
+
+
+def get_cover_source(book):
+    """The cover to generate thumbnails from: its path, or its content when the library is on Google Drive"""
+    if config.config_use_google_drive:
+        if not gdriveutils.is_gdrive_ready():
+            raise Exception('Google Drive is configured but not ready')
+        content = gdriveutils.get_cover_via_gdrive(book.path)
+        if not content:
+            raise Exception('Google Drive cover url not found')
+        return content
+
+    book_cover_filepath = os.path.join(config.get_book_path(), book.path, 'cover.jpg')
+    if not os.path.isfile(book_cover_filepath):
+        raise Exception('Book cover file not found')
+    return book_cover_filepath
+
+
+def render_cover_thumbnails(source, outputs):
+    """Decodes a cover once and writes every thumbnail in outputs from it.
+
+    source is the cover's path, or its content as bytes. outputs is a list of (resolution, format, path).
+    The largest size is produced first and each smaller one is scaled down from the previous one,
+    which is a lot cheaper than going back to the full size cover every time.
+    """
+    image = Image(blob=source) if isinstance(source, bytes) else Image(filename=source)
+    with image as img:
+        for resolution in sorted({output[0] for output in outputs}, reverse=True):
+            height = get_resize_height(resolution)
+            if img.height > height:
+                width = get_resize_width(resolution, img.width, img.height)
+                img.resize(width=width, height=height, filter='lanczos')
+            for _, fmt, path in (output for output in outputs if output[0] == resolution):
+                # Set format for thumbnail
+                img.format = fmt
+                try:
+                    img.compression_quality = 82
+                except Exception:
+                    pass
+                img.save(filename=path)
+
+
+def render_series_thumbnail(sources, resolution, fmt, path):
+    """Composes the covers in sources (paths or contents, at most four) into a 2x2 series thumbnail"""
+    top = 0
+    left = 0
+    width = 0
+    height = 0
+    with Image() as canvas:
+        for source in sources:
+            image = Image(blob=source) if isinstance(source, bytes) else Image(filename=source)
+            with image as img:
+                # Use the first image in this set to determine the width and height to scale the
+                # other images in this set
+                if width == 0 or height == 0:
+                    width = get_resize_width(resolution, img.width, img.height)
+                    height = get_resize_height(resolution)
+                    canvas.blank(width, height)
+
+                dimensions = get_best_fit(width, height, img.width, img.height)
+
+                # resize and crop the image
+                img.resize(width=int(dimensions['width']), height=int(dimensions['height']), filter='lanczos')
+                img.crop(width=int(width / 2.0), height=int(height / 2.0), gravity='center')
+
+                # add the image to the canvas
+                canvas.composite(img, left, top)
+
+            # set the coordinates for the next iteration
+            if left == 0 and top == 0:
+                left = int(width / 2.0)
+            elif left == int(width / 2.0) and top == 0:
+                left = 0
+                top = int(height / 2.0)
+            else:
+                left = int(width / 2.0)
+
+        canvas.format = fmt
+        try:
+            canvas.compression_quality = 80
+        except Exception:
+            pass
+        canvas.save(filename=path)
+
+
 class TaskGenerateCoverThumbnails(CalibreTask):
     def __init__(self, book_id=-1, task_message=''):
         super(TaskGenerateCoverThumbnails, self).__init__(task_message)
@@ -59,6 +195,7 @@ class TaskGenerateCoverThumbnails(CalibreTask):
         self.book_id = book_id
         self.app_db_session = ub.get_new_session_instance()
         self.cache = fs.FileSystem()
+        self.pool = None
         self.resolutions = [
             constants.COVER_THUMBNAIL_SMALL,
             constants.COVER_THUMBNAIL_MEDIUM,
@@ -70,28 +207,36 @@ class TaskGenerateCoverThumbnails(CalibreTask):
             self.message = 'Scanning Books'
             books_with_covers = self.get_books_with_covers(self.book_id)
             count = len(books_with_covers)
+            # The image work is spread over a process pool, Thumbnail rows are only written from this thread
+            self.pool = create_render_pool() if count > 1 else None
 
             total_generated = 0
-            for i, book in enumerate(books_with_covers):
+            try:
+                for start in range(0, count, THUMBNAIL_BATCH_SIZE):
+                    batch = books_with_covers[start:start + THUMBNAIL_BATCH_SIZE]
 
-                # Generate new thumbnails for missing covers
-                generated = self.create_book_cover_thumbnails(book)
+                    # Generate new thumbnails for missing covers
+                    generated = self.create_books_cover_thumbnails(batch)
 
-                # Increment the progress
-                self.progress = (1.0 / count) * i
+                    # Increment the progress
+                    self.progress = (1.0 / count) * (start + len(batch))
 
-                if generated > 0:
-                    total_generated += generated
-                    self.message = N_('Generated %(count)s cover thumbnails', count=total_generated)
+                    if generated > 0:
+                        total_generated += generated
+                        self.message = N_('Generated %(count)s cover thumbnails', count=total_generated)
 
-                # Check if job has been cancelled or ended
-                if self.stat == STAT_CANCELLED:
-                    self.log.info(f'GenerateCoverThumbnails task has been cancelled.')
-                    return
+                    # Check if job has been cancelled or ended
+                    if self.stat == STAT_CANCELLED:
+                        self.log.info(f'GenerateCoverThumbnails task has been cancelled.')
+                        return
 
-                if self.stat == STAT_ENDED:
-                    self.log.info(f'GenerateCoverThumbnails task has been ended.')
-                    return
+                    if self.stat == STAT_ENDED:
+                        self.log.info(f'GenerateCoverThumbnails task has been ended.')
+                        return
+            finally:
+                if self.pool is not None:
+                    self.pool.shutdown(wait=True, cancel_futures=True)
+                    self.pool = None
 
             if total_generated == 0:
                 self.self_cleanup = True
@@ -100,183 +245,122 @@ class TaskGenerateCoverThumbnails(CalibreTask):
         self.app_db_session.remove()
 
     @staticmethod
-    def get_books_with_covers(book_id=-1):
-        filter_exp = (db.Books.id == book_id) if book_id != -1 else True
+    def get_books_with_covers(book_id=-1, book_ids=None):
+        if book_ids is not None:
+            filter_exp = db.Books.id.in_(book_ids)
+        else:
+            filter_exp = (db.Books.id == book_id) if book_id != -1 else True
         calibre_db = db.CalibreDB(expire_on_commit=False, init=True)
         books_cover = calibre_db.session.query(db.Books).filter(db.Books.has_cover == 1).filter(filter_exp).all()
         calibre_db.session.close()
         return books_cover
 
-    def get_book_cover_thumbnails(self, book_id):
+    def get_book_cover_thumbnails(self, book_ids):
         return self.app_db_session \
             .query(ub.Thumbnail) \
             .filter(ub.Thumbnail.type == constants.THUMBNAIL_TYPE_COVER) \
-            .filter(ub.Thumbnail.entity_id == book_id) \
+            .filter(ub.Thumbnail.entity_id.in_(book_ids)) \
             .filter(or_(ub.Thumbnail.expiration.is_(None), ub.Thumbnail.expiration > datetime.now(timezone.utc))) \
             .all()
 
     def create_book_cover_thumbnails(self, book):
-        generated = 0
-        book_cover_thumbnails = self.get_book_cover_thumbnails(book.id)
+        return self.create_books_cover_thumbnails([book])
+
+    def create_books_cover_thumbnails(self, books):
+        """Brings the cover thumbnails of a batch of books up to date. Each cover is decoded once for all
+        of its sizes and formats, and the Thumbnail rows of the whole batch are written in one transaction.
+        Returns the number of thumbnails (re)generated"""
+        existing = {}
+        for thumbnail in self.get_book_cover_thumbnails([book.id for book in books]):
+            existing.setdefault(thumbnail.entity_id, []).append(thumbnail)
+
+        pending = []
+        stale_files = []
+        for book in books:
+            thumbnails, superseded = self.plan_book_cover_thumbnails(book, existing.get(book.id, []))
+            stale_files.extend(superseded)
+            if thumbnails:
+                pending.append((book, thumbnails))
+        if not pending and not stale_files:
+            return 0
 
-        # Build a map: (resolution, format) -> thumbnail
-        thumb_map = {}
-        for t in book_cover_thumbnails:
-            thumb_map[(t.resolution, t.format.lower())] = t
-
-        # For each resolution and format, check if thumbnail exists and file is present
-        formats = ['webp', 'jpg']
-        for resolution in self.resolutions:
-            for fmt in formats:
-                thumb = thumb_map.get((resolution, fmt))
-                file_missing = True
-                if thumb:
-                    file_missing = not self.cache.get_cache_file_exists(thumb.filename, constants.CACHE_TYPE_THUMBNAILS)
-                if not thumb or file_missing:
-                    generated += 1
-                    self.create_book_cover_single_thumbnail_format(book, resolution, fmt)
-
-        # Replace outdated, legacy, or format-mismatch thumbnails
-        for thumbnail in book_cover_thumbnails:
-            try:
-                legacy_naming = not (thumbnail.filename.startswith('book_') or thumbnail.filename.startswith('series_'))
-                wrong_format = thumbnail.format.lower() not in formats
-                source_newer = book.last_modified.replace(tzinfo=None) > thumbnail.generated_at
-
-                # If any legacy condition matched, migrate: delete old file & regenerate with deterministic name
-                if legacy_naming or wrong_format:
-                    old_id = thumbnail.id
-                    old_filename = thumbnail.filename
-                    self.app_db_session.delete(thumbnail)
-                    self.app_db_session.commit()
-                    # Regenerate both formats for this resolution
-                    for fmt in formats:
-                        self.create_book_cover_single_thumbnail_format(book, thumbnail.resolution, fmt)
-                    # remove old file if still present
-                    try:
-                        self.cache.delete_cache_file(old_filename, constants.CACHE_TYPE_THUMBNAILS)
-                    except Exception:
-                        pass
-                    generated += 1
-                    continue
-
-                if source_newer:
-                    generated += 1
-                    self.update_book_cover_thumbnail(book, thumbnail)
-            except Exception as ex:
-                self.log.debug(f"Thumbnail migration/update issue for book {book.id}: {ex}")
-        return generated
-
-    def create_book_cover_single_thumbnail_format(self, book, resolution, fmt):
-        thumbnail = ub.Thumbnail()
-        thumbnail.type = constants.THUMBNAIL_TYPE_COVER
-        thumbnail.entity_id = book.id
-        thumbnail.format = fmt
-        thumbnail.resolution = resolution
-
-        self.app_db_session.add(thumbnail)
         try:
-            self.app_db_session.commit()
-            self.generate_book_thumbnail(book, thumbnail)
+            # Assigns the deterministic filenames of new rows
+            self.app_db_session.flush()
         except Exception as ex:
-            self.log.debug(f'Error creating {fmt.upper()} book thumbnail: ' + str(ex))
-            self._handleError(f'Error creating {fmt.upper()} book thumbnail: ' + str(ex))
+            self.log.debug('Error creating book thumbnails: ' + str(ex))
+            self._handleError('Error creating book thumbnails: ' + str(ex))
             self.app_db_session.rollback()
+            return 0
 
-    def create_book_cover_single_thumbnail(self, book, resolution):
-        # Generate WebP thumbnail (for web UI)
-        thumbnail_webp = ub.Thumbnail()
-        thumbnail_webp.type = constants.THUMBNAIL_TYPE_COVER
-        thumbnail_webp.entity_id = book.id
-        thumbnail_webp.format = 'webp'
-        thumbnail_webp.resolution = resolution
-
-        self.app_db_session.add(thumbnail_webp)
-        try:
-            self.app_db_session.commit()
-            self.generate_book_thumbnail(book, thumbnail_webp)
-        except Exception as ex:
-            self.log.debug('Error creating WebP book thumbnail: ' + str(ex))
-            self._handleError('Error creating WebP book thumbnail: ' + str(ex))
-            self.app_db_session.rollback()
+        generated = 0
+        renders = []
+        for book, thumbnails in pending:
+            generated += len(thumbnails)
+            outputs = [(thumbnail.resolution, thumbnail.format,
+                        self.cache.get_cache_file_path(thumbnail.filename, constants.CACHE_TYPE_THUMBNAILS))
+                       for thumbnail in thumbnails]
+            try:
+                renders.append((book.id, render_cover_thumbnails, (get_cover_source(book), outputs)))
+            except Exception as ex:
+                self.log.debug(f'Error generating thumbnails for book {book.id}: ' + str(ex))
+                self._handleError(f'Error generating thumbnails for book {book.id}: ' + str(ex))
 
-        # Generate JPEG thumbnail (for Kobo/devices)
-        thumbnail_jpg = ub.Thumbnail()
-        thumbnail_jpg.type = constants.THUMBNAIL_TYPE_COVER
-        thumbnail_jpg.entity_id = book.id
-        thumbnail_jpg.format = 'jpg'
-        thumbnail_jpg.resolution = resolution
+        for book_id, error in run_renders(self.pool, renders):
+            if error is not None:
+                self.log.debug(f'Error generating thumbnails for book {book_id}: ' + str(error))
+                self._handleError(f'Error generating thumbnails for book {book_id}: ' + str(error))
 
-        self.app_db_session.add(thumbnail_jpg)
         try:
             self.app_db_session.commit()
-            self.generate_book_thumbnail(book, thumbnail_jpg)
         except Exception as ex:
-            self.log.debug('Error creating JPEG book thumbnail: ' + str(ex))
-            self._handleError('Error creating JPEG book thumbnail: ' + str(ex))
+            self.log.debug('Error saving book thumbnails: ' + str(ex))
+            self._handleError('Error saving book thumbnails: ' + str(ex))
             self.app_db_session.rollback()
+            return generated
 
-    def update_book_cover_thumbnail(self, book, thumbnail):
-        thumbnail.generated_at = datetime.now(timezone.utc)
-
-        try:
-            self.app_db_session.commit()
-            self.cache.delete_cache_file(thumbnail.filename, constants.CACHE_TYPE_THUMBNAILS)
-            self.generate_book_thumbnail(book, thumbnail)
-        except Exception as ex:
-            self.log.debug('Error updating book thumbnail: ' + str(ex))
-            self._handleError('Error updating book thumbnail: ' + str(ex))
-            self.app_db_session.rollback()
+        for filename in stale_files:
+            try:
+                self.cache.delete_cache_file(filename, constants.CACHE_TYPE_THUMBNAILS)
+            except Exception:
+                pass
+        return generated
 
-    def generate_book_thumbnail(self, book, thumbnail):
-        if book and thumbnail:
-            if config.config_use_google_drive:
-                if not gdriveutils.is_gdrive_ready():
-                    raise Exception('Google Drive is configured but not ready')
+    def plan_book_cover_thumbnails(self, book, book_cover_thumbnails):
+        """Works out which of the book's thumbnails need (re)generating, adding rows for missing ones and
+        deleting legacy or format-mismatch rows. Nothing is committed.
+        Returns (thumbnails to render, cache files to delete once committed)"""
+        to_render = []
+        superseded = []
+        current = {}
+        for thumbnail in book_cover_thumbnails:
+            legacy_naming = not (thumbnail.filename.startswith('book_') or thumbnail.filename.startswith('series_'))
+            wrong_format = thumbnail.format.lower() not in THUMBNAIL_FORMATS
+            key = (thumbnail.resolution, thumbnail.format.lower())
+            # Migrate legacy and duplicate rows: delete them, the deterministic name is regenerated below
+            if legacy_naming or wrong_format or key in current:
+                if thumbnail.filename not in [t.filename for t in current.values()]:
+                    superseded.append(thumbnail.filename)
+                self.app_db_session.delete(thumbnail)
+                continue
+            current[key] = thumbnail
 
-                content = gdriveutils.get_cover_via_gdrive(book.path)
-                if not content:
-                    raise Exception('Google Drive cover url not found')
-                try:
-                    stream = BytesIO(content)
-                    with Image(file=stream) as img:
-                        filename = self.cache.get_cache_file_path(thumbnail.filename,
-                                                                  constants.CACHE_TYPE_THUMBNAILS)
-                        height = get_resize_height(thumbnail.resolution)
-                        if img.height > height:
-                            width = get_resize_width(thumbnail.resolution, img.width, img.height)
-                            img.resize(width=width, height=height, filter='lanczos')
-                        # Set format for thumbnail
-                        img.format = thumbnail.format
-                        try:
-                            img.compression_quality = 82
-                        except Exception:
-                            pass
-                        img.save(filename=filename)
-                except Exception as ex:
-                    self.log.debug('Error generating thumbnail file: ' + str(ex))
-                    raise ex
-                finally:
-                    if stream is not None:
-                        stream.close()
-            else:
-                book_cover_filepath = os.path.join(config.get_book_path(), book.path, 'cover.jpg')
-                if not os.path.isfile(book_cover_filepath):
-                    raise Exception('Book cover file not found')
-
-                with Image(filename=book_cover_filepath) as img:
-                    height = get_resize_height(thumbnail.resolution)
-                    filename = self.cache.get_cache_file_path(thumbnail.filename, constants.CACHE_TYPE_THUMBNAILS)
-                    if img.height > height:
-                        width = get_resize_width(thumbnail.resolution, img.width, img.height)
-                        img.resize(width=width, height=height, filter='lanczos')
-                    # Set format for thumbnail
-                    img.format = thumbnail.format
-                    try:
-                        img.compression_quality = 82
-                    except Exception:
-                        pass
-                    img.save(filename=filename)
+        for resolution in self.resolutions:
+            for fmt in THUMBNAIL_FORMATS:
+                thumbnail = current.get((resolution, fmt))
+                if thumbnail is None:
+                    thumbnail = ub.Thumbnail()
+                    thumbnail.type = constants.THUMBNAIL_TYPE_COVER
+                    thumbnail.entity_id = book.id
+                    thumbnail.format = fmt
+                    thumbnail.resolution = resolution
+                    self.app_db_session.add(thumbnail)
+                    to_render.append(thumbnail)
+                elif (book.last_modified.replace(tzinfo=None) > thumbnail.generated_at
+                      or not self.cache.get_cache_file_exists(thumbnail.filename, constants.CACHE_TYPE_THUMBNAILS)):
+                    thumbnail.generated_at = datetime.now(timezone.utc)
+                    to_render.append(thumbnail)
+        return to_render, superseded
 
     @property
     def name(self):
@@ -293,6 +377,45 @@ class TaskGenerateCoverThumbnails(CalibreTask):
         return True
 
 
+class MissingCoverThumbnails(CoalescingQueue):
+    """Books a cover request found without thumbnails. A single hidden task works them off in the
+    background, so a page full of new books neither renders in the request nor queues a task per cover"""
+    def add(self, book_id):
+        return super(MissingCoverThumbnails, self).add([book_id])
+
+
+missing_cover_thumbnails = MissingCoverThumbnails()
+
+
+class TaskGenerateMissingCoverThumbnails(TaskGenerateCoverThumbnails):
+    def __init__(self, task_message=''):
+        super(TaskGenerateMissingCoverThumbnails, self).__init__(task_message=task_message)
+
+    def run(self, worker_thread):
+        total_generated = 0
+        drained = False
+        try:
+            while use_IM and self.stat != STAT_CANCELLED and self.stat != STAT_ENDED:
+                book_ids = missing_cover_thumbnails.take()
+                if not book_ids:
+                    drained = True
+                    break
+                books = self.get_books_with_covers(book_ids=list(book_ids))
+                for start in range(0, len(books), THUMBNAIL_BATCH_SIZE):
+                    total_generated += self.create_books_cover_thumbnails(books[start:start + THUMBNAIL_BATCH_SIZE])
+        finally:
+            if not drained:
+                missing_cover_thumbnails.release()
+
+        if total_generated == 0:
+            self.self_cleanup = True
+        self._handleSuccess()
+        self.app_db_session.remove()
+
+    def __str__(self):
+        return "Generate Missing Cover Thumbnails"
+
+
 class TaskGenerateSeriesThumbnails(CalibreTask):
     def __init__(self, task_message=''):
         super(TaskGenerateSeriesThumbnails, self).__init__(task_message)
@@ -300,6 +423,7 @@ class TaskGenerateSeriesThumbnails(CalibreTask):
         self.app_db_session = ub.get_new_session_instance()
         self.calibre_db = db.CalibreDB(expire_on_commit=False, init=True)
         self.cache = fs.FileSystem()
+        self.pool = None
         self.resolutions = [
             constants.COVER_THUMBNAIL_SMALL,
             constants.COVER_THUMBNAIL_MEDIUM,
@@ -310,45 +434,36 @@ class TaskGenerateSeriesThumbnails(CalibreTask):
             self.message = 'Scanning Series'
             all_series = self.get_series_with_four_plus_books()
             count = len(all_series)
+            # The image work is spread over a process pool, Thumbnail rows are only written from this thread
+            self.pool = create_render_pool() if count > 1 else None
 
             total_generated = 0
-            for i, series in enumerate(all_series):
-                generated = 0
-                series_thumbnails = self.get_series_thumbnails(series.id)
-                series_books = self.get_series_books(series.id)
-
-                # Generate new thumbnails for missing covers
-                resolutions = list(map(lambda t: t.resolution, series_thumbnails))
-                missing_resolutions = list(set(self.resolutions).difference(resolutions))
-                for resolution in missing_resolutions:
-                    generated += 1
-                    self.create_series_thumbnail(series, series_books, resolution)
-
-                # Replace outdated or missing thumbnails
-                for thumbnail in series_thumbnails:
-                    if any(book.last_modified > thumbnail.generated_at for book in series_books):
-                        generated += 1
-                        self.update_series_thumbnail(series_books, thumbnail)
-
-                    elif not self.cache.get_cache_file_exists(thumbnail.filename, constants.CACHE_TYPE_THUMBNAILS):
-                        generated += 1
-                        self.update_series_thumbnail(series_books, thumbnail)
-
-                # Increment the progress
-                self.progress = (1.0 / count) * i
-
-                if generated > 0:
-                    total_generated += generated
-                    self.message = N_('Generated {0} series thumbnails').format(total_generated)
-
-                # Check if job has been cancelled or ended
-                if self.stat == STAT_CANCELLED:
-                    self.log.info(f'GenerateSeriesThumbnails task has been cancelled.')
-                    return
-
-                if self.stat == STAT_ENDED:
-                    self.log.info(f'GenerateSeriesThumbnails task has been ended.')
-                    return
+            try:
+                for start in range(0, count, THUMBNAIL_BATCH_SIZE):
+                    batch = all_series[start:start + THUMBNAIL_BATCH_SIZE]
+
+                    # Generate new and replace outdated or missing thumbnails
+                    generated = self.create_series_thumbnails(batch)
+
+                    # Increment the progress
+                    self.progress = (1.0 / count) * (start + len(batch))
+
+                    if generated > 0:
+                        total_generated += generated
+                        self.message = N_('Generated {0} series thumbnails').format(total_generated)
+
+                    # Check if job has been cancelled or ended
+                    if self.stat == STAT_CANCELLED:
+                        self.log.info(f'GenerateSeriesThumbnails task has been cancelled.')
+                        return
+
+                    if self.stat == STAT_ENDED:
+                        self.log.info(f'GenerateSeriesThumbnails task has been ended.')
+                        return
+            finally:
+                if self.pool is not None:
+                    self.pool.shutdown(wait=True, cancel_futures=True)
+                    self.pool = None
 
             if total_generated == 0:
                 self.self_cleanup = True
@@ -383,118 +498,69 @@ class TaskGenerateSeriesThumbnails(CalibreTask):
             .filter(or_(ub.Thumbnail.expiration.is_(None), ub.Thumbnail.expiration > datetime.now(timezone.utc)))
             .all())
 
-    def create_series_thumbnail(self, series, series_books, resolution):
-        thumbnail = ub.Thumbnail()
-        thumbnail.type = constants.THUMBNAIL_TYPE_SERIES
-        thumbnail.entity_id = series.id
-        # Store series thumbnails as WebP as well
-        thumbnail.format = 'webp'
-        thumbnail.resolution = resolution
+    def create_series_thumbnails(self, all_series):
+        """Generates the missing and outdated thumbnails of a batch of series, writing their Thumbnail
+        rows in one transaction. Returns the number of thumbnails (re)generated"""
+        pending = []
+        for series in all_series:
+            series_thumbnails = self.get_series_thumbnails(series.id)
+            series_books = self.get_series_books(series.id)
+
+            # Generate new thumbnails for missing covers
+            resolutions = list(map(lambda t: t.resolution, series_thumbnails))
+            for resolution in set(self.resolutions).difference(resolutions):
+                thumbnail = ub.Thumbnail()
+                thumbnail.type = constants.THUMBNAIL_TYPE_SERIES
+                thumbnail.entity_id = series.id
+                # Store series thumbnails as WebP as well
+                thumbnail.format = 'webp'
+                thumbnail.resolution = resolution
+                self.app_db_session.add(thumbnail)
+                pending.append((series, series_books, thumbnail))
+
+            # Replace outdated or missing thumbnails
+            for thumbnail in series_thumbnails:
+                if (any(book.last_modified > thumbnail.generated_at for book in series_books)
+                        or not self.cache.get_cache_file_exists(thumbnail.filename, constants.CACHE_TYPE_THUMBNAILS)):
+                    thumbnail.generated_at = datetime.now(timezone.utc)
+                    pending.append((series, series_books, thumbnail))
+        if not pending:
+            return 0
 
-        self.app_db_session.add(thumbnail)
         try:
-            self.app_db_session.commit()
-            self.generate_series_thumbnail(series_books, thumbnail)
+            # Assigns the deterministic filenames of new rows
+            self.app_db_session.flush()
         except Exception as ex:
-            self.log.debug('Error creating book thumbnail: ' + str(ex))
-            self._handleError('Error creating book thumbnail: ' + str(ex))
+            self.log.debug('Error creating series thumbnails: ' + str(ex))
+            self._handleError('Error creating series thumbnails: ' + str(ex))
             self.app_db_session.rollback()
+            return 0
 
-    def update_series_thumbnail(self, series_books, thumbnail):
-        thumbnail.generated_at = datetime.now(timezone.utc)
+        renders = []
+        for series, series_books, thumbnail in pending:
+            # Get the last four books in the series based on series_index
+            books = sorted(series_books, key=lambda b: float(b.series_index), reverse=True)[:4]
+            filename = self.cache.get_cache_file_path(thumbnail.filename, constants.CACHE_TYPE_THUMBNAILS)
+            try:
+                sources = [get_cover_source(book) for book in books]
+                renders.append((series.id, render_series_thumbnail,
+                                (sources, thumbnail.resolution, thumbnail.format, filename)))
+            except Exception as ex:
+                self.log.debug(f'Error generating thumbnail for series {series.id}: ' + str(ex))
+                self._handleError(f'Error generating thumbnail for series {series.id}: ' + str(ex))
+
+        for series_id, error in run_renders(self.pool, renders):
+            if error is not None:
+                self.log.debug(f'Error generating thumbnail for series {series_id}: ' + str(error))
+                self._handleError(f'Error generating thumbnail for series {series_id}: ' + str(error))
 
         try:
             self.app_db_session.commit()
-            self.cache.delete_cache_file(thumbnail.filename, constants.CACHE_TYPE_THUMBNAILS)
-            self.generate_series_thumbnail(series_books, thumbnail)
         except Exception as ex:
-            self.log.debug('Error updating book thumbnail: ' + str(ex))
-            self._handleError('Error updating book thumbnail: ' + str(ex))
+            self.log.debug('Error saving series thumbnails: ' + str(ex))
+            self._handleError('Error saving series thumbnails: ' + str(ex))
             self.app_db_session.rollback()
-
-    def generate_series_thumbnail(self, series_books, thumbnail):
-        # Get the last four books in the series based on series_index
-        books = sorted(series_books, key=lambda b: float(b.series_index), reverse=True)[:4]
-
-        top = 0
-        left = 0
-        width = 0
-        height = 0
-        with Image() as canvas:
-            for book in books:
-                if config.config_use_google_drive:
-                    if not gdriveutils.is_gdrive_ready():
-                        raise Exception('Google Drive is configured but not ready')
-
-                    web_content_link = gdriveutils.get_cover_via_gdrive(book.path)
-                    if not web_content_link:
-                        raise Exception('Google Drive cover url not found')
-
-                    stream = None
-                    try:
-                        stream = urlopen(web_content_link)
-                        with Image(file=stream) as img:
-                            # Use the first image in this set to determine the width and height to scale the
-                            # other images in this set
-                            if width == 0 or height == 0:
-                                width = get_resize_width(thumbnail.resolution, img.width, img.height)
-                                height = get_resize_height(thumbnail.resolution)
-                                canvas.blank(width, height)
-
-                            dimensions = get_best_fit(width, height, img.width, img.height)
-
-                            # resize and crop the image
-                            img.resize(width=int(dimensions['width']), height=int(dimensions['height']),
-                                       filter='lanczos')
-                            img.crop(width=int(width / 2.0), height=int(height / 2.0), gravity='center')
-
-                            # add the image to the canvas
-                            canvas.composite(img, left, top)
-
-                    except Exception as ex:
-                        self.log.debug('Error generating thumbnail file: ' + str(ex))
-                        raise ex
-                    finally:
-                        if stream is not None:
-                            stream.close()
-
-                book_cover_filepath = os.path.join(config.get_book_path(), book.path, 'cover.jpg')
-                if not os.path.isfile(book_cover_filepath):
-                    raise Exception('Book cover file not found')
-
-                with Image(filename=book_cover_filepath) as img:
-                    # Use the first image in this set to determine the width and height to scale the
-                    # other images in this set
-                    if width == 0 or height == 0:
-                        width = get_resize_width(thumbnail.resolution, img.width, img.height)
-                        height = get_resize_height(thumbnail.resolution)
-                        canvas.blank(width, height)
-
-                    dimensions = get_best_fit(width, height, img.width, img.height)
-
-                    # resize and crop the image
-                    img.resize(width=int(dimensions['width']), height=int(dimensions['height']), filter='lanczos')
-                    img.crop(width=int(width / 2.0), height=int(height / 2.0), gravity='center')
-
-                    # add the image to the canvas
-                    canvas.composite(img, left, top)
-
-                # set the coordinates for the next iteration
-                if left == 0 and top == 0:
-                    left = int(width / 2.0)
-                elif left == int(width / 2.0) and top == 0:
-                    left = 0
-                    top = int(height / 2.0)
-                else:
-                    left = int(width / 2.0)
-
-            canvas.format = thumbnail.format
-            filename = self.cache.get_cache_file_path(thumbnail.filename, constants.CACHE_TYPE_THUMBNAILS)
-            try:
-                canvas.compression_quality = 80
-            except Exception:
-                pass
-            canvas.save(filename=filename)
+        return len(pending)
 
     @property
     def name(self):
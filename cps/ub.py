@@ -10,6 +10,7 @@ import os
 import sys
 from datetime import datetime, timezone, timedelta
 import itertools
+from array import array
 import uuid
 from flask import session as flask_session
 from binascii import hexlify
@@ -112,16 +113,14 @@ def check_user_session(user_id, session_key, random):
 user_logged_in.connect(signal_store_user_session)
 
 def store_ids(result):
-    ids = list()
-    for element in result:
-        ids.append(element.id)
-    searched_ids[current_user.id] = ids
+    store_book_ids(element.id for element in result)
 
 def store_combo_ids(result):
-    ids = list()
-    for element in result:
-        ids.append(element[0].id)
-    searched_ids[current_user.id] = ids
+    store_book_ids(element[0].id for element in result)
+
+def store_book_ids(book_ids):
+    # Book ids of a search can run into the hundred thousands, keep them as a packed int array
+    searched_ids[current_user.id] = array('i', book_ids)
 
 
 class UserBase:
@@ -15,14 +15,19 @@ from pathlib import Path
 import subprocess
 import tempfile
 import atexit
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime
+from itertools import groupby
 import sqlite3
+from typing import Iterator
 
 import pwd
 import grp
 
 from cwa_db import CWA_DB
 from kindle_epub_fixer import EPUBFixer
+from run_status import RunStatus, CONVERT_LIBRARY_STATUS
 
 ### Global Variables
 convert_library_log_file = "/config/convert-library.log"
@@ -91,10 +96,72 @@ backup_destinations = {
     }
 
 
+def get_conversion_workers(requested: int | None = None) -> int:
+    """Number of books to convert at once. Taken from --workers, then the CWA_CONVERT_WORKERS
+    env variable, otherwise half the available cores (capped at 4, ebook-convert is memory hungry)"""
+    if requested is None:
+        try:
+            requested = int(os.getenv("CWA_CONVERT_WORKERS", "0"))
+        except ValueError:
+            print_and_log(f"[convert-library]: WARNING - Invalid CWA_CONVERT_WORKERS value '{os.getenv('CWA_CONVERT_WORKERS')}', using the default.")
+            requested = 0
+    if requested > 0:
+        return requested
+    return max(1, min(4, (os.cpu_count() or 1) // 2))
+
+
+def get_book_id(filepath: str) -> str | None:
+    """Gets the Calibre Library Book ID from the immediate book folder (e.g., "Title (6120)")"""
+    m = re.search(r"\((\d+)\)$", os.path.basename(os.path.dirname(filepath)))
+    return m.group(1) if m else None
+
+
+class ConversionJob:
+    """A single book's trip through the conversion pool.
+
+    Conversion happens on a worker thread, so anything the worker wants to say is buffered and
+    only written out by the main thread (see flush) once it gets round to importing the book."""
+    def __init__(self, filepath: str, position: int, total: int, work_dir: str, resume_path: str | None = None) -> None:
+        self.filepath = filepath
+        self.position = position
+        self.total = total
+        self.work_dir = work_dir
+        self.book_id = get_book_id(filepath)
+        # Converted file left behind by an interrupted run, imported without converting again
+        self.resume_path = resume_path
+        self.target_filepath: str | None = None
+        self.failure_reason = ""
+        # Args for CWA_DB.conversion_add_entry, cwa.db is only written to from the main thread
+        self.conversion_entry: tuple | None = None
+        self.epub_fixer_entry: tuple | None = None
+        self.output: list[tuple[str, bool]] = []
+
+    @property
+    def progress(self) -> str:
+        return f"({self.position}/{self.total})"
+
+    def print_and_log(self, string) -> None:
+        self.output.append((string, True))
+
+    def output_line(self, line, verbose: bool) -> None:
+        """Tool output is only written to the log in verbose mode"""
+        self.output.append((line, verbose))
+
+    def flush(self) -> None:
+        for string, log in self.output:
+            if log:
+                print_and_log(string)
+            else:
+                print(string)
+        self.output = []
+
+
 class LibraryConverter:
-    def __init__(self, args) -> None:
+    def __init__(self, args, run_status: RunStatus | None = None) -> None:
         self.args = args
         self.verbose = getattr(args, 'verbose', False)  # Safe attribute access
+        # Progress published for the Web UI's status poll
+        self.run_status = run_status
 
         self.db = CWA_DB()
         self.cwa_settings = self.db.cwa_settings
@@ -123,9 +190,12 @@ class LibraryConverter:
         self.kindle_epub_fixer = self.cwa_settings['kindle_epub_fixer']
 
         self.supported_book_formats = {'acsm', 'azw', 'azw3', 'azw4', 'cbz', 'cbr', 'cb7', 'cbc', 'chm', 'djvu', 'docx', 'epub', 'fb2', 'fbz', 'html', 'htmlz', 'lit', 'lrf', 'mobi', 'odt', 'pdf', 'prc', 'pdb', 'pml', 'rb', 'rtf', 'snb', 'tcr', 'txt', 'txtz', 'kfx', 'kfx-zip'}
-        self.hierarchy_of_success = {'epub', 'lit', 'mobi', 'azw', 'azw3', 'fb2', 'fbz', 'azw4', 'prc', 'odt', 'lrf', 'pdb',  'cbz', 'pml', 'rb', 'cbr', 'cb7', 'cbc', 'chm', 'djvu', 'snb', 'tcr', 'pdf', 'docx', 'rtf', 'html', 'htmlz', 'txtz', 'txt', 'kfx', 'kfx-zip'}
+        # Ordered, most reliable source format for conversion first
+        self.hierarchy_of_success = ['epub', 'lit', 'mobi', 'azw', 'azw3', 'fb2', 'fbz', 'azw4', 'prc', 'odt', 'lrf', 'pdb',  'cbz', 'pml', 'rb', 'cbr', 'cb7', 'cbc', 'chm', 'djvu', 'snb', 'tcr', 'pdf', 'docx', 'rtf', 'html', 'htmlz', 'txtz', 'txt', 'kfx', 'kfx-zip']
 
         self.current_book = 1
+        self.workers = get_conversion_workers(getattr(args, 'workers', None))
+        self.retry_failed = getattr(args, 'retry_failed', False)
         self.ingest_folder, self.library_dir, self.tmp_conversion_dir = self.get_dirs('/app/calibre-web-automated/dirs.json')
 
         self.calibre_env = os.environ.copy()
@@ -133,10 +203,14 @@ class LibraryConverter:
         self.calibre_env["HOME"] = "/config"
         # Gets split library info from app.db and sets library dir to the split dir if split library is enabled
         self.split_library = self.get_split_library()
+        self.metadata_db = os.path.join(self.library_dir, "metadata.db")
         if self.split_library:
             self.library_dir = self.split_library["split_path"]
-            self.calibre_env['CALIBRE_OVERRIDE_DATABASE_PATH'] = os.path.join(self.split_library["db_path"], "metadata.db")
-        self.to_convert = self.get_books_to_convert()
+            self.metadata_db = os.path.join(self.split_library["db_path"], "metadata.db")
+            self.calibre_env['CALIBRE_OVERRIDE_DATABASE_PATH'] = self.metadata_db
+        # Books converted by an interrupted run but never imported, by book id
+        self.resumable: dict[int, str] = {}
+        self.to_convert = self.skip_finished_jobs(self.get_books_to_convert())
 
 
     def get_split_library(self) -> dict[str, str] | None:
@@ -253,39 +327,36 @@ class LibraryConverter:
 
         return book_formats
 
-    def get_books_to_convert(self):
-        """Returns a list of book format paths to convert."""
-        library_formats = self.get_library_book_formats()
-
-        if not library_formats:
-            print_and_log("[convert-library]: No books found in library or unable to retrieve format information.")
-            return []
-
-        # Filter out books already in the target format (case-insensitive)
-        books_with_target_format = set()
-        for book_id, formats in library_formats.items():
-            for format_path in formats:
-                if not format_path or not isinstance(format_path, str):
-                    continue
-                try:
-                    if format_path.lower().endswith(f'.{self.target_format.lower()}'):
-                        books_with_target_format.add(book_id)
-                        break  # No need to check other formats for this book
-                except (AttributeError, UnicodeError):
-                    # Skip problematic format paths
-                    if self.verbose:
-                        print_and_log(f"[convert-library]: Skipping problematic format path: {format_path}")
-                    continue
-        
-        if self.verbose:
-            print_and_log(f"[convert-library]: Found {len(books_with_target_format)} books already in {self.target_format} format")
+    def iter_library_formats(self) -> Iterator[tuple[int, str, str]]:
+        """Lazily yields (book_id, format, path) for every format of every book, ordered by book id.
+        Read straight from metadata.db (read only), falling back to calibredb if it can't be opened."""
+        try:
+            con = sqlite3.connect(Path(self.metadata_db).resolve().as_uri() + "?mode=ro", uri=True, timeout=30)
+            rows = con.execute("""
+                SELECT data.book, data.format, books.path, data.name
+                FROM data JOIN books ON books.id = data.book
+                ORDER BY data.book
+            """)
+        except sqlite3.Error as e:
+            print_and_log(f"[convert-library]: Unable to read {self.metadata_db} directly ({e}), falling back to calibredb...")
+            for book_id, formats in self.get_library_book_formats().items():
+                for format_path in formats:
+                    yield book_id, Path(format_path).suffix[1:].lower(), format_path
+            return
 
-        books_to_convert = [book_id for book_id in library_formats.keys() 
-                           if book_id not in books_with_target_format]
-        
         if self.verbose:
-            print_and_log(f"[convert-library]: {len(books_to_convert)} books need conversion to {self.target_format}")
+            print_and_log(f"[convert-library]: Retrieving book format information from library database: {self.metadata_db}")
+        try:
+            for book_id, book_format, book_path, name in rows:
+                if not book_format or not book_path or not name:
+                    continue
+                book_format = book_format.lower()
+                yield book_id, book_format, os.path.join(self.library_dir, book_path, f"{name}.{book_format}")
+        finally:
+            con.close()
 
+    def get_books_to_convert(self):
+        """Returns a list of book format paths to convert, worked out in a single pass over the library's formats."""
         # Filter out source formats the user chose to ignore.
         hierarchy_of_success_formats = [format for format in self.hierarchy_of_success if format not in self.convert_ignored_formats]
 
@@ -296,60 +367,88 @@ class LibraryConverter:
         if self.convert_ignored_formats:
             print_and_log(f"{', '.join(self.convert_ignored_formats)} in list of user-defined ignored formats for conversion. To change this, navigate to the CWA Settings panel from the Settings page in the Web UI.")
 
+        success_rank = {format: rank for rank, format in enumerate(hierarchy_of_success_formats)}
+        target_format = self.target_format.lower()
+
         # Will only contain a single filepath for each book without an existing file in
         # the target format in the format with the highest available conversion success
         # rate, where that filepath is allow to be converted
         to_convert = []
-
-        for book_id in books_to_convert:
-            book_formats = library_formats.get(book_id, [])
-            if not book_formats:
-                if self.verbose:
-                    print_and_log(f"[convert-library]: Skipping book {book_id} - no formats found")
+        total_books = 0
+        books_with_target_format = 0
+
+        for book_id, rows in groupby(self.iter_library_formats(), key=lambda row: row[0]):
+            total_books += 1
+            book_formats = [(book_format, path) for _, book_format, path in rows]
+            if any(book_format == target_format for book_format, _ in book_formats):
+                books_with_target_format += 1
                 continue
-                
-            # If multiple formats for a book exist, only the one with the highest
-            # success rate will be converted and the rest will be left alone
-            for format_ext in hierarchy_of_success_formats:
-                if not format_ext or not isinstance(format_ext, str):
-                    continue  # Skip invalid format extensions
-                    
-                # Case-insensitive format matching and file existence validation
-                source_formats = []
-                for filepath in book_formats:
-                    if not filepath or not isinstance(filepath, str):
-                        continue
-                    try:
-                        if (filepath.lower().endswith(f'.{format_ext.lower()}') 
-                            and os.path.exists(filepath)):
-                            source_formats.append(filepath)
-                    except (OSError, AttributeError, UnicodeError):
-                        # Skip files with problematic paths
-                        if self.verbose:
-                            print_and_log(f"[convert-library]: Skipping problematic file path: {filepath}")
-                        continue
-                if source_formats:
-                    to_convert.append(source_formats[0])
+
+            # If multiple formats for a book exist, only the one with the highest success rate
+            # will be converted and the rest will be left alone. Only that file (and any missing
+            # ones ranked above it) is checked on disk.
+            candidates = sorted((success_rank[book_format], path) for book_format, path in book_formats if book_format in success_rank)
+            for _, path in candidates:
+                if os.path.exists(path):
+                    to_convert.append(path)
                     if self.verbose:
-                        print_and_log(f"[convert-library]: Selected {source_formats[0]} for conversion (format: {format_ext})")
+                        print_and_log(f"[convert-library]: Selected {path} for conversion (format: {Path(path).suffix[1:].lower()})")
                     break
             else:
                 # No valid source format found for this book
                 if self.verbose:
-                    available_formats = []
-                    for f in book_formats:
-                        if f and os.path.exists(f):
-                            try:
-                                ext = os.path.splitext(f)[1][1:].lower()
-                                if ext:  # Only add non-empty extensions
-                                    available_formats.append(ext)
-                            except (IndexError, AttributeError):
-                                continue  # Skip malformed paths
+                    available_formats = [book_format for book_format, _ in book_formats]
                     print_and_log(f"[convert-library]: No suitable source format found for book {book_id}. Available: {available_formats}, Hierarchy: {hierarchy_of_success_formats}")
 
+        if not total_books:
+            print_and_log("[convert-library]: No books found in library or unable to retrieve format information.")
+            return []
+
+        if self.verbose:
+            print_and_log(f"[convert-library]: Found {total_books} books with format information, {books_with_target_format} already in {self.target_format} format")
+            print_and_log(f"[convert-library]: {len(to_convert)} books need conversion to {self.target_format}")
+
         return to_convert
 
 
+    def skip_finished_jobs(self, to_convert: list[str]) -> list[str]:
+        """Uses the conversion jobs recorded in cwa.db by earlier runs to drop books that already failed
+        to convert from the same source file, and to pick up books that an interrupted run converted but
+        never imported. Books an earlier run imported already have the target format, so never get this far."""
+        if self.retry_failed:
+            cleared = self.db.conversion_jobs_clear_failed(self.target_format)
+            if cleared:
+                print_and_log(f"[convert-library]: Retrying {cleared} books that failed to convert in previous runs")
+
+        previous_jobs = self.db.conversion_jobs_get(self.target_format)
+        if not previous_jobs:
+            return to_convert
+
+        remaining = []
+        skipped = 0
+        for file in to_convert:
+            book_id = get_book_id(file)
+            job = previous_jobs.get(int(book_id)) if book_id else None
+            if job is None:
+                remaining.append(file)
+                continue
+
+            if job['state'] == 'failed' and job['source_path'] == file:
+                skipped += 1
+                if self.verbose:
+                    print_and_log(f"[convert-library]: Skipping {os.path.basename(file)}, it failed to convert in a previous run: {job['reason']}")
+                continue
+            if job['state'] == 'converted' and job['converted_path'] and os.path.isfile(job['converted_path']):
+                self.resumable[int(book_id)] = job['converted_path']
+            remaining.append(file)
+
+        if skipped:
+            print_and_log(f"[convert-library]: Skipping {skipped} books that failed to convert in previous runs. Run convert-library with --retry-failed to try them again.")
+        if self.resumable:
+            print_and_log(f"[convert-library]: Resuming the import of {len(self.resumable)} books converted by a previous run that didn't finish")
+        return remaining
+
+
     def backup(self, input_file, backup_type):
         try:
             output_path = backup_destinations[backup_type]
@@ -359,75 +458,159 @@ class LibraryConverter:
 
 
     def convert_library(self):
-        for file in self.to_convert:
-            filename = os.path.basename(file)
-            file_extension = Path(file).suffix
+        """Converts the books in self.to_convert on a pool of self.workers conversion workers.
+
+        ebook-convert, kepubify and the EPUB fixer run concurrently, while importing into
+        metadata.db and recording history in cwa.db stay on this thread, one book at a time and
+        in library order. Each book's output is held back until it is imported so the log (and
+        its (x/y) progress) reads the same as a serial run."""
+        if self.workers > 1:
+            print_and_log(f"[convert-library]: Converting {len(self.to_convert)} books using {self.workers} conversion workers...")
+
+        jobs = []
+        for position, file in enumerate(self.to_convert, start=1):
+            book_id = get_book_id(file)
+            resume_path = self.resumable.get(int(book_id)) if book_id else None
+            # Keyed by book id so a later run can find the converted file again if this one is interrupted
+            work_dir = os.path.dirname(resume_path) if resume_path else os.path.join(self.tmp_conversion_dir, f"convert-{book_id or position}")
+            jobs.append(ConversionJob(file, position, len(self.to_convert), work_dir, resume_path))
+        self.db.conversion_jobs_add_pending([(job.book_id, job.filepath) for job in jobs if job.book_id and not job.resume_path],
+                                            self.target_format)
+        # Allow converted books to queue up behind a slow one without leaving the other workers idle
+        max_pending = self.workers * 4
+        pending = deque()
+        recorded = set()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="convert-library") as executor:
+            for job in jobs:
+                pending.append(executor.submit(self.convert_book, job))
+                if len(pending) >= max_pending:
+                    self.import_book(self.next_converted(pending, recorded))
+            while pending:
+                self.import_book(self.next_converted(pending, recorded))
+
+        self.empty_tmp_con_dir()
+
+
+    def next_converted(self, pending: deque[Future], recorded: set[Future]) -> ConversionJob:
+        """Waits for the oldest book in pending to be converted. Books finishing in the meantime are recorded
+        as converted straight away, so an interrupted run imports them instead of converting them again"""
+        while True:
+            for future in pending:
+                if future.done() and future not in recorded:
+                    recorded.add(future)
+                    if future.exception() is None:
+                        self.record_converted(future.result())
+            if pending[0].done():
+                break
+            wait([future for future in pending if not future.done()], return_when=FIRST_COMPLETED)
+
+        future = pending.popleft()
+        recorded.discard(future)
+        return future.result()
+
+
+    def record_converted(self, job: ConversionJob) -> None:
+        if job.book_id and job.target_filepath and not job.resume_path:
+            self.db.conversion_job_set_state(job.book_id, self.target_format, 'converted', converted_path=job.target_filepath)
+
+
+    def convert_book(self, job: ConversionJob) -> ConversionJob:
+        """Runs on a conversion worker. Converts the book into the job's own tmp dir, leaving
+        job.target_filepath set if there is something to import"""
+        file = job.filepath
+        filename = os.path.basename(file)
+        file_extension = Path(file).suffix
+
+        if job.resume_path:
+            job.print_and_log(f"[convert-library]: {job.progress} {filename} was already converted to {self.target_format} format by a previous run, importing it now...")
+            job.target_filepath = job.resume_path
+            return job
+
+        job.print_and_log(f"[convert-library]: {job.progress} Converting {filename} from {file_extension} format to {self.target_format} format...")
+
+        if job.book_id is None:
+            job.print_and_log(f"[convert-library]: {job.progress} A Calibre Library Book ID could not be determined for {file}. Make sure the structure of your calibre library matches the following example:\n")
+            job.print_and_log("Terry Goodkind/")
+            job.print_and_log("└── Wizard's First Rule (6120)")
+            job.print_and_log("    ├── cover.jpg")
+            job.print_and_log("    ├── metadata.opf")
+            job.print_and_log("    └── Wizard's First Rule - Terry Goodkind.epub")
+
+            self.backup(file, backup_type="failed")
+            return job
+
+        os.makedirs(job.work_dir, exist_ok=True)
+
+        if self.target_format == "kepub":
+            convert_successful, target_filepath = self.convert_to_kepub(job, file_extension)
+            if not convert_successful:
+                job.print_and_log(f"[convert-library]: {job.progress} Conversion of {os.path.basename(file)} was unsuccessful. Moving to next book...")
+                job.failure_reason = job.failure_reason or "Conversion to kepub failed"
+                return job
+        else:
+            try: # Convert Book to target format (target is not kepub)
+                target_filepath = os.path.join(job.work_dir, f"{Path(file).stem}.{self.target_format}")
+                with subprocess.Popen(
+                    ["ebook-convert", file, target_filepath],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    env=self.calibre_env,
+                    text=True,
+                    encoding='utf-8'
+                ) as process:
+                    for line in process.stdout: # Read from the combined stdout (which includes stderr)
+                        job.output_line(line, self.verbose)
+                if process.returncode != 0:
+                    raise subprocess.CalledProcessError(process.returncode, process.args)
 
-            print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) Converting {filename} from {file_extension} format to {self.target_format} format...")
+                if self.cwa_settings['auto_backup_conversions']:
+                    self.backup(file, backup_type="converted")
+
+                job.conversion_entry = (os.path.basename(target_filepath),
+                                        Path(file).suffix,
+                                        self.target_format,
+                                        str(self.cwa_settings["auto_backup_conversions"]))
+
+                job.print_and_log(f"[convert-library]: {job.progress} Conversion of {os.path.basename(file)} to {self.target_format} format successful!") # Removed as of V3.0.0 - Removing old version from library...
+            except subprocess.CalledProcessError as e:
+                job.print_and_log(f"[convert-library]: {job.progress} Conversion of {os.path.basename(file)} was unsuccessful. See the following error:\n{e}")
+                job.failure_reason = f"ebook-convert exited with code {e.returncode}"
+                return job
 
-            try: # Get Calibre Library Book ID from the immediate book folder (e.g., "Title (6120)")
-                book_folder = os.path.basename(os.path.dirname(file))
-                m = re.search(r"\((\d+)\)$", book_folder)
-                book_id = m.group(1)  # type: ignore[attr-defined]
+        if self.target_format == "epub" and self.kindle_epub_fixer:
+            try:
+                fixer = EPUBFixer(cwa_settings=self.cwa_settings, output=lambda string, log: job.print_and_log(string))
+                fixer.process(input_path=target_filepath, record=False)
+                job.epub_fixer_entry = fixer.db_entry(target_filepath, target_filepath)
+                job.print_and_log(f"[convert-library]: {job.progress} Resulting EPUB file successfully processed by CWA-EPUB-Fixer!")
             except Exception as e:
-                print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) A Calibre Library Book ID could not be determined for {file}. Make sure the structure of your calibre library matches the following example:\n")
-                print_and_log("Terry Goodkind/")
-                print_and_log("└── Wizard's First Rule (6120)")
-                print_and_log("    ├── cover.jpg")
-                print_and_log("    ├── metadata.opf")
-                print_and_log("    └── Wizard's First Rule - Terry Goodkind.epub")
-
-                self.backup(file, backup_type="failed")
-                self.current_book += 1
-                continue
+                job.print_and_log(f"[convert-library]: {job.progress} An error occurred while processing {os.path.basename(target_filepath)} with the kindle-epub-fixer. See the following error:\n{e}")
 
-            if self.target_format == "kepub":
-                convert_successful, target_filepath = self.convert_to_kepub(file, file_extension)
-                if not convert_successful:
-                    print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) Conversion of {os.path.basename(file)} was unsuccessful. Moving to next book...")
-                    self.current_book += 1
-                    continue
-            else:
-                try: # Convert Book to target format (target is not kepub)
-                    target_filepath = f"{self.tmp_conversion_dir}{Path(file).stem}.{self.target_format}"
-                    with subprocess.Popen(
-                        ["ebook-convert", file, target_filepath],
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.STDOUT,
-                        env=self.calibre_env,
-                        text=True,
-                        encoding='utf-8'
-                    ) as process:
-                        for line in process.stdout: # Read from the combined stdout (which includes stderr)
-                            if self.verbose:
-                                print_and_log(line)
-                            else:
-                                print(line)
-
-                    if self.cwa_settings['auto_backup_conversions']:
-                        self.backup(file, backup_type="converted")
-
-                    self.db.conversion_add_entry(os.path.basename(target_filepath),
-                                                Path(file).suffix,
-                                                self.target_format,
-                                                str(self.cwa_settings["auto_backup_conversions"]))
-
-                    print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) Conversion of {os.path.basename(file)} to {self.target_format} format successful!") # Removed as of V3.0.0 - Removing old version from library...
-                except subprocess.CalledProcessError as e:
-                    print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) Conversion of {os.path.basename(file)} was unsuccessful. See the following error:\n{e}")
-                    self.current_book += 1
-                    continue
+        job.target_filepath = target_filepath
+        return job
 
-            if self.target_format == "epub" and self.kindle_epub_fixer:
-                try:
-                    EPUBFixer().process(input_path=target_filepath)
-                    print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) Resulting EPUB file successfully processed by CWA-EPUB-Fixer!")
-                except Exception as e:
-                    print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) An error occurred while processing {os.path.basename(target_filepath)} with the kindle-epub-fixer. See the following error:\n{e}")
 
+    def import_book(self, job: ConversionJob) -> None:
+        """Runs on the main thread. Records the conversion and imports the converted book into the library"""
+        self.current_book = job.position
+        job.flush()
+        if self.run_status is not None:
+            self.run_status.update(job.position, job.total)
+        try:
+            if job.conversion_entry is not None:
+                self.db.conversion_add_entry(*job.conversion_entry)
+            if job.epub_fixer_entry is not None:
+                self.db.epub_fixer_add_entry(*job.epub_fixer_entry)
+            if job.target_filepath is None:
+                if job.book_id:
+                    self.db.conversion_job_set_state(job.book_id, self.target_format, 'failed', reason=job.failure_reason or "Conversion failed")
+                return
+
+            target_filepath = job.target_filepath
             try: # Import converted book to library. As of V3.0.0, "add_format" is used instead of "add"
                 with subprocess.Popen(
-                    ["calibredb", "add_format", book_id, target_filepath, f"--library-path={self.library_dir}"],
+                    ["calibredb", "add_format", job.book_id, target_filepath, f"--library-path={self.library_dir}"],
                     env=self.calibre_env,
                     stdout=subprocess.PIPE,
                     stderr=subprocess.STDOUT,
@@ -439,6 +622,8 @@ class LibraryConverter:
                             print_and_log(line)
                         else:
                             print(line)
+                if process.returncode != 0:
+                    raise subprocess.CalledProcessError(process.returncode, process.args)
 
                 if self.cwa_settings['auto_backup_imports']:
                     self.backup(target_filepath, backup_type="imported")
@@ -446,27 +631,28 @@ class LibraryConverter:
                 self.db.import_add_entry(os.path.basename(target_filepath),
                                         str(self.cwa_settings["auto_backup_imports"]))
 
-                print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) Import of {os.path.basename(target_filepath)} successfully completed!")
+                self.db.conversion_job_set_state(job.book_id, self.target_format, 'imported')
+                print_and_log(f"[convert-library]: {job.progress} Import of {os.path.basename(target_filepath)} successfully completed!")
             except subprocess.CalledProcessError as e:
-                print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) Import of {os.path.basename(target_filepath)} was not successfully completed. Converted file moved to /config/processed_books/failed/{os.path.basename(target_filepath)}. See the following error:\n{e}")
+                print_and_log(f"[convert-library]: {job.progress} Import of {os.path.basename(target_filepath)} was not successfully completed. Converted file moved to /config/processed_books/failed/{os.path.basename(target_filepath)}. See the following error:\n{e}")
+                self.db.conversion_job_set_state(job.book_id, self.target_format, 'failed', reason=f"calibredb add_format exited with code {e.returncode}")
                 try:
                     output_path = f"/config/processed_books/failed/{os.path.basename(target_filepath)}"
                     shutil.move(target_filepath, output_path)
                 except Exception as e:
-                    print_and_log(f"[convert-library]: ERROR - The following error occurred when trying to copy {file} to {output_path}:\n{e}")
-                self.current_book += 1
-                continue
+                    print_and_log(f"[convert-library]: ERROR - The following error occurred when trying to copy {job.filepath} to {output_path}:\n{e}")
+                return
 
             self.set_library_permissions()
-            self.empty_tmp_con_dir()
-            self.current_book += 1
-            continue
+        finally:
+            shutil.rmtree(job.work_dir, ignore_errors=True)
 
 
-    def convert_to_kepub(self, filepath:str ,import_format:str) -> tuple[bool, str]:
+    def convert_to_kepub(self, job: ConversionJob, import_format:str) -> tuple[bool, str]:
         """Kepubify is limited in that it can only convert from epub to kepub, therefore any files not already in epub need to first be converted to epub, and then to kepub"""
+        filepath = job.filepath
         if import_format == "epub":
-            print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) File already in epub format, converting directly to kepub...")
+            job.print_and_log(f"[convert-library]: {job.progress} File already in epub format, converting directly to kepub...")
 
             if self.cwa_settings['auto_backup_conversions']:
                 self.backup(filepath, backup_type="converted")
@@ -474,9 +660,9 @@ class LibraryConverter:
             epub_filepath = filepath
             epub_ready = True
         else:
-            print_and_log(f"\n[convert-library]: ({self.current_book}/{len(self.to_convert)}) *** NOTICE TO USER: Kepubify is limited in that it can only convert from epubs. To get around this, CWA will automatically convert other supported formats to epub using the Calibre's conversion tools & then use Kepubify to produce your desired kepubs. Obviously multi-step conversions aren't ideal so if you notice issues with your converted files, bare in mind starting with epubs will ensure the best possible results***\n")
+            job.print_and_log(f"\n[convert-library]: {job.progress} *** NOTICE TO USER: Kepubify is limited in that it can only convert from epubs. To get around this, CWA will automatically convert other supported formats to epub using the Calibre's conversion tools & then use Kepubify to produce your desired kepubs. Obviously multi-step conversions aren't ideal so if you notice issues with your converted files, bare in mind starting with epubs will ensure the best possible results***\n")
             try: # Convert book to epub format so it can then be converted to kepub
-                epub_filepath = f"{self.tmp_conversion_dir}{Path(filepath).stem}.epub"
+                epub_filepath = os.path.join(job.work_dir, f"{Path(filepath).stem}.epub")
                 with subprocess.Popen(
                     ["ebook-convert", filepath, epub_filepath],
                     stdout=subprocess.PIPE,
@@ -485,52 +671,52 @@ class LibraryConverter:
                     text=True
                 ) as process:
                     for line in process.stdout: # Read from the combined stdout (which includes stderr)
-                        if self.verbose:
-                            print_and_log(line)
-                        else:
-                            print(line)
+                        job.output_line(line, self.verbose)
+                if process.returncode != 0:
+                    raise subprocess.CalledProcessError(process.returncode, process.args)
 
                 if self.cwa_settings['auto_backup_conversions']:
                     self.backup(filepath, backup_type="converted")
 
-                print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) Intermediate conversion of {os.path.basename(filepath)} to epub from {import_format} successful, now converting to kepub...")
+                job.print_and_log(f"[convert-library]: {job.progress} Intermediate conversion of {os.path.basename(filepath)} to epub from {import_format} successful, now converting to kepub...")
                 epub_ready = True
             except subprocess.CalledProcessError as e:
-                print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) Intermediate conversion of {os.path.basename(filepath)} to epub was unsuccessful. Cancelling kepub conversion and moving on to next file. See the following error:\n{e}")
+                job.print_and_log(f"[convert-library]: {job.progress} Intermediate conversion of {os.path.basename(filepath)} to epub was unsuccessful. Cancelling kepub conversion and moving on to next file. See the following error:\n{e}")
+                job.failure_reason = f"ebook-convert exited with code {e.returncode}"
                 return False, ""
 
         if epub_ready:
             epub_filepath = Path(epub_filepath)
-            target_filepath = f"{self.tmp_conversion_dir}{epub_filepath.stem}.kepub"
+            target_filepath = os.path.join(job.work_dir, f"{epub_filepath.stem}.kepub")
             try:
                 with subprocess.Popen(
-                    ['kepubify', '--inplace', '--calibre', '--output', self.tmp_conversion_dir, epub_filepath],
+                    ['kepubify', '--inplace', '--calibre', '--output', job.work_dir, epub_filepath],
                     stdout=subprocess.PIPE,
                     stderr=subprocess.STDOUT,
                     text=True,
                     encoding='utf-8'
                 ) as process:
                     for line in process.stdout: # Read from the combined stdout (which includes stderr)
-                        if self.verbose:
-                            print_and_log(line)
-                        else:
-                            print(line)
+                        job.output_line(line, self.verbose)
+                if process.returncode != 0:
+                    raise subprocess.CalledProcessError(process.returncode, process.args)
 
                 if self.cwa_settings['auto_backup_conversions']:
                     self.backup(filepath, backup_type="converted")
 
-                self.db.conversion_add_entry(epub_filepath.stem,
-                                            import_format,
-                                            self.target_format,
-                                            str(self.cwa_settings["auto_backup_conversions"]))
+                job.conversion_entry = (epub_filepath.stem,
+                                        import_format,
+                                        self.target_format,
+                                        str(self.cwa_settings["auto_backup_conversions"]))
 
                 return True, target_filepath
             except subprocess.CalledProcessError as e:
-                print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) CON_ERROR: {os.path.basename(filepath)} could not be converted to kepub due to the following error:\nEXIT/ERROR CODE: {e.returncode}\n{e.stderr}")
+                job.print_and_log(f"[convert-library]: {job.progress} CON_ERROR: {os.path.basename(filepath)} could not be converted to kepub due to the following error:\nEXIT/ERROR CODE: {e.returncode}\n{e.stderr}")
                 self.backup(epub_filepath, backup_type="failed")
+                job.failure_reason = f"kepubify exited with code {e.returncode}"
                 return False, ""
         else:
-            print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) An error occurred when converting the original {import_format} to epub. Cancelling kepub conversion and moving on to next file...")
+            job.print_and_log(f"[convert-library]: {job.progress} An error occurred when converting the original {import_format} to epub. Cancelling kepub conversion and moving on to next file...")
             return False, ""
 
 
@@ -564,19 +750,26 @@ def main():
     )
 
     parser.add_argument('--verbose', '-v', action='store_true', required=False, dest='verbose', help='When passed, the output from the ebook-convert command will be included in what is shown to the user in the Web UI', default=False)
+    parser.add_argument('--workers', '-w', type=int, required=False, dest='workers', help='Number of books to convert at the same time. Defaults to the CWA_CONVERT_WORKERS env variable, or half the available CPU cores (max 4)', default=None)
+    parser.add_argument('--retry-failed', action='store_true', required=False, dest='retry_failed', help='Also retry books that failed to convert during previous runs, which are skipped by default', default=False)
     args = parser.parse_args()
 
     logger.info(f"CWA Convert Library Service - Run Started: {datetime.now()}\n")
-    converter = LibraryConverter(args)
+    run_status = RunStatus(CONVERT_LIBRARY_STATUS)
+    run_status.start()
+    converter = LibraryConverter(args, run_status)
     if len(converter.to_convert) > 0:
+        run_status.update(0, len(converter.to_convert))
         converter.convert_library()
     else:
         print_and_log(f'[convert-library]: No books found in library without a copy in the target format ({converter.target_format}). Exiting now...')
         logger.info(f"\nCWA Convert Library Service - Run Ended: {datetime.now()}")
+        run_status.finish()
         sys.exit(0)
 
     print_and_log(f"\n[convert-library]: Library conversion complete! {len(converter.to_convert)} books converted! Exiting now...")
     logger.info(f"\nCWA Convert Library Service - Run Ended: {datetime.now()}")
+    run_status.finish()
     sys.exit(0)
 
 
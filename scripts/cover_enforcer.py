@@ -9,12 +9,15 @@ import atexit
 import json
 import os
 import re
+import shutil
 import sqlite3
 import subprocess
 import sys
 import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from itertools import groupby
 from pathlib import Path
 import unicodedata
 
@@ -71,6 +74,33 @@ change_logs_dir = "/app/calibre-web-automated/metadata_change_logs"
 metadata_temp_dir = "/app/calibre-web-automated/metadata_temp"
 
 
+def get_enforcer_workers(requested: int | None = None) -> int:
+    """Number of books to enforce at once with -all. Taken from --workers, then the CWA_ENFORCER_WORKERS
+    env variable, otherwise half the available cores (capped at 4, ebook-polish is a full calibre process)"""
+    if requested is None:
+        try:
+            requested = int(os.getenv("CWA_ENFORCER_WORKERS", "0"))
+        except ValueError:
+            print(f"[cover-metadata-enforcer]: WARNING - Invalid CWA_ENFORCER_WORKERS value '{os.getenv('CWA_ENFORCER_WORKERS')}', using the default.")
+            requested = 0
+    if requested > 0:
+        return requested
+    return max(1, min(4, (os.cpu_count() or 1) // 2))
+
+
+def get_book_fingerprint(book_dir: str, last_modified: str) -> str:
+    """Captures the book's metadata timestamp and the state of its cover.jpg and metadata.opf. When none
+    of them changed since the book was last enforced, enforcing it again would not change anything"""
+    parts = [str(last_modified)]
+    for name in ("cover.jpg", "metadata.opf"):
+        try:
+            stat = os.stat(os.path.join(book_dir, name))
+            parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+        except OSError:
+            parts.append("-")
+    return "|".join(parts)
+
+
 # Creates a lock file unless one already exists meaning an instance of the script is
 # already running, then the script is closed, the user is notified and the program
 # exits with code 2
@@ -83,16 +113,20 @@ except FileExistsError:
 
 # Defining function to delete the lock on script exit
 def removeLock():
-    os.remove(tempfile.gettempdir() + '/cover_enforcer.lock')
+    try:
+        os.remove(tempfile.gettempdir() + '/cover_enforcer.lock')
+    except FileNotFoundError:
+        ...
 
 # Will automatically run when the script exits
 atexit.register(removeLock)
 
 
 class Book:
-    def __init__(self, book_dir: str, file_path: str):
+    def __init__(self, book_dir: str, file_path: str, metadata_dir: str = metadata_temp_dir, new_metadata_path: str | None = None):
         self.book_dir: str = book_dir
         self.file_path: str = file_path
+        self.metadata_dir: str = metadata_dir
 
         self.calibre_library = self.get_calibre_library()
 
@@ -110,9 +144,10 @@ class Book:
             self.calibre_library = self.split_library["split_path"]
             self.calibre_env['CALIBRE_OVERRIDE_DATABASE_PATH'] = os.path.join(self.split_library["db_path"], "metadata.db")
 
-        self.cover_path = book_dir + '/cover.jpg'
-        self.old_metadata_path = book_dir + '/metadata.opf'
-        self.new_metadata_path = self.get_new_metadata_path()
+        self.cover_path = os.path.join(book_dir, 'cover.jpg')
+        self.old_metadata_path = os.path.join(book_dir, 'metadata.opf')
+        # Formats of the same book share a single metadata export
+        self.new_metadata_path = new_metadata_path or self.get_new_metadata_path()
 
         self.log_info = None
 
@@ -156,9 +191,9 @@ class Book:
 
 
     def get_new_metadata_path(self) -> str:
-        """Uses the export function of the calibredb utility to export any new metadata for the given book to metadata_temp, and returns the path to the new metadata.opf"""
-        subprocess.run(["calibredb", "export", "--with-library", self.calibre_library, "--to-dir", metadata_temp_dir, self.book_id], env=self.calibre_env, check=True)
-        temp_files = [os.path.join(dirpath,f) for (dirpath, dirnames, filenames) in os.walk(metadata_temp_dir) for f in filenames]
+        """Uses the export function of the calibredb utility to export any new metadata for the given book to the metadata dir, and returns the path to the new metadata.opf"""
+        subprocess.run(["calibredb", "export", "--with-library", self.calibre_library, "--to-dir", self.metadata_dir, self.book_id], env=self.calibre_env, check=True)
+        temp_files = [os.path.join(dirpath,f) for (dirpath, dirnames, filenames) in os.walk(self.metadata_dir) for f in filenames]
         return [f for f in temp_files if f.endswith('.opf')][0]
 
 
@@ -458,27 +493,33 @@ class Enforcer:
 
         return supported_files
 
-    def enforce_cover(self, book_dir: str) -> list:
+    def enforce_cover(self, book_dir: str, supported_files: list[str] | None = None) -> list:
         """Will force the Cover & Metadata to update for the supported book files in the given directory"""
-        supported_files = self.get_supported_files_from_dir(book_dir)
+        if supported_files is None:
+            supported_files = self.get_supported_files_from_dir(book_dir)
         if supported_files:
             if len(supported_files) > 1:
                 print("[cover-metadata-enforcer] Multiple file formats for current book detected...", flush=True)
+            # Every book gets its own export dir, so several books can be enforced side by side
+            os.makedirs(metadata_temp_dir, exist_ok=True)
+            metadata_dir = tempfile.mkdtemp(dir=metadata_temp_dir)
             book_objects = []
-            for file in supported_files:
-                book = Book(book_dir, file)
-                self.replace_old_metadata(book.old_metadata_path, book.new_metadata_path)
-                if Path(book.cover_path).exists():
-                    os.system(f'ebook-polish -c "{book.cover_path}" -o "{book.new_metadata_path}" -U "{file}" "{file}"')
-                else:
-                    os.system(f'ebook-polish -o "{book.new_metadata_path}" -U "{file}" "{file}"')
-                self.empty_metadata_temp()
-                print(f"[cover-metadata-enforcer]: DONE: '{book.title_author}.{book.file_format}': Cover & Metadata updated", flush=True)
-
-                # Calculate and store new checksum after modification
-                self._recalculate_checksum_after_modification(book.book_id, book.file_format, file)
-
-                book_objects.append(book)
+            try:
+                new_metadata_path = None
+                for file in supported_files:
+                    book = Book(book_dir, file, metadata_dir=metadata_dir, new_metadata_path=new_metadata_path)
+                    if new_metadata_path is None:
+                        self.replace_old_metadata(book.old_metadata_path, book.new_metadata_path)
+                        new_metadata_path = book.new_metadata_path
+                    self.polish(book)
+                    print(f"[cover-metadata-enforcer]: DONE: '{book.title_author}.{book.file_format}': Cover & Metadata updated", flush=True)
+
+                    # Calculate and store new checksum after modification
+                    self._recalculate_checksum_after_modification(book.book_id, book.file_format, file)
+
+                    book_objects.append(book)
+            finally:
+                shutil.rmtree(metadata_dir, ignore_errors=True)
 
             return book_objects
         else:
@@ -487,40 +528,90 @@ class Enforcer:
             return []
 
 
-    def enforce_all_covers(self) -> tuple[int, float, int] | tuple[bool, bool, bool]:
-        """Will force the covers and metadata to be re-generated for all books in the library"""
-        t_start = time.time()
-
-        supported_files = self.get_supported_files_from_dir(self.calibre_library)
-        if supported_files:
-            book_dirs = []
-            for file in supported_files:
-                book_dirs.append(os.path.dirname(file))
+    def polish(self, book: Book) -> None:
+        """Embeds the book's cover & exported metadata into its file with ebook-polish. Raises CalledProcessError
+        if ebook-polish fails"""
+        command = ["ebook-polish"]
+        if Path(book.cover_path).exists():
+            command += ["-c", book.cover_path]
+        command += ["-o", book.new_metadata_path, "-U", book.file_path, book.file_path]
+        result = subprocess.run(command, env=self.calibre_env)
+        if result.returncode != 0:
+            # Fails the whole book, so -all doesn't record it as enforced and tries it again next run
+            raise subprocess.CalledProcessError(result.returncode, command)
+
+
+    def get_library_books(self) -> list[tuple[int, str, str, list[str]]]:
+        """Returns (book_id, book_dir, last_modified, supported files) for every book in metadata.db with a supported format"""
+        metadb_path = os.path.join((self.split_library or {}).get("db_path", self.calibre_library), "metadata.db")
+        placeholders = ", ".join("?" for _ in self.supported_formats)
+        con = sqlite3.connect(Path(metadb_path).resolve().as_uri() + "?mode=ro", uri=True, timeout=30)
+        try:
+            rows = con.execute(f"""
+                SELECT books.id, books.path, books.last_modified, data.name, data.format
+                FROM data JOIN books ON books.id = data.book
+                WHERE lower(data.format) IN ({placeholders})
+                ORDER BY books.id
+            """, [f.lower() for f in self.supported_formats]).fetchall()
+        finally:
+            con.close()
 
-            print(f"[cover-metadata-enforcer]: {len(book_dirs)} books detected in Library")
-            print(f"[cover-metadata-enforcer]: Enforcing covers for {len(supported_files)} supported file(s) in {self.calibre_library} ...")
+        books = []
+        for book_id, group in groupby(rows, key=lambda row: row[0]):
+            group = list(group)
+            book_dir = os.path.join(self.calibre_library, group[0][1])
+            files = [os.path.join(book_dir, f"{name}.{fmt.lower()}") for _, _, _, name, fmt in group]
+            files = [f for f in files if os.path.isfile(f)]
+            if files:
+                books.append((book_id, book_dir, group[0][2], files))
+        return books
+
+
+    def enforce_all_covers(self, force: bool = False, workers: int | None = None) -> tuple[int, float, int] | tuple[bool, bool, bool]:
+        """Will force the covers and metadata to be re-generated for all books in the library.
+        Books are taken from metadata.db, one job per book however many formats it has, and polished on a
+        bounded worker pool. Books whose metadata, cover and OPF are unchanged since their last enforcement
+        are skipped unless force is given"""
+        t_start = time.time()
 
-            successful_enforcements = len(supported_files)
+        library_books = self.get_library_books()
+        if not library_books:
+            return False, False, False
 
-            for book_dir in book_dirs:
+        if force:
+            self.db.enforcement_fingerprints_clear()
+        fingerprints = self.db.enforcement_fingerprints_get()
+        books_to_enforce = [book for book in library_books
+                            if fingerprints.get(book[0]) != get_book_fingerprint(book[1], book[2])]
+        n_supported_files = sum(len(book[3]) for book in books_to_enforce)
+
+        print(f"[cover-metadata-enforcer]: {len(library_books)} books detected in Library")
+        if len(library_books) > len(books_to_enforce):
+            print(f"[cover-metadata-enforcer]: Skipping {len(library_books) - len(books_to_enforce)} books unchanged since their last enforcement")
+        workers = get_enforcer_workers(workers)
+        print(f"[cover-metadata-enforcer]: Enforcing covers for {n_supported_files} supported file(s) in {self.calibre_library} on {workers} worker(s)...")
+
+        successful_enforcements = n_supported_files
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(self.enforce_cover, book_dir, files): (book_id, book_dir, last_modified, files)
+                       for book_id, book_dir, last_modified, files in books_to_enforce}
+            # Database writes stay on this thread, the CWA_DB connection isn't shared with the workers
+            for future in as_completed(futures):
+                book_id, book_dir, last_modified, files = futures[future]
                 try:
-                    book_objects = self.enforce_cover(book_dir)
+                    book_objects = future.result()
                     if book_objects:
-                        book_dicts = []
-                        for book in book_objects:
-                            book_dicts.append(book.export_as_dict())
-                        self.db.enforce_add_entry_from_all(book_dicts)
+                        self.db.enforce_add_entry_from_all([book.export_as_dict() for book in book_objects])
+                        self.db.enforcement_fingerprints_set([(book_id, get_book_fingerprint(book_dir, last_modified))])
                 except Exception as e:
                     print(f"[cover-metadata-enforcer]: ERROR: {book_dir}")
                     print(f"[cover-metadata-enforcer]: Skipping book due to following error: {e}")
-                    successful_enforcements = successful_enforcements - 1
+                    successful_enforcements = successful_enforcements - len(files)
                     continue
 
-            t_end = time.time()
+        t_end = time.time()
 
-            return successful_enforcements, (t_end - t_start), len(supported_files)
-        else: # No supported files found
-            return False, False, False
+        return successful_enforcements, (t_end - t_start), n_supported_files
 
 
     def replace_old_metadata(self, old_metadata: str, new_metadata: str) -> None:
@@ -542,11 +633,6 @@ class Enforcer:
             os.remove(log_path)
 
 
-    def empty_metadata_temp(self):
-        """Empties the metadata_temp folder"""
-        os.system(f"rm -r {metadata_temp_dir}/*")
-
-
     def check_for_other_logs(self):
         log_files = [os.path.join(dirpath,f) for (dirpath, dirnames, filenames) in os.walk(change_logs_dir) for f in filenames]
         if len(log_files) > 0:
@@ -577,6 +663,8 @@ def main():
     parser.add_argument('--log', action='store', dest='log', required=False, help='Will enforce the covers and metadata of the books in the given log file.', default=None)
     parser.add_argument('--dir', action='store', dest='dir', required=False, help='Will enforce the covers and metadata of the books in the given directory.', default=None)
     parser.add_argument('-all', action='store_true', dest='all', help='Will enforce covers & metadata for ALL books currently in your calibre-library-dir', default=False)
+    parser.add_argument('-force', action='store_true', dest='force', help="Use with '-all' to also enforce books that are unchanged since their last enforcement", default=False)
+    parser.add_argument('--workers', '-w', action='store', dest='workers', type=int, required=False, help="Number of books to enforce at once with '-all' (default: CWA_ENFORCER_WORKERS or half the CPU cores, at most 4)", default=None)
     parser.add_argument('-list', '-l', action='store_true', dest='list', help='List all books in your calibre-library-dir', default=False)
     parser.add_argument('-history', action='store_true', dest='history', help='Display a history of all enforcements ever carried out on your machine (not yet implemented)', default=False)
     parser.add_argument('-paths', '-p', action='store_true', dest='paths', help="Use with '-history' flag to display stored paths of all files in enforcement database", default=False)
@@ -601,9 +689,11 @@ def main():
     elif args.all and args.log is None and args.dir is None and args.list is False and args.history is False:
         ### only all flag passed
         print('[cover-metadata-enforcer]: Enforcing metadata and covers for all books in library...')
-        n_enforced, completion_time, n_supported_files = enforcer.enforce_all_covers()
-        if n_enforced == False:
+        n_enforced, completion_time, n_supported_files = enforcer.enforce_all_covers(force=args.force, workers=args.workers)
+        if n_enforced is False:
             print(f"\n[cover-metadata-enforcer]: No supported ebook files found in library (only EPUB & AZW3 formats are currently supported)")
+        elif n_supported_files == 0:
+            print("\n[cover-metadata-enforcer]: Nothing to do, every book is unchanged since its last enforcement. Use -force to enforce them anyway.")
         elif n_enforced == n_supported_files:
             print(f"\n[cover-metadata-enforcer]: SUCCESS: All covers & metadata successfully updated for all {n_enforced} supported ebooks in the library in {completion_time:.2f} seconds!")
         elif n_enforced == 0:
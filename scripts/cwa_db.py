@@ -278,6 +278,38 @@ class CWA_DB:
             self.con.commit()
 
 
+    def enforcement_fingerprints_get(self) -> dict[int, str]:
+        """Return the fingerprint each book had after its last library-wide enforcement, keyed by book id."""
+        try:
+            return {row[0]: row[1] for row in self.cur.execute("SELECT book_id, fingerprint FROM cwa_enforcement_fingerprints").fetchall()}
+        except Exception as e:
+            print(f"[cwa-db] ERROR fetching enforcement fingerprints: {e}")
+            return {}
+
+    def enforcement_fingerprints_set(self, fingerprints: list[tuple[int, str]]) -> None:
+        """Store the (book_id, fingerprint) pairs of freshly enforced books in a single transaction."""
+        try:
+            updated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.cur.executemany(
+                """
+                INSERT INTO cwa_enforcement_fingerprints(book_id, fingerprint, updated_at) VALUES(?, ?, ?)
+                ON CONFLICT(book_id) DO UPDATE SET fingerprint=excluded.fingerprint, updated_at=excluded.updated_at
+                """,
+                [(int(book_id), fingerprint, updated_at) for book_id, fingerprint in fingerprints]
+            )
+            self.con.commit()
+        except Exception as e:
+            print(f"[cwa-db] ERROR storing enforcement fingerprints: {e}")
+
+    def enforcement_fingerprints_clear(self) -> None:
+        """Forget every fingerprint so the next library-wide enforcement processes all books again."""
+        try:
+            self.cur.execute("DELETE FROM cwa_enforcement_fingerprints")
+            self.con.commit()
+        except Exception as e:
+            print(f"[cwa-db] ERROR clearing enforcement fingerprints: {e}")
+
+
     def enforce_show(self, paths: bool, verbose: bool, web_ui=False):
         results_no_path = self.cur.execute("SELECT timestamp, book_id, book_title, author, trigger_type FROM cwa_enforcement ORDER BY timestamp DESC;").fetchall()
         results_with_path = self.cur.execute("SELECT timestamp, book_id, file_path FROM cwa_enforcement ORDER BY timestamp DESC;").fetchall()
@@ -391,6 +423,104 @@ class CWA_DB:
 
         return totals
 
+    # ==============================
+    # Library Conversion Jobs
+    # ==============================
+
+    def conversion_jobs_get(self, target_format: str) -> dict[int, dict]:
+        """Return the recorded state of every book converted (or attempted) to target_format, keyed by book id."""
+        try:
+            rows = self.cur.execute(
+                "SELECT book_id, source_path, state, reason, converted_path, updated_at FROM cwa_conversion_jobs WHERE target_format=?",
+                (str(target_format),)
+            ).fetchall()
+            cols = [d[0] for d in self.cur.description]
+            return {row[0]: dict(zip(cols, row)) for row in rows}
+        except Exception as e:
+            print(f"[cwa-db] ERROR fetching conversion jobs: {e}")
+            return {}
+
+    def conversion_jobs_add_pending(self, jobs: list[tuple[int, str]], target_format: str) -> None:
+        """Mark the given (book_id, source_path) pairs as pending in a single transaction."""
+        try:
+            updated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.cur.executemany(
+                """
+                INSERT INTO cwa_conversion_jobs(book_id, target_format, source_path, state, reason, converted_path, updated_at)
+                VALUES(?, ?, ?, 'pending', '', '', ?)
+                ON CONFLICT(book_id, target_format) DO UPDATE SET
+                    source_path=excluded.source_path, state='pending', reason='', converted_path='', updated_at=excluded.updated_at
+                """,
+                [(int(book_id), str(target_format), source_path, updated_at) for book_id, source_path in jobs]
+            )
+            self.con.commit()
+        except Exception as e:
+            print(f"[cwa-db] ERROR adding pending conversion jobs: {e}")
+
+    def conversion_job_set_state(self, book_id: int, target_format: str, state: str, reason: str = '', converted_path: str = '') -> None:
+        try:
+            updated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.cur.execute(
+                "UPDATE cwa_conversion_jobs SET state=?, reason=?, converted_path=?, updated_at=? WHERE book_id=? AND target_format=?",
+                (state, reason, converted_path, updated_at, int(book_id), str(target_format))
+            )
+            self.con.commit()
+        except Exception as e:
+            print(f"[cwa-db] ERROR updating conversion job for book {book_id}: {e}")
+
+    def conversion_jobs_clear_failed(self, target_format: str) -> int:
+        """Forget books that previously failed to convert to target_format so they are retried. Returns how many were cleared."""
+        try:
+            self.cur.execute("DELETE FROM cwa_conversion_jobs WHERE state='failed' AND target_format=?", (str(target_format),))
+            self.con.commit()
+            return self.cur.rowcount
+        except Exception as e:
+            print(f"[cwa-db] ERROR clearing failed conversion jobs: {e}")
+            return 0
+
+    # ==============================
+    # EPUB Fixer Fingerprints
+    # ==============================
+
+    def epub_fixer_fingerprints_get(self) -> dict[str, tuple[int, int, str]]:
+        """Return the (size, mtime_ns, checksum) each EPUB had when the library-wide fixer last processed it, keyed by path."""
+        try:
+            rows = self.cur.execute("SELECT file_path, size, mtime_ns, checksum FROM epub_fixer_fingerprints").fetchall()
+            return {row[0]: (row[1], row[2], row[3] or '') for row in rows}
+        except Exception as e:
+            print(f"[cwa-db] ERROR fetching EPUB fixer fingerprints: {e}")
+            return {}
+
+    def epub_fixer_record_results(self, entries: list[tuple], fingerprints: list[tuple[str, int, int, str]]) -> None:
+        """Store a batch of fixer runs in a single transaction. entries are epub_fixer_add_entry arguments,
+        fingerprints are (file_path, size, mtime_ns, checksum) of the processed files."""
+        try:
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.cur.executemany(
+                "INSERT INTO epub_fixes(timestamp, filename, manually_triggered, num_of_fixes_applied, original_backed_up, file_path, fixes_applied) VALUES (?, ?, ?, ?, ?, ?, ?);",
+                [(timestamp, *entry) for entry in entries]
+            )
+            self.cur.executemany(
+                """
+                INSERT INTO epub_fixer_fingerprints(file_path, size, mtime_ns, checksum, updated_at)
+                VALUES(?, ?, ?, ?, ?)
+                ON CONFLICT(file_path) DO UPDATE SET
+                    size=excluded.size, mtime_ns=excluded.mtime_ns, checksum=excluded.checksum, updated_at=excluded.updated_at
+                """,
+                [(file_path, size, mtime_ns, checksum or '', timestamp) for file_path, size, mtime_ns, checksum in fingerprints]
+            )
+            self.con.commit()
+        except Exception as e:
+            print(f"[cwa-db] ERROR recording EPUB fixer results: {e}")
+
+    def epub_fixer_fingerprints_clear(self) -> None:
+        """Forget every fingerprint so the next library-wide run processes all EPUBs again."""
+        try:
+            self.cur.execute("DELETE FROM epub_fixer_fingerprints")
+            self.con.commit()
+        except Exception as e:
+            print(f"[cwa-db] ERROR clearing EPUB fixer fingerprints: {e}")
+
     # ==============================
     # Scheduled Jobs (Auto-Send)
     # ==============================
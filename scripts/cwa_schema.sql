@@ -86,3 +86,31 @@ CREATE TABLE IF NOT EXISTS cwa_scheduled_jobs(
     state TEXT NOT NULL DEFAULT 'scheduled',   -- 'scheduled' | 'dispatched' | 'cancelled'
     last_error TEXT DEFAULT ''
 );
+
+-- Per-book progress of library-wide conversions (convert_library.py), lets an interrupted run pick up where it stopped
+CREATE TABLE IF NOT EXISTS cwa_conversion_jobs(
+    book_id INTEGER NOT NULL,
+    target_format TEXT NOT NULL,
+    source_path TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',     -- 'pending' | 'converted' | 'imported' | 'failed'
+    reason TEXT DEFAULT '',                    -- why the book failed, shown on later runs that skip it
+    converted_path TEXT DEFAULT '',            -- converted file waiting in the tmp dir to be imported
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY(book_id, target_format)
+);
+
+-- Fingerprints of EPUBs processed by `kindle_epub_fixer.py --all`, files that are unchanged since are skipped on later runs
+CREATE TABLE IF NOT EXISTS epub_fixer_fingerprints(
+    file_path TEXT PRIMARY KEY NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    checksum TEXT DEFAULT '',                  -- latest KOReader checksum in book_format_checksums, if the book had one
+    updated_at TEXT NOT NULL
+);
+
+-- State of each book's cover, OPF and metadata at its last `cover_enforcer.py -all` run, unchanged books are skipped on later runs
+CREATE TABLE IF NOT EXISTS cwa_enforcement_fingerprints(
+    book_id INTEGER PRIMARY KEY NOT NULL,
+    fingerprint TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
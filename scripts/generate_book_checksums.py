@@ -21,24 +21,106 @@ Options:
     --library-path  Path to Calibre library directory (defaults to /calibre-library)
     --force         Regenerate checksums even if they already exist
     --batch-size    Number of books to process before committing (default: 100)
+    --workers       Number of files to hash at once (default: CWA_CHECKSUM_WORKERS or cores + 4, max 16)
 """
 
 import argparse
 import os
 import sqlite3
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Import the centralized partial MD5 calculation function
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from cps.progress_syncing.checksums import calculate_koreader_partial_md5, store_checksum, CHECKSUM_VERSION
-def generate_checksums(library_path: str, force: bool = False, batch_size: int = 100):
+
+
+def get_checksum_workers(requested: int | None = None) -> int:
+    """Number of files to hash at once. Taken from --workers, then the CWA_CHECKSUM_WORKERS env variable,
+    otherwise a few more threads than cores, hashing is a handful of small reads per file and mostly
+    spends its time waiting on storage"""
+    if requested is None:
+        try:
+            requested = int(os.getenv("CWA_CHECKSUM_WORKERS", "0"))
+        except ValueError:
+            print(f"WARNING: Invalid CWA_CHECKSUM_WORKERS value '{os.getenv('CWA_CHECKSUM_WORKERS')}', using the default.")
+            requested = 0
+    if requested > 0:
+        return requested
+    return min(16, (os.cpu_count() or 1) + 4)
+
+
+def iter_pending_formats(conn, force: bool, batch_size: int):
+    """Yields the book formats to process a batch at a time, paging through data by id so no query is
+    left open while a batch is written and only one batch is ever held in memory"""
+    if force:
+        query = '''
+            SELECT d.id, b.id, b.path, b.title, d.format, d.name
+            FROM data d
+            JOIN books b ON b.id = d.book
+            WHERE d.id > ?
+            ORDER BY d.id
+            LIMIT ?
+        '''
+    else:
+        # Only get formats without checksums
+        query = '''
+            SELECT d.id, b.id, b.path, b.title, d.format, d.name
+            FROM data d
+            JOIN books b ON b.id = d.book
+            LEFT JOIN book_format_checksums bfc ON (
+                bfc.book = b.id
+                AND bfc.format = d.format
+            )
+            WHERE bfc.id IS NULL
+            AND d.id > ?
+            ORDER BY d.id
+            LIMIT ?
+        '''
+    last_id = 0
+    while True:
+        rows = conn.execute(query, (last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield [row[1:] for row in rows]
+
+
+def count_pending_formats(conn, force: bool) -> int:
+    if force:
+        return conn.execute("SELECT COUNT(*) FROM data d JOIN books b ON b.id = d.book").fetchone()[0]
+    return conn.execute('''
+        SELECT COUNT(*)
+        FROM data d
+        JOIN books b ON b.id = d.book
+        LEFT JOIN book_format_checksums bfc ON (
+            bfc.book = b.id
+            AND bfc.format = d.format
+        )
+        WHERE bfc.id IS NULL
+    ''').fetchone()[0]
+
+
+def hash_book_format(file_path: str) -> tuple[bool, str | None]:
+    """Runs on the hashing threads, returns whether the file exists and its checksum"""
+    if not os.path.exists(file_path):
+        return False, None
+    return True, calculate_koreader_partial_md5(file_path)
+
+
+def generate_checksums(library_path: str, force: bool = False, batch_size: int = 100, workers: int | None = None):
     """Generate checksums for all books in the library
 
+    Files are hashed on a thread pool and their checksums committed a batch at a time, so an interrupted
+    run keeps every finished batch and the next run carries on from there.
+
     Args:
         library_path: Path to Calibre library directory
         force: If True, regenerate checksums even if they exist
         batch_size: Number of books to process before committing
+        workers: Number of files to hash at once (see get_checksum_workers)
     """
     metadata_db = os.path.join(library_path, 'metadata.db')
 
@@ -46,42 +128,22 @@ def generate_checksums(library_path: str, force: bool = False, batch_size: int =
         print(f"ERROR: Calibre database not found at {metadata_db}")
         sys.exit(1)
 
+    batch_size = max(1, batch_size)
+    workers = get_checksum_workers(workers)
+
     print(f"Connecting to Calibre library at: {library_path}")
     print(f"Force regenerate: {force}")
     print(f"Batch size: {batch_size}")
+    print(f"Workers: {workers}")
     print(f"Checksum version: {CHECKSUM_VERSION}")
     print()
 
+    conn = None
+    pool = None
     try:
         conn = sqlite3.connect(metadata_db, timeout=30)
-        cur = conn.cursor()
-
-        # Get all book formats
-        if force:
-            # Get all formats
-            query = '''
-                SELECT b.id, b.path, b.title, d.format, d.name
-                FROM books b
-                JOIN data d ON b.id = d.book
-                ORDER BY b.id
-            '''
-            formats = cur.execute(query).fetchall()
-        else:
-            # Only get formats without checksums
-            query = '''
-                SELECT b.id, b.path, b.title, d.format, d.name
-                FROM books b
-                JOIN data d ON b.id = d.book
-                LEFT JOIN book_format_checksums bfc ON (
-                    bfc.book = b.id
-                    AND bfc.format = d.format
-                )
-                WHERE bfc.id IS NULL
-                ORDER BY b.id
-            '''
-            formats = cur.execute(query).fetchall()
-
-        total = len(formats)
+
+        total = count_pending_formats(conn, force)
 
         if total == 0:
             print("✓ All books already have checksums!")
@@ -93,48 +155,48 @@ def generate_checksums(library_path: str, force: bool = False, batch_size: int =
         success = 0
         failed = 0
         skipped = 0
-
-        for book_id, book_path, title, format_ext, format_name in formats:
-            processed += 1
-
-            # Construct full file path
-            file_path = os.path.join(library_path, book_path, f"{format_name}.{format_ext.lower()}")
-
-            if not os.path.exists(file_path):
-                print(f"[{processed}/{total}] SKIP: File not found - {title} ({format_ext})")
-                skipped += 1
-                continue
-
-            # Generate checksum
-            checksum = calculate_koreader_partial_md5(file_path)
-
-            if checksum:
-                # Store in database using centralized manager function
-                success_stored = store_checksum(
-                    book_id=book_id,
-                    book_format=format_ext.upper(),
-                    checksum=checksum,
-                    version=CHECKSUM_VERSION,
-                    db_connection=conn
-                )
-
-                if success_stored:
-                    print(f"[{processed}/{total}] ✓ {title} ({format_ext}): {checksum} (v{CHECKSUM_VERSION})")
-                    success += 1
-
-                    # Commit periodically
-                    if success % batch_size == 0:
-                        conn.commit()
-                        print(f"  → Committed {success} checksums to database")
+        started = time.monotonic()
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="checksum")
+
+        for batch in iter_pending_formats(conn, force, batch_size):
+            file_paths = [os.path.join(library_path, book_path, f"{format_name}.{format_ext.lower()}")
+                          for _, book_path, _, format_ext, format_name in batch]
+
+            # Hash the whole batch on the pool, storing the results stays on this thread's connection
+            for (book_id, _, title, format_ext, _), (exists, checksum) in zip(batch, pool.map(hash_book_format, file_paths)):
+                processed += 1
+
+                if not exists:
+                    print(f"[{processed}/{total}] SKIP: File not found - {title} ({format_ext})")
+                    skipped += 1
+                    continue
+
+                if checksum:
+                    # Store in database using centralized manager function
+                    success_stored = store_checksum(
+                        book_id=book_id,
+                        book_format=format_ext.upper(),
+                        checksum=checksum,
+                        version=CHECKSUM_VERSION,
+                        db_connection=conn,
+                        commit=False
+                    )
+
+                    if success_stored:
+                        print(f"[{processed}/{total}] ✓ {title} ({format_ext}): {checksum} (v{CHECKSUM_VERSION})")
+                        success += 1
+                    else:
+                        print(f"[{processed}/{total}] ERROR: Failed to store checksum for {title} ({format_ext})")
+                        failed += 1
                 else:
-                    print(f"[{processed}/{total}] ERROR: Failed to store checksum for {title} ({format_ext})")
+                    print(f"[{processed}/{total}] FAIL: Could not generate checksum - {title} ({format_ext})")
                     failed += 1
-            else:
-                print(f"[{processed}/{total}] FAIL: Could not generate checksum - {title} ({format_ext})")
-                failed += 1
 
-        # Final commit
-        conn.commit()
+            conn.commit()
+            elapsed = time.monotonic() - started
+            print(f"  → Committed {success} checksums to database ({processed / elapsed if elapsed else 0:.1f} files/sec)")
+
+        elapsed = time.monotonic() - started
 
         print()
         print("=" * 60)
@@ -143,13 +205,17 @@ def generate_checksums(library_path: str, force: bool = False, batch_size: int =
         print(f"  Success:         {success}")
         print(f"  Failed:          {failed}")
         print(f"  Skipped:         {skipped}")
+        print(f"  Elapsed:         {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.1f} files/sec)")
         print("=" * 60)
 
     except sqlite3.Error as e:
         print(f"ERROR: Database error: {e}")
         sys.exit(1)
     finally:
-        conn.close()
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        if conn is not None:
+            conn.close()
 
 
 def main():
@@ -177,6 +243,13 @@ def main():
         help='Number of books to process before committing (default: 100)'
     )
 
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Number of files to hash at once (default: CWA_CHECKSUM_WORKERS or cores + 4, max 16)'
+    )
+
     args = parser.parse_args()
 
     # Validate library path
@@ -185,7 +258,7 @@ def main():
         sys.exit(1)
 
     try:
-        generate_checksums(args.library_path, args.force, args.batch_size)
+        generate_checksums(args.library_path, args.force, args.batch_size, args.workers)
     except KeyboardInterrupt:
         print("\n\nInterrupted by user. Exiting...")
         sys.exit(130)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""
+Long-lived ingest daemon.
+
+Started once by the cwa-ingest-service. Instead of every detected file paying for a fresh
+Python interpreter, the cps imports and a new NewBookProcessor setup (cwa.db schema checks,
+app.db reads, dirs.json parsing), files are handed to this process over a Unix socket by
+`ingest_processor.py <file>`, which now acts as a thin client. Files are queued and processed
+against a single IngestContext that is only reloaded when cwa_settings or the library
+settings in app.db change. Files that arrive within a short window of each other are
+converted one by one but imported together with a single `calibredb add`.
+
+Protocol (one request per connection, newline terminated JSON):
+  client -> daemon: {"path": "/cwa-book-ingest/book.epub"}
+  daemon -> client: {"exit_code": 0}
+
+Exit codes mirror the ones the one-shot processor returns to the service script, with 124
+reported when a batch exceeded the safety timeout (the daemon then restarts itself, since a
+hung calibre call can't be cancelled from another thread).
+"""
+
+import json
+import os
+import queue
+import socketserver
+import sys
+import threading
+import time
+
+import ingest_processor
+from ingest_processor import DAEMON_PID_PATH, DAEMON_SOCKET_PATH, IngestContext, process_lock
+
+WATCHDOG_INTERVAL = 5
+# Files arriving within BATCH_WINDOW seconds of each other are imported with one calibredb add
+BATCH_WINDOW = float(os.getenv("CWA_INGEST_BATCH_WINDOW", "2"))
+BATCH_SIZE = int(os.getenv("CWA_INGEST_BATCH_SIZE", "50"))
+
+
+class IngestJob:
+    def __init__(self, path: str):
+        self.path = path
+        self.exit_code = 1
+        self.done = threading.Event()
+
+
+class IngestRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode("utf-8") or "{}")
+            path = request.get("path")
+        except (ValueError, AttributeError):
+            path = None
+        if not path:
+            self._reply(1)
+            return
+
+        job = IngestJob(path)
+        self.server.ingest_daemon.jobs.put(job)
+        job.done.wait()
+        self._reply(job.exit_code)
+
+    def _reply(self, exit_code: int):
+        try:
+            self.wfile.write((json.dumps({"exit_code": exit_code}) + "\n").encode("utf-8"))
+            self.wfile.flush()
+        except OSError:
+            # Client went away (e.g. killed by the service's own timeout), nothing left to report to
+            pass
+
+
+class IngestDaemon:
+    def __init__(self, socket_path: str = DAEMON_SOCKET_PATH, context_factory=IngestContext,
+                 pid_path: str = DAEMON_PID_PATH):
+        self.socket_path = socket_path
+        self.pid_path = pid_path
+        self.context_factory = context_factory
+        self.jobs: queue.Queue[IngestJob] = queue.Queue()
+        self.current_batch: list[IngestJob] = []
+        self.batch_started_at: float | None = None
+        self.context: IngestContext | None = None
+
+    def safety_timeout(self) -> int:
+        """Same limit the service script applies to one-shot runs: 3x the configured ingest timeout, per file"""
+        timeout_minutes = self.context.cwa_settings.get('ingest_timeout_minutes', 15) if self.context else 15
+        return int(timeout_minutes) * 60 * 3
+
+    def collect_batch(self) -> list[IngestJob]:
+        """Waits for the next job, then gives files arriving shortly after it a chance to join the same batch"""
+        batch = [self.jobs.get()]
+        deadline = time.monotonic() + BATCH_WINDOW
+        while len(batch) < BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.jobs.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def process_jobs(self):
+        # sqlite3 connections may only be used by the thread that opened them, so the context (and its
+        # cwa.db connection) is created here on the worker thread instead of in run()
+        try:
+            self.context = self.context_factory()
+        except (Exception, SystemExit) as e:
+            print(f"[ingest-daemon] Could not load the ingest settings ({e}), restarting daemon...", flush=True)
+            os._exit(1)
+
+        while True:
+            batch = self.collect_batch()
+            self.current_batch = batch
+            self.batch_started_at = time.monotonic()
+            try:
+                self.context.refresh_if_changed()
+                if len(batch) == 1:
+                    self._run_single(batch[0])
+                else:
+                    print(f"[ingest-daemon] Processing {len(batch)} files as one batch...", flush=True)
+                    results = ingest_processor.main_batch([job.path for job in batch], self.context)
+                    for job in batch:
+                        job.exit_code = results.get(job.path, 1)
+            except Exception as e:
+                print(f"[ingest-daemon] Error processing batch: {e}", flush=True)
+                for job in batch:
+                    job.exit_code = 1
+            finally:
+                self.current_batch = []
+                for job in batch:
+                    job.done.set()
+
+    def _run_single(self, job: IngestJob):
+        try:
+            ingest_processor.main(job.path, self.context)
+            job.exit_code = 0
+        except SystemExit as e:
+            job.exit_code = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            print(f"[ingest-daemon] Error processing {job.path}: {e}", flush=True)
+            job.exit_code = 1
+
+    def watchdog(self):
+        while True:
+            time.sleep(WATCHDOG_INTERVAL)
+            batch = self.current_batch
+            if not batch or self.batch_started_at is None:
+                continue
+            elapsed = time.monotonic() - self.batch_started_at
+            if elapsed > self.safety_timeout() * len(batch):
+                print(f"[ingest-daemon] SAFETY TIMEOUT: batch of {len(batch)} file(s) has been processing for {elapsed:.0f} seconds, restarting daemon...", flush=True)
+                for job in batch:
+                    job.exit_code = 124
+                    job.done.set()
+                time.sleep(1)  # Give the request handlers a moment to pass the result on
+                os._exit(1)
+
+    def bind(self) -> socketserver.ThreadingUnixStreamServer:
+        """Creates the listening socket and starts the worker & watchdog threads"""
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = socketserver.ThreadingUnixStreamServer(self.socket_path, IngestRequestHandler)
+        server.daemon_threads = True
+        server.ingest_daemon = self
+
+        threading.Thread(target=self.process_jobs, name="ingest-worker", daemon=True).start()
+        threading.Thread(target=self.watchdog, name="ingest-watchdog", daemon=True).start()
+        return server
+
+    def run(self):
+        # Hold the ingest lock for the daemon's lifetime so a one-shot fallback run can never import concurrently
+        while not process_lock.acquire(timeout=10):
+            print("[ingest-daemon] Waiting for the running ingest processor to finish...", flush=True)
+
+        server = self.bind()
+        with open(self.pid_path, "w") as f:
+            f.write(str(os.getpid()))
+
+        print(f"[ingest-daemon] Ready, listening on {self.socket_path}", flush=True)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            for path in (self.socket_path, self.pid_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def main():
+    try:
+        IngestDaemon().run()
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,11 +14,11 @@ import time
 import shutil
 import sqlite3
 import fcntl
+import socket
 from pathlib import Path
 
 from cwa_db import CWA_DB
 from kindle_epub_fixer import EPUBFixer
-import audiobook
 import requests
 
 # Optional: enable GDrive sync and auto-send by importing cps modules when available
@@ -171,6 +171,11 @@ class ProcessLock:
 # Global lock instance
 process_lock = ProcessLock()
 
+# Unix socket the ingest daemon (ingest_daemon.py) listens on for new files
+DAEMON_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "cwa_ingest_daemon.sock")
+# Written by the daemon once it is listening, so the ingest service can tell a live daemon from a stale socket
+DAEMON_PID_PATH = os.path.join(tempfile.gettempdir(), "cwa_ingest_daemon.pid")
+
 def cleanup_lock():
     """Cleanup function for atexit"""
     process_lock.release()
@@ -178,46 +183,54 @@ def cleanup_lock():
 # Register cleanup function
 atexit.register(cleanup_lock)
 
-try:
-    # Ensure project root is on sys.path to import cps
-    cps_path = os.path.dirname(os.path.dirname(__file__))
-    if cps_path not in sys.path:
-        sys.path.append(cps_path)
+_CPS_INTEGRATIONS_LOADED = False
+
+def load_cps_integrations() -> None:
+    """Import the optional cps modules (GDrive sync, metadata fetch, auto-send).
+
+    Deferred until a file is actually processed so the thin CLI client, which only
+    forwards paths to the ingest daemon, doesn't pay for booting the cps package."""
+    global _CPS_INTEGRATIONS_LOADED, _GDRIVE_AVAILABLE, _CPS_AVAILABLE, _gdriveutils, _cps_config
+    global fetch_and_apply_metadata, TaskAutoSend, WorkerThread, _ub
+    if _CPS_INTEGRATIONS_LOADED:
+        return
+    _CPS_INTEGRATIONS_LOADED = True
 
-    # Import GDrive functionality
-    try:
-        from cps import gdriveutils as _gdriveutils, config as _cps_config
-        _GDRIVE_AVAILABLE = True
-        print("[ingest-processor] GDrive functionality available", flush=True)
-    except (ImportError, TypeError, AttributeError) as e:
-        print(f"[ingest-processor] GDrive functionality not available: {e}", flush=True)
-        _gdriveutils = None
-        _cps_config = None
-        _GDRIVE_AVAILABLE = False
-
-    # Import auto-send and metadata functionality
     try:
-        from cps.metadata_helper import fetch_and_apply_metadata
-        from cps.tasks.auto_send import TaskAutoSend
-        from cps.services.worker import WorkerThread
-        from cps import ub as _ub
-        _CPS_AVAILABLE = True
-        print("[ingest-processor] Auto-send and metadata functionality available", flush=True)
-    except ImportError as e:
-        print(f"[ingest-processor] Auto-send/metadata functionality not available: {e}", flush=True)
-        fetch_and_apply_metadata = None
-        TaskAutoSend = None
-        WorkerThread = None
-        _ub = None
-        _CPS_AVAILABLE = False
+        # Ensure project root is on sys.path to import cps
+        cps_path = os.path.dirname(os.path.dirname(__file__))
+        if cps_path not in sys.path:
+            sys.path.append(cps_path)
 
-except Exception as e:
-    print(f"[ingest-processor] WARN: Unexpected error during CPS path setup: {e}", flush=True)
-    # Only disable if there's a fundamental path/import issue
-    if '_GDRIVE_AVAILABLE' not in locals():
-        _GDRIVE_AVAILABLE = False
-    if '_CPS_AVAILABLE' not in locals():
-        _CPS_AVAILABLE = False
+        # Import GDrive functionality
+        try:
+            from cps import gdriveutils as _gdriveutils, config as _cps_config
+            _GDRIVE_AVAILABLE = True
+            print("[ingest-processor] GDrive functionality available", flush=True)
+        except (ImportError, TypeError, AttributeError) as e:
+            print(f"[ingest-processor] GDrive functionality not available: {e}", flush=True)
+            _gdriveutils = None
+            _cps_config = None
+            _GDRIVE_AVAILABLE = False
+
+        # Import auto-send and metadata functionality
+        try:
+            from cps.metadata_helper import fetch_and_apply_metadata
+            from cps.tasks.auto_send import TaskAutoSend
+            from cps.services.worker import WorkerThread
+            from cps import ub as _ub
+            _CPS_AVAILABLE = True
+            print("[ingest-processor] Auto-send and metadata functionality available", flush=True)
+        except ImportError as e:
+            print(f"[ingest-processor] Auto-send/metadata functionality not available: {e}", flush=True)
+            fetch_and_apply_metadata = None
+            TaskAutoSend = None
+            WorkerThread = None
+            _ub = None
+            _CPS_AVAILABLE = False
+
+    except Exception as e:
+        print(f"[ingest-processor] WARN: Unexpected error during CPS path setup: {e}", flush=True)
 
 def gdrive_sync_if_enabled():
     """Sync Calibre library to Google Drive if enabled in app config."""
@@ -228,10 +241,6 @@ def gdrive_sync_if_enabled():
         except Exception as e:
             print(f"[ingest-processor] WARN: GDrive sync failed: {e}", flush=True)
 
-# Acquire process lock to prevent concurrent execution
-if not process_lock.acquire(timeout=10):
-    sys.exit(2)
-
 # Ensure processed backups directory structure exists so backups never crash on missing folders
 try:
     _processed_root = "/config/processed_books"
@@ -273,11 +282,28 @@ def get_internal_api_url(path):
         
     return f"{protocol}://127.0.0.1:{port}{path}"
 
-class NewBookProcessor:
-    def __init__(self, filepath: str):
-        # Settings / DB
+class IngestContext:
+    """Settings, directories and DB connections shared by every file handled in one process.
+
+    The one-shot CLI builds a fresh context for each run. The ingest daemon keeps a single
+    instance alive and calls refresh_if_changed() before every file, so changes made on the
+    CWA Settings page or to the library location are still picked up without a restart."""
+
+    def __init__(self, dirs_json_path: str = "/app/calibre-web-automated/dirs.json", app_db_path: str = "/config/app.db"):
+        load_cps_integrations()
+        self.app_db_path = app_db_path
         self.db = CWA_DB()
-        self.cwa_settings = self.db.cwa_settings
+
+        self.ingest_folder, self.default_library_dir, self.tmp_conversion_dir = self.get_dirs(dirs_json_path)
+        self.ingest_folder = os.path.normpath(self.ingest_folder)
+
+        self._cwa_db_version = self._get_cwa_db_version()
+        self._app_db_signature = self._get_app_db_signature()
+        self.apply_cwa_settings(self.db.cwa_settings)
+        self.load_library_settings()
+
+    def apply_cwa_settings(self, cwa_settings: dict) -> None:
+        self.cwa_settings = cwa_settings
 
         # Core ingest settings
         self.auto_convert_on = self.cwa_settings['auto_convert']
@@ -285,6 +311,8 @@ class NewBookProcessor:
         self.ingest_ignored_formats = self.cwa_settings['auto_ingest_ignored_formats']
         if isinstance(self.ingest_ignored_formats, str):
             self.ingest_ignored_formats = [self.ingest_ignored_formats]
+        else:
+            self.ingest_ignored_formats = list(self.ingest_ignored_formats)
 
         # Add known temporary / partial extensions
         for tmp_ext in ("crdownload", "download", "part", "uploading", "temp"):
@@ -297,20 +325,10 @@ class NewBookProcessor:
             self.convert_retained_formats = self.convert_retained_formats.split(',') if self.convert_retained_formats else []
         self.is_kindle_epub_fixer = self.cwa_settings['kindle_epub_fixer']
 
-        # Formats
-        self.supported_book_formats = {
-            'acsm','azw','azw3','azw4','cbz','cbr','cb7','cbc','chm','djvu','docx','epub','fb2','fbz','html','htmlz','kepub','kfx','kfx-zip','lit','lrf','mobi','odt','pdf','prc','pdb','pml','rb','rtf','snb','tcr','txtz','txt'
-        }
-        self.hierarchy_of_success = {
-            'epub','kepub','lit','mobi','azw','azw3','fb2','fbz','azw4','prc','odt','lrf','pdb','cbz','pml','rb','cbr','cb7','cbc','chm','djvu','snb','tcr','pdf','docx','rtf','html','htmlz','txtz','txt'
-        }
-        self.supported_audiobook_formats = {'m4b', 'm4a', 'mp4'}
-
-        # Directories
-        self.ingest_folder, self.library_dir, self.tmp_conversion_dir = self.get_dirs("/app/calibre-web-automated/dirs.json")
-        self.ingest_folder = os.path.normpath(self.ingest_folder)
+    def load_library_settings(self) -> None:
+        self.library_dir = self.default_library_dir
         # Ensure library_dir is consistent with the main app's config
-        with sqlite3.connect("/config/app.db", timeout=30) as con:
+        with sqlite3.connect(self.app_db_path, timeout=30) as con:
             cur = con.cursor()
             try:
                 db_path = cur.execute('SELECT config_calibre_dir FROM settings;').fetchone()[0]
@@ -319,17 +337,6 @@ class NewBookProcessor:
             except Exception as e:
                 print(f"[ingest-processor] WARN: Could not read config_calibre_dir from app.db, using default. Error: {e}", flush=True)
 
-        Path(self.tmp_conversion_dir).mkdir(exist_ok=True)
-        self.staging_dir = os.path.join(self.tmp_conversion_dir, "staging")
-        Path(self.staging_dir).mkdir(exist_ok=True)
-
-        # Current file
-        self.filepath = filepath
-        self.filename = os.path.basename(filepath)
-        self.can_convert, self.input_format = self.can_convert_check()
-        # Determine if the file is already in the desired target format using normalized extensions
-        self.is_target_format = (self.input_format.lower() == str(self.target_format).lower())
-
         # Calibre environment
         self.calibre_env = os.environ.copy()
         self.calibre_env["HOME"] = "/config"  # Enable plugins under /config
@@ -341,29 +348,51 @@ class NewBookProcessor:
             self.calibre_env['CALIBRE_OVERRIDE_DATABASE_PATH'] = self.metadata_db
             self.library_dir = self.split_library["split_path"]
 
-        # Track the last added Calibre book id(s) from calibredb output
-        self.last_added_book_id: int | None = None
-        self.last_added_book_ids: list[int] = []
-
-    @staticmethod
-    def _parse_added_book_ids(output: str) -> list[int]:
-        """Parse calibredb stdout for the 'Added book ids: X[, Y, ...]' line and return IDs.
-
-        Handles variations like 'Added book id: 4' or 'Added book ids: 4, 5'.
-        """
+    def refresh_if_changed(self) -> bool:
+        """Reloads cwa_settings and the app.db library settings if either database changed since the last
+        check. Returns True if anything was reloaded."""
+        reloaded = False
+
+        # data_version only moves when another connection commits to cwa.db, so our own stat inserts don't count
+        cwa_db_version = self._get_cwa_db_version()
+        if cwa_db_version != self._cwa_db_version:
+            self._cwa_db_version = cwa_db_version
+            cwa_settings = self.db.get_cwa_settings()
+            if cwa_settings != self.cwa_settings:
+                print("[ingest-processor] CWA settings changed, reloading...", flush=True)
+                self.apply_cwa_settings(cwa_settings)
+                reloaded = True
+
+        app_db_signature = self._get_app_db_signature()
+        if app_db_signature != self._app_db_signature:
+            self._app_db_signature = app_db_signature
+            previous = (self.library_dir, self.split_library)
+            self.load_library_settings()
+            if (self.library_dir, self.split_library) != previous:
+                print(f"[ingest-processor] Library location changed, now importing into {self.library_dir}", flush=True)
+                reloaded = True
+
+        return reloaded
+
+    def _get_cwa_db_version(self) -> int | None:
         try:
-            import re
-            m = re.search(r"Added book id[s]?:\s*([0-9,\s]+)", output, flags=re.IGNORECASE)
-            if not m:
-                return []
-            nums = m.group(1)
-            ids = [int(x.strip()) for x in nums.split(',') if x.strip().isdigit()]
-            return ids
+            return self.db.cur.execute("PRAGMA data_version").fetchone()[0]
         except Exception:
-            return []
+            return None
+
+    def _get_app_db_signature(self) -> tuple:
+        signature = []
+        for path in (self.app_db_path, self.app_db_path + "-wal"):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
     def get_split_library(self) -> dict[str, str] | None:
         """Checks whether or not the user has split library enabled. Returns None if they don't and the path of the Split Library location if True."""
-        with sqlite3.connect("/config/app.db", timeout=30) as con:
+        with sqlite3.connect(self.app_db_path, timeout=30) as con:
             cur = con.cursor()
             split_library = cur.execute('SELECT config_calibre_split FROM settings;').fetchone()[0]
 
@@ -377,7 +406,6 @@ class NewBookProcessor:
             else:
                 return None
 
-
     def get_dirs(self, dirs_json_path: str) -> tuple[str, str, str]:
         dirs = {}
         with open(dirs_json_path, 'r') as f:
@@ -390,6 +418,75 @@ class NewBookProcessor:
         return ingest_folder, library_dir, tmp_conversion_dir
 
 
+class NewBookProcessor:
+    def __init__(self, filepath: str, context: IngestContext | None = None):
+        # Settings / DB - shared with other files when running inside the ingest daemon
+        self.context = context if context is not None else IngestContext()
+        self.db = self.context.db
+        self.cwa_settings = self.context.cwa_settings
+
+        # Core ingest settings
+        self.auto_convert_on = self.context.auto_convert_on
+        self.target_format = self.context.target_format
+        self.ingest_ignored_formats = list(self.context.ingest_ignored_formats)
+        self.convert_ignored_formats = self.context.convert_ignored_formats
+        self.convert_retained_formats = list(self.context.convert_retained_formats)
+        self.is_kindle_epub_fixer = self.context.is_kindle_epub_fixer
+
+        # Formats
+        self.supported_book_formats = {
+            'acsm','azw','azw3','azw4','cbz','cbr','cb7','cbc','chm','djvu','docx','epub','fb2','fbz','html','htmlz','kepub','kfx','kfx-zip','lit','lrf','mobi','odt','pdf','prc','pdb','pml','rb','rtf','snb','tcr','txtz','txt'
+        }
+        self.hierarchy_of_success = {
+            'epub','kepub','lit','mobi','azw','azw3','fb2','fbz','azw4','prc','odt','lrf','pdb','cbz','pml','rb','cbr','cb7','cbc','chm','djvu','snb','tcr','pdf','docx','rtf','html','htmlz','txtz','txt'
+        }
+        self.supported_audiobook_formats = {'m4b', 'm4a', 'mp4'}
+
+        # Directories
+        self.ingest_folder = self.context.ingest_folder
+        self.library_dir = self.context.library_dir
+        self.tmp_conversion_dir = self.context.tmp_conversion_dir
+
+        Path(self.tmp_conversion_dir).mkdir(exist_ok=True)
+        self.staging_dir = os.path.join(self.tmp_conversion_dir, "staging")
+        Path(self.staging_dir).mkdir(exist_ok=True)
+
+        # Current file
+        self.filepath = filepath
+        self.filename = os.path.basename(filepath)
+        self.can_convert, self.input_format = self.can_convert_check()
+        # Determine if the file is already in the desired target format using normalized extensions
+        self.is_target_format = (self.input_format.lower() == str(self.target_format).lower())
+
+        # Calibre environment
+        self.calibre_env = self.context.calibre_env.copy()
+        self.metadata_db = self.context.metadata_db
+        self.split_library = self.context.split_library
+
+        # Track the last added Calibre book id(s) from calibredb output
+        self.last_added_book_id: int | None = None
+        self.last_added_book_ids: list[int] = []
+        # Set when a converted book should also keep its original format
+        self.retain_original_format = False
+
+    @staticmethod
+    def _parse_added_book_ids(output: str) -> list[int]:
+        """Parse calibredb stdout for the 'Added book ids: X[, Y, ...]' line and return IDs.
+
+        Handles variations like 'Added book id: 4' or 'Added book ids: 4, 5'.
+        """
+        try:
+            import re
+            m = re.search(r"Added book id[s]?:\s*([0-9,\s]+)", output, flags=re.IGNORECASE)
+            if not m:
+                return []
+            nums = m.group(1)
+            ids = [int(x.strip()) for x in nums.split(',') if x.strip().isdigit()]
+            return ids
+        except Exception:
+            return []
+
+
     def can_convert_check(self) -> tuple[bool, str]:
         """When the current filepath isn't of the target format, this function will check if the file is able to be converted to the target format,
         returning a can_convert bool with the answer"""
@@ -551,49 +648,16 @@ class NewBookProcessor:
 
 
     def add_book_to_library(self, book_path:str, text: bool=True, format: str="text" ) -> None:
-        # If kindle-epub-fixer is on, run it first and import the *fixed* file.
-        if self.target_format == "epub" and self.is_kindle_epub_fixer:
-            fixed_epub_path = Path(self.tmp_conversion_dir) / os.path.basename(book_path)
-            self.run_kindle_epub_fixer(book_path, dest=self.tmp_conversion_dir)
-            try:
-                # Use the fixed path only if the fixer succeeded and created a non-empty file
-                if fixed_epub_path.exists() and fixed_epub_path.stat().st_size > 0:
-                    book_path = str(fixed_epub_path)
-                else:
-                    print(f"[ingest-processor] WARN: Kindle EPUB fixer did not produce a valid output file. Importing original.", flush=True)
-            except OSError as e:
-                if e.errno == 36: # Filename too long
-                    print(f"[ingest-processor] Skipping file due to OS path length error: {book_path}", flush=True)
-                    return
-                else:
-                    print(f"[ingest-processor] An error occurred while checking the fixed EPUB path on {book_path}:\n{e}", flush=True)
-                    raise
-
-        # Capture the current max(timestamp) in Calibre DB so we can detect rows whose last_modified was bumped by an overwrite
-        pre_import_max_timestamp = None
-        if self.cwa_settings.get('auto_ingest_automerge') == 'overwrite':
-            try:
-                with sqlite3.connect(self.metadata_db, timeout=30) as con:
-                    cur = con.cursor()
-                    pre_import_max_timestamp = cur.execute('SELECT MAX(timestamp) FROM books').fetchone()[0]
-            except Exception as e:
-                print(f"[ingest-processor] WARN: Could not read pre-import max timestamp: {e}", flush=True)
-
-        print("[ingest-processor]: Importing new book to CWA...")
-        source_path = Path(book_path)
-        if not source_path.exists() or source_path.stat().st_size == 0:
-            print(f"[ingest-processor] ERROR: Import file is missing or empty, skipping: {book_path}", flush=True)
-            self.backup(self.filepath, backup_type="failed") # Backup original file
+        prepared = self.prepare_import(book_path)
+        if prepared is None:
             return
+        book_path, staged_path = prepared
+        self.import_staged_book(book_path, staged_path, text, format)
 
-        # Stage file for import
-        staged_path = Path(self.staging_dir) / source_path.name
-        try:
-            shutil.copy2(source_path, staged_path)
-        except Exception as e:
-            print(f"[ingest-processor] ERROR: Failed to stage file for import: {e}", flush=True)
-            self.backup(self.filepath, backup_type="failed")
-            return
+    def import_staged_book(self, book_path: str, staged_path: Path, text: bool=True, format: str="text") -> None:
+        """Imports a file already copied into the staging dir by prepare_import() and runs the post-import steps"""
+        # Capture the current max(timestamp) in Calibre DB so we can detect rows whose last_modified was bumped by an overwrite
+        pre_import_max_timestamp = self.get_pre_import_max_timestamp()
 
         try:
             if text:
@@ -605,6 +669,7 @@ class NewBookProcessor:
                     self.last_added_book_ids = added_ids
                     self.last_added_book_id = added_ids[-1]
             else:  # audiobook path
+                import audiobook  # Pulls in Wand/ImageMagick, so only load it when an audiobook turns up
                 meta = audiobook.get_audio_file_info(str(staged_path), format, os.path.basename(str(staged_path)), False)
 
                 # Coalesce metadata to safe strings
@@ -651,11 +716,7 @@ class NewBookProcessor:
                     self.last_added_book_id = added_ids[-1]
             print(f"[ingest-processor] Added {staged_path.stem} to Calibre database", flush=True)
 
-            if self.cwa_settings['auto_backup_imports']:
-                self.backup(str(staged_path), backup_type="imported")
-
-            self.db.import_add_entry(staged_path.stem,
-                                    str(self.cwa_settings["auto_backup_imports"]))
+            self.record_import(staged_path)
 
             # Optional post-import GDrive sync
             gdrive_sync_if_enabled()
@@ -682,22 +743,7 @@ class NewBookProcessor:
             else:
                 self.generate_book_checksums(staged_path.stem)
 
-            # If we overwrote an existing book, Calibre does not bump books.timestamp, only last_modified.
-            # Update timestamp to last_modified for any rows changed by this import so sorting by 'new' reflects overwrites.
-            if self.cwa_settings.get('auto_ingest_automerge') == 'overwrite':
-                try:
-                    with sqlite3.connect(self.metadata_db, timeout=30) as con:
-                        cur = con.cursor()
-                        # pre_import_max_timestamp may be None (empty library) -> update all rows where timestamp < last_modified
-                        if pre_import_max_timestamp is None:
-                            cur.execute('UPDATE books SET timestamp = last_modified WHERE timestamp < last_modified')
-                        else:
-                            cur.execute('UPDATE books SET timestamp = last_modified WHERE last_modified > ? AND timestamp < last_modified', (pre_import_max_timestamp,))
-                        affected = cur.rowcount
-                        if affected:
-                            print(f"[ingest-processor] INFO: Updated timestamp for {affected} overwritten book(s) to reflect latest import.", flush=True)
-                except Exception as e:
-                    print(f"[ingest-processor] WARN: Failed to adjust timestamps after overwrite import: {e}", flush=True)
+            self.update_overwritten_timestamps(pre_import_max_timestamp)
 
         except subprocess.CalledProcessError as e:
             print(f"[ingest-processor] {staged_path.stem} was not able to be added to the Calibre Library due to the following error:\nCALIBREDB EXIT/ERROR CODE: {e.returncode}\n{e.stderr}", flush=True)
@@ -708,6 +754,82 @@ class NewBookProcessor:
             if staged_path.exists():
                 os.remove(staged_path)
 
+    def prepare_import(self, book_path: str) -> tuple[str, Path] | None:
+        """Runs the kindle-epub-fixer if enabled and copies the file to be imported into the staging dir.
+        Returns the (possibly fixed) book path and the staged path, or None if the file can't be imported."""
+        # If kindle-epub-fixer is on, run it first and import the *fixed* file.
+        if self.target_format == "epub" and self.is_kindle_epub_fixer:
+            fixed_epub_path = Path(self.tmp_conversion_dir) / os.path.basename(book_path)
+            self.run_kindle_epub_fixer(book_path, dest=self.tmp_conversion_dir)
+            try:
+                # Use the fixed path only if the fixer succeeded and created a non-empty file
+                if fixed_epub_path.exists() and fixed_epub_path.stat().st_size > 0:
+                    book_path = str(fixed_epub_path)
+                else:
+                    print(f"[ingest-processor] WARN: Kindle EPUB fixer did not produce a valid output file. Importing original.", flush=True)
+            except OSError as e:
+                if e.errno == 36: # Filename too long
+                    print(f"[ingest-processor] Skipping file due to OS path length error: {book_path}", flush=True)
+                    return None
+                else:
+                    print(f"[ingest-processor] An error occurred while checking the fixed EPUB path on {book_path}:\n{e}", flush=True)
+                    raise
+
+        print("[ingest-processor]: Importing new book to CWA...")
+        source_path = Path(book_path)
+        if not source_path.exists() or source_path.stat().st_size == 0:
+            print(f"[ingest-processor] ERROR: Import file is missing or empty, skipping: {book_path}", flush=True)
+            self.backup(self.filepath, backup_type="failed") # Backup original file
+            return None
+
+        # Stage file for import
+        staged_path = Path(self.staging_dir) / source_path.name
+        try:
+            shutil.copy2(source_path, staged_path)
+        except Exception as e:
+            print(f"[ingest-processor] ERROR: Failed to stage file for import: {e}", flush=True)
+            self.backup(self.filepath, backup_type="failed")
+            return None
+
+        return book_path, staged_path
+
+    def get_pre_import_max_timestamp(self) -> str | None:
+        """Only needed in overwrite mode, where calibre bumps last_modified but not timestamp on merged books"""
+        if self.cwa_settings.get('auto_ingest_automerge') != 'overwrite':
+            return None
+        try:
+            with sqlite3.connect(self.metadata_db, timeout=30) as con:
+                cur = con.cursor()
+                return cur.execute('SELECT MAX(timestamp) FROM books').fetchone()[0]
+        except Exception as e:
+            print(f"[ingest-processor] WARN: Could not read pre-import max timestamp: {e}", flush=True)
+            return None
+
+    def record_import(self, staged_path: Path) -> None:
+        if self.cwa_settings['auto_backup_imports']:
+            self.backup(str(staged_path), backup_type="imported")
+
+        self.db.import_add_entry(staged_path.stem,
+                                str(self.cwa_settings["auto_backup_imports"]))
+
+    def update_overwritten_timestamps(self, pre_import_max_timestamp: str | None) -> None:
+        # If we overwrote an existing book, Calibre does not bump books.timestamp, only last_modified.
+        # Update timestamp to last_modified for any rows changed by this import so sorting by 'new' reflects overwrites.
+        if self.cwa_settings.get('auto_ingest_automerge') == 'overwrite':
+            try:
+                with sqlite3.connect(self.metadata_db, timeout=30) as con:
+                    cur = con.cursor()
+                    # pre_import_max_timestamp may be None (empty library) -> update all rows where timestamp < last_modified
+                    if pre_import_max_timestamp is None:
+                        cur.execute('UPDATE books SET timestamp = last_modified WHERE timestamp < last_modified')
+                    else:
+                        cur.execute('UPDATE books SET timestamp = last_modified WHERE last_modified > ? AND timestamp < last_modified', (pre_import_max_timestamp,))
+                    affected = cur.rowcount
+                    if affected:
+                        print(f"[ingest-processor] INFO: Updated timestamp for {affected} overwritten book(s) to reflect latest import.", flush=True)
+            except Exception as e:
+                print(f"[ingest-processor] WARN: Failed to adjust timestamps after overwrite import: {e}", flush=True)
+
     def add_format_to_book(self, book_id:int, book_path:str) -> None:
         """Attach a new format file to an existing Calibre book using calibredb add_format"""
         source_path = Path(book_path)
@@ -746,7 +868,7 @@ class NewBookProcessor:
 
     def run_kindle_epub_fixer(self, filepath:str, dest=None) -> None:
         try:
-            EPUBFixer().process(input_path=filepath, output_path=dest)
+            EPUBFixer(db=self.db).process(input_path=filepath, output_path=dest)
             print(f"[ingest-processor] {os.path.basename(filepath)} successfully processed with the cwa-kindle-epub-fixer!")
         except Exception as e:
             print(f"[ingest-processor] An error occurred while processing {os.path.basename(filepath)} with the kindle-epub-fixer. See the following error:\n{e}")
@@ -997,9 +1119,318 @@ class NewBookProcessor:
             print(f"[ingest-processor] An error occurred while attempting to recursively set ownership of {self.library_dir} to abc:abc. See the following error:\n{e}", flush=True)
 
 
-def main(filepath=None):
-    """Checks if filepath is a directory. If it is, main will be ran on every file in the given directory
-    Inotifywait won't detect files inside folders if the folder was moved rather than copied"""
+def truncate_filename(filepath: str) -> str:
+    """Truncates the filename if it is too long, returning the (possibly renamed) path"""
+    MAX_LENGTH = 150
+    filename = os.path.basename(filepath)
+    name, ext = os.path.splitext(filename)
+    allowed_len = MAX_LENGTH - len(ext)
+
+    if len(name) > allowed_len:
+        new_name = name[:allowed_len] + ext
+        new_path = os.path.join(os.path.dirname(filepath), new_name)
+        os.rename(filepath, new_path)
+        filepath = new_path
+    return filepath
+
+
+def plan_import(nbp: NewBookProcessor) -> str | None:
+    """Runs everything that happens to an ingested file before its calibredb import (readiness check, sidecar
+    manifests, conversion). Returns the path that should be imported into the library, or None if the file has
+    already been fully handled or should be skipped."""
+    filepath = nbp.filepath
+
+    # If this file is not an ignored temporary, wait briefly for stability to avoid importing a still-growing file
+    ext_tmp_check = Path(nbp.filename).suffix.replace('.', '')
+    if ext_tmp_check not in nbp.ingest_ignored_formats:
+        timeout_minutes = nbp.cwa_settings.get('ingest_timeout_minutes', 15)
+        print(f"[ingest-processor] Checking if file is ready (timeout: {timeout_minutes} minutes): {nbp.filename}", flush=True)
+        ready = nbp.is_file_in_use()
+        if not ready:
+            print(f"[ingest-processor] WARN: File did not become ready in time or vanished (after {timeout_minutes} minutes): {nbp.filename}", flush=True)
+            return None
+
+    # Sidecar manifest handling for explicit actions (e.g., add_format)
+    manifest_path = filepath + ".cwa.json"
+    try:
+        if Path(manifest_path).exists():
+            with open(manifest_path, 'r', encoding='utf-8') as mf:
+                manifest = json.load(mf)
+            action = manifest.get("action")
+            if action == "add_format":
+                try:
+                    book_id = int(manifest.get("book_id", -1))
+                except Exception:
+                    book_id = -1
+                if book_id > -1:
+                    nbp.add_format_to_book(book_id, filepath)
+                else:
+                    print(f"[ingest-processor] Invalid book_id in manifest for {os.path.basename(filepath)}", flush=True)
+                # Cleanup file and manifest regardless of outcome
+                try:
+                    os.remove(manifest_path)
+                except Exception:
+                    ...
+                nbp.set_library_permissions()
+                nbp.delete_current_file()
+                return None
+    except Exception as e:
+        print(f"[ingest-processor] Error processing manifest file: {e}", flush=True)
+        # Continue with normal processing if manifest handling fails
+
+    # Check if the user has chosen to exclude files of this type from the ingest process
+    # Remove . (dot), check is against exclude whitout dot
+    ext = Path(nbp.filename).suffix.replace('.', '')
+    if ext in nbp.ingest_ignored_formats:
+        # Do NOT delete ignored temporary files; they may be renamed shortly (e.g. .uploading -> .epub)
+        print(f"[ingest-processor] Skipping ignored/temporary file (no action taken): {nbp.filename}", flush=True)
+        return None
+
+    if nbp.is_target_format: # File can just be imported
+        print(f"\n[ingest-processor]: No conversion needed for {nbp.filename}, importing now...", flush=True)
+        return filepath
+    elif nbp.is_supported_audiobook():
+        # Audiobooks carry their own per-file metadata arguments so they're always imported on their own
+        print(f"\n[ingest-processor]: No conversion needed for {nbp.filename}, is audiobook, importing now...", flush=True)
+        nbp.add_book_to_library(filepath, False, Path(nbp.filename).suffix)
+        return None
+    else:
+        if nbp.auto_convert_on and nbp.can_convert: # File can be converted to target format and Auto-Converter is on
+
+            if nbp.input_format in nbp.convert_ignored_formats: # File could be converted & the converter is activated but the user has specified files of this format should not be converted
+                print(f"\n[ingest-processor]: {nbp.filename} not in target format but user has told CWA not to convert this format so importing the file anyway...", flush=True)
+                return filepath
+            elif nbp.target_format == "kepub": # File is not in the convert ignore list and target is kepub, so we start the kepub conversion process
+                convert_successful, converted_filepath = nbp.convert_to_kepub()
+            else: # File is not in the convert ignore list and target is not kepub, so we start the regular conversion process
+                convert_successful, converted_filepath = nbp.convert_book()
+
+            if convert_successful: # If previous conversion process was successful, remove tmp files and import into library
+                # If the original format should be retained, it's added as an additional format once the book has been imported
+                nbp.retain_original_format = nbp.input_format in nbp.convert_retained_formats and nbp.input_format not in nbp.ingest_ignored_formats
+                return converted_filepath
+            return None
+
+        elif nbp.can_convert and not nbp.auto_convert_on: # Books not in target format but Auto-Converter is off so files are imported anyway
+            print(f"\n[ingest-processor]: {nbp.filename} not in target format but CWA Auto-Convert is deactivated so importing the file anyway...", flush=True)
+            return filepath
+        else:
+            print(f"[ingest-processor]: Cannot convert {nbp.filepath}. {nbp.input_format} is currently unsupported / is not a known ebook format.", flush=True)
+            return None
+
+
+def add_retained_format(nbp: NewBookProcessor) -> None:
+    """Adds the original file of a converted book to it as an additional format"""
+    filepath = nbp.filepath
+    print(f"[ingest-processor]: Retaining original format ({nbp.input_format}) for {nbp.filename}...", flush=True)
+    # Find the book that was just added to get its ID
+    try:
+        # Prefer the exact id we just added if available
+        if nbp.last_added_book_id is not None:
+            target_book_id = nbp.last_added_book_id
+        else:
+            with sqlite3.connect(nbp.metadata_db, timeout=30) as con:
+                cur = con.cursor()
+                cur.execute("SELECT id FROM books ORDER BY timestamp DESC LIMIT 1")
+                res = cur.fetchone()
+                target_book_id = res[0] if res else None
+
+        if target_book_id is not None:
+            if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
+                nbp.add_format_to_book(int(target_book_id), filepath)
+            else:
+                print(f"[ingest-processor] Original file no longer exists or is empty, cannot retain format: {filepath}", flush=True)
+        else:
+            print(f"[ingest-processor] Could not find book ID to add retained format for: {nbp.filename}", flush=True)
+    except Exception as e:
+        print(f"[ingest-processor] Error adding retained format: {e}", flush=True)
+
+
+def _map_added_book_ids(staged_paths: list[Path], added_ids: list[int], metadata_db: str, library_dir: str) -> list[int | None]:
+    """Works out which of the ids reported by a batched calibredb add belongs to which staged file.
+
+    calibredb reports new ids in the order the files were given, so when every file produced a book they line
+    up directly. When some files were merged into / skipped as duplicates of existing books they no longer do,
+    so the books are matched to the staged files by content (the same partial MD5 used for KOReader sync)."""
+    if len(added_ids) == len(staged_paths):
+        return list(added_ids)
+
+    book_ids: list[int | None] = [None] * len(staged_paths)
+    if not added_ids:
+        return book_ids
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+    from cps.progress_syncing.checksums import calculate_koreader_partial_md5
+
+    staged_checksums = {}
+    for index, staged_path in enumerate(staged_paths):
+        checksum = calculate_koreader_partial_md5(str(staged_path))
+        if checksum:
+            staged_checksums.setdefault(checksum, index)
+
+    placeholders = ','.join('?' * len(added_ids))
+    with sqlite3.connect(metadata_db, timeout=30) as con:
+        rows = con.execute(f'SELECT books.id, books.path, data.name, data.format FROM books JOIN data ON data.book = books.id WHERE books.id IN ({placeholders})',
+                           [int(book_id) for book_id in added_ids]).fetchall()
+
+    for book_id, book_path, name, book_format in rows:
+        checksum = calculate_koreader_partial_md5(os.path.join(library_dir, book_path, f"{name}.{book_format.lower()}"))
+        index = staged_checksums.get(checksum)
+        if index is not None and book_ids[index] is None:
+            book_ids[index] = book_id
+    return book_ids
+
+
+def add_books_to_library_batch(batch: list[tuple[NewBookProcessor, str]]) -> None:
+    """Imports several books with a single calibredb add, so a bulk drop only opens metadata.db & takes
+    Calibre's library lock once. The per-book steps (metadata fetch, auto-send, checksums) still run for
+    every book using the id calibredb reported for its file.
+
+    If the batched add fails, every file is retried on its own so one bad file can't sink the others."""
+    if len(batch) == 1:
+        nbp, book_path = batch[0]
+        nbp.add_book_to_library(book_path)
+        return
+
+    staged = []
+    for nbp, book_path in batch:
+        prepared = nbp.prepare_import(book_path)
+        if prepared is not None:
+            staged.append((nbp, *prepared))
+    if not staged:
+        return
+
+    lead = staged[0][0]
+    pre_import_max_timestamp = lead.get_pre_import_max_timestamp()
+    try:
+        print(f"[ingest-processor] Importing {len(staged)} books to CWA in a single batch...", flush=True)
+        try:
+            result = subprocess.run([
+                "calibredb", "add", *[str(staged_path) for _, _, staged_path in staged],
+                "--automerge", lead.cwa_settings['auto_ingest_automerge'], f"--library-path={lead.library_dir}"
+            ], env=lead.calibre_env, check=True, capture_output=True, text=True)
+        except subprocess.CalledProcessError as e:
+            print(f"[ingest-processor] Batch import failed, importing the {len(staged)} books one at a time instead:\nCALIBREDB EXIT/ERROR CODE: {e.returncode}\n{e.stderr}", flush=True)
+            for nbp, book_path, staged_path in staged:
+                nbp.import_staged_book(book_path, staged_path)
+            return
+
+        added_ids = NewBookProcessor._parse_added_book_ids((result.stdout or '') + '\n' + (result.stderr or ''))
+        book_ids = _map_added_book_ids([staged_path for _, _, staged_path in staged], added_ids, lead.metadata_db, lead.library_dir)
+
+        for (nbp, book_path, staged_path), book_id in zip(staged, book_ids):
+            nbp.last_added_book_id = book_id
+            nbp.last_added_book_ids = [book_id] if book_id is not None else []
+            print(f"[ingest-processor] Added {staged_path.stem} to Calibre database", flush=True)
+            nbp.record_import(staged_path)
+
+        # Optional post-import GDrive sync
+        gdrive_sync_if_enabled()
+
+        for (nbp, book_path, staged_path), book_id in zip(staged, book_ids):
+            if book_id is None:
+                print(f"[ingest-processor] WARN: No new book id reported for {staged_path.name} (merged or duplicate?), skipping metadata fetch, auto-send & checksums", flush=True)
+                continue
+            nbp.fetch_metadata_if_enabled(book_id=book_id)
+            nbp.trigger_auto_send_if_enabled(book_id=book_id, book_path=book_path)
+
+        # Refresh Calibre-Web's database session to make the new books visible
+        lead.refresh_cwa_session()
+
+        for (nbp, book_path, staged_path), book_id in zip(staged, book_ids):
+            if book_id is not None:
+                nbp.generate_book_checksums(staged_path.stem, book_id=book_id)
+
+        lead.update_overwritten_timestamps(pre_import_max_timestamp)
+
+    except Exception as e:
+        print(f"[ingest-processor] ingest-processor ran into the following error during a batch import:\n{e}", flush=True)
+    finally:
+        for _, _, staged_path in staged:
+            if staged_path.exists():
+                os.remove(staged_path)
+
+
+def cleanup_processed_files(processors: list[NewBookProcessor]) -> None:
+    """Removes processed files from the ingest folder and resets permissions & the temp conversion folder"""
+    if not processors:
+        return
+
+    # Ensure cleanup always happens, even if an exception occurred
+    try:
+        # One recursive chown covers every book imported in this run
+        processors[0].set_library_permissions()
+    except Exception as e:
+        print(f"[ingest-processor] Error setting library permissions during cleanup: {e}", flush=True)
+
+    for nbp in processors:
+        try:
+            nbp.delete_current_file()
+        except Exception as e:
+            print(f"[ingest-processor] Error deleting current file during cleanup: {e}", flush=True)
+
+    try:
+        # Cleanup the temp conversion folder, which now contains the staging dir
+        shutil.rmtree(processors[0].tmp_conversion_dir, ignore_errors=True)
+    except Exception as e:
+        print(f"[ingest-processor] Error cleaning up temp conversion directory: {e}", flush=True)
+
+
+def main_batch(filepaths: list[str], context: IngestContext) -> dict[str, int]:
+    """Processes several ingested files together: each file is checked & converted on its own, then every book
+    that is ready is imported with a single calibredb add. Returns an exit code for each given path.
+
+    Files whose names would clash in the shared temp/staging folders are processed on their own afterwards."""
+    results = {filepath: 0 for filepath in filepaths}
+    processors: list[NewBookProcessor] = []
+    to_import: list[tuple[NewBookProcessor, str]] = []
+    deferred: list[tuple[str, str]] = []
+    seen_stems = set()
+
+    try:
+        for filepath in filepaths:
+            if os.path.isdir(filepath):
+                deferred.append((filepath, filepath))
+                continue
+            try:
+                truncated_path = truncate_filename(filepath)
+                stem = Path(truncated_path).stem.lower()
+                if stem in seen_stems:
+                    deferred.append((filepath, truncated_path))
+                    continue
+                seen_stems.add(stem)
+
+                nbp = NewBookProcessor(truncated_path, context)
+                processors.append(nbp)
+                import_path = plan_import(nbp)
+                if import_path:
+                    to_import.append((nbp, import_path))
+            except Exception as e:
+                print(f"[ingest-processor] Unexpected error during processing of {filepath}: {e}", flush=True)
+                results[filepath] = 1
+
+        if to_import:
+            add_books_to_library_batch(to_import)
+
+        for nbp, _ in to_import:
+            if nbp.retain_original_format:
+                add_retained_format(nbp)
+    finally:
+        cleanup_processed_files(processors)
+
+    for filepath, deferred_path in deferred:
+        try:
+            main(deferred_path, context)
+        except Exception:
+            results[filepath] = 1
+    return results
+
+
+def main(filepath=None, context: IngestContext | None = None):
+    """Checks if filepath is a directory. If it is, every file in the given directory is processed as one batch
+    Inotifywait won't detect files inside folders if the folder was moved rather than copied.
+
+    When called by the ingest daemon a long-lived IngestContext is passed in and reused for every file."""
 
     if filepath is None:
         if len(sys.argv) < 2:
@@ -1010,153 +1441,70 @@ def main(filepath=None):
 
     nbp = None
     try:
-        ##############################################################################################
-        # Truncates the filename if it is too long
-        MAX_LENGTH = 150
-        filename = os.path.basename(filepath)
-        name, ext = os.path.splitext(filename)
-        allowed_len = MAX_LENGTH - len(ext)
-
-        if len(name) > allowed_len:
-            new_name = name[:allowed_len] + ext
-            new_path = os.path.join(os.path.dirname(filepath), new_name)
-            os.rename(filepath, new_path)
-            filepath = new_path
-        ###############################################################################################
+        filepath = truncate_filename(filepath)
         if os.path.isdir(filepath) and Path(filepath).exists():
-            # print(os.listdir(filepath))
-            for filename in os.listdir(filepath):
-                f = os.path.join(filepath, filename)
-                if Path(f).exists():
-                    main(f)
+            entries = [os.path.join(filepath, filename) for filename in os.listdir(filepath)]
+            entries = [f for f in entries if Path(f).exists()]
+            if entries:
+                main_batch(entries, context if context is not None else IngestContext())
             return
 
-        nbp = NewBookProcessor(filepath)
-
-        # If this file is not an ignored temporary, wait briefly for stability to avoid importing a still-growing file
-        ext_tmp_check = Path(nbp.filename).suffix.replace('.', '')
-        if ext_tmp_check not in nbp.ingest_ignored_formats:
-            timeout_minutes = nbp.cwa_settings.get('ingest_timeout_minutes', 15)
-            print(f"[ingest-processor] Checking if file is ready (timeout: {timeout_minutes} minutes): {nbp.filename}", flush=True)
-            ready = nbp.is_file_in_use()
-            if not ready:
-                print(f"[ingest-processor] WARN: File did not become ready in time or vanished (after {timeout_minutes} minutes): {nbp.filename}", flush=True)
-                return
-
-        # Sidecar manifest handling for explicit actions (e.g., add_format)
-        manifest_path = filepath + ".cwa.json"
-        try:
-            if Path(manifest_path).exists():
-                with open(manifest_path, 'r', encoding='utf-8') as mf:
-                    manifest = json.load(mf)
-                action = manifest.get("action")
-                if action == "add_format":
-                    try:
-                        book_id = int(manifest.get("book_id", -1))
-                    except Exception:
-                        book_id = -1
-                    if book_id > -1:
-                        nbp.add_format_to_book(book_id, filepath)
-                    else:
-                        print(f"[ingest-processor] Invalid book_id in manifest for {os.path.basename(filepath)}", flush=True)
-                    # Cleanup file and manifest regardless of outcome
-                    try:
-                        os.remove(manifest_path)
-                    except Exception:
-                        ...
-                    nbp.set_library_permissions()
-                    nbp.delete_current_file()
-                    return
-        except Exception as e:
-            print(f"[ingest-processor] Error processing manifest file: {e}", flush=True)
-            # Continue with normal processing if manifest handling fails
-
-        # Check if the user has chosen to exclude files of this type from the ingest process
-        # Remove . (dot), check is against exclude whitout dot
-        ext = Path(nbp.filename).suffix.replace('.', '')
-        if ext in nbp.ingest_ignored_formats:
-            # Do NOT delete ignored temporary files; they may be renamed shortly (e.g. .uploading -> .epub)
-            print(f"[ingest-processor] Skipping ignored/temporary file (no action taken): {nbp.filename}", flush=True)
-            return
-
-        if nbp.is_target_format: # File can just be imported
-            print(f"\n[ingest-processor]: No conversion needed for {nbp.filename}, importing now...", flush=True)
-            nbp.add_book_to_library(filepath)
-        elif nbp.is_supported_audiobook():
-            print(f"\n[ingest-processor]: No conversion needed for {nbp.filename}, is audiobook, importing now...", flush=True)
-            nbp.add_book_to_library(filepath, False, Path(nbp.filename).suffix)
-        else:
-            if nbp.auto_convert_on and nbp.can_convert: # File can be converted to target format and Auto-Converter is on
-
-                if nbp.input_format in nbp.convert_ignored_formats: # File could be converted & the converter is activated but the user has specified files of this format should not be converted
-                    print(f"\n[ingest-processor]: {nbp.filename} not in target format but user has told CWA not to convert this format so importing the file anyway...", flush=True)
-                    nbp.add_book_to_library(filepath)
-                    convert_successful = False
-                elif nbp.target_format == "kepub": # File is not in the convert ignore list and target is kepub, so we start the kepub conversion process
-                    convert_successful, converted_filepath = nbp.convert_to_kepub()
-                else: # File is not in the convert ignore list and target is not kepub, so we start the regular conversion process
-                    convert_successful, converted_filepath = nbp.convert_book()
-
-                if convert_successful: # If previous conversion process was successful, remove tmp files and import into library
-                    nbp.add_book_to_library(converted_filepath) # type: ignore
-
-                    # If the original format should be retained, also add it as an additional format
-                    if nbp.input_format in nbp.convert_retained_formats and nbp.input_format not in nbp.ingest_ignored_formats:
-                        print(f"[ingest-processor]: Retaining original format ({nbp.input_format}) for {nbp.filename}...", flush=True)
-                        # Find the book that was just added to get its ID
-                        try:
-                            # Prefer the exact id we just added if available
-                            if nbp.last_added_book_id is not None:
-                                target_book_id = nbp.last_added_book_id
-                            else:
-                                with sqlite3.connect(nbp.metadata_db, timeout=30) as con:
-                                    cur = con.cursor()
-                                    cur.execute("SELECT id FROM books ORDER BY timestamp DESC LIMIT 1")
-                                    res = cur.fetchone()
-                                    target_book_id = res[0] if res else None
-
-                            if target_book_id is not None:
-                                if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
-                                    nbp.add_format_to_book(int(target_book_id), filepath)
-                                else:
-                                    print(f"[ingest-processor] Original file no longer exists or is empty, cannot retain format: {filepath}", flush=True)
-                            else:
-                                print(f"[ingest-processor] Could not find book ID to add retained format for: {nbp.filename}", flush=True)
-                        except Exception as e:
-                            print(f"[ingest-processor] Error adding retained format: {e}", flush=True)
-
-            elif nbp.can_convert and not nbp.auto_convert_on: # Books not in target format but Auto-Converter is off so files are imported anyway
-                print(f"\n[ingest-processor]: {nbp.filename} not in target format but CWA Auto-Convert is deactivated so importing the file anyway...", flush=True)
-                nbp.add_book_to_library(filepath)
-            else:
-                print(f"[ingest-processor]: Cannot convert {nbp.filepath}. {nbp.input_format} is currently unsupported / is not a known ebook format.", flush=True)
+        nbp = NewBookProcessor(filepath, context)
+        import_path = plan_import(nbp)
+        if import_path:
+            nbp.add_book_to_library(import_path)
+            if nbp.retain_original_format:
+                add_retained_format(nbp)
 
     except Exception as e:
         print(f"[ingest-processor] Unexpected error during processing: {e}", flush=True)
         raise
     finally:
-        # Ensure cleanup always happens, even if an exception occurred
         if nbp:
-            try:
-                nbp.set_library_permissions()
-            except Exception as e:
-                print(f"[ingest-processor] Error setting library permissions during cleanup: {e}", flush=True)
-
-            try:
-                nbp.delete_current_file()
-            except Exception as e:
-                print(f"[ingest-processor] Error deleting current file during cleanup: {e}", flush=True)
-
-            try:
-                # Cleanup the temp conversion folder, which now contains the staging dir
-                shutil.rmtree(nbp.tmp_conversion_dir, ignore_errors=True)
-            except Exception as e:
-                print(f"[ingest-processor] Error cleaning up temp conversion directory: {e}", flush=True)
-
+            cleanup_processed_files([nbp])
             try:
                 del nbp # New in Version 2.0.0, should drastically reduce memory usage with large ingests
             except Exception:
                 pass  # Ignore errors in cleanup
 
+
+def submit_to_daemon(filepath: str, socket_path: str = DAEMON_SOCKET_PATH) -> int | None:
+    """Hands the given path to the running ingest daemon and waits for it to be processed.
+
+    Returns the exit code reported by the daemon, or None if no daemon is listening so the
+    caller can fall back to processing the file in this process."""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            client.connect(socket_path)
+        except OSError:
+            return None
+        client.sendall((json.dumps({"path": os.path.abspath(filepath)}) + "\n").encode("utf-8"))
+        reply = client.makefile("r", encoding="utf-8").readline()
+    except OSError as e:
+        print(f"[ingest-processor] Lost connection to the ingest daemon while processing {filepath}: {e}", flush=True)
+        return 1
+    finally:
+        client.close()
+
+    if not reply:
+        print(f"[ingest-processor] Ingest daemon exited before reporting a result for {filepath}", flush=True)
+        return 1
+    try:
+        return int(json.loads(reply).get("exit_code", 1))
+    except (ValueError, TypeError, AttributeError):
+        return 1
+
+
 if __name__ == "__main__":
+    # Thin client mode: let the long-lived ingest daemon do the work if it's running
+    if len(sys.argv) >= 2:
+        daemon_exit_code = submit_to_daemon(sys.argv[1])
+        if daemon_exit_code is not None:
+            sys.exit(daemon_exit_code)
+
+    # No daemon available, process the file in this process
+    # Acquire process lock to prevent concurrent execution
+    if not process_lock.acquire(timeout=10):
+        sys.exit(2)
     main()
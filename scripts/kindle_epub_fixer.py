@@ -6,6 +6,7 @@
 
 import os
 import re
+import struct
 import zipfile
 from xml.dom import minidom
 import argparse
@@ -20,11 +21,17 @@ import atexit
 from datetime import datetime
 import json
 import shutil
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from itertools import repeat
 
 import pwd
 import grp
 
 from cwa_db import CWA_DB
+from run_status import RunStatus, EPUB_FIXER_STATUS
 
 ### Code adapted from https://github.com/innocenat/kindle-epub-fix
 ### Translated from Javascript to Python & modified by crocodilestick
@@ -91,42 +98,69 @@ def print_and_log(string, log=True) -> None:
     print(string)
 
 ### LOCK FILES
-# Creates a lock file unless one already exists meaning an instance of the script is
-# already running, then the script is closed, the user is notified and the program
-# exits with code 2
-try:
-    lock = open(tempfile.gettempdir() + '/kindle_epub_fixer.lock', 'x')
-    lock.close()
-except FileExistsError:
-    print_and_log("[cwa-kindle-epub-fixer] CANCELLING... kindle-epub-fixer was initiated but is already running")
-    logger.info(f"\nCWA Kindle EPUB Fixer Service - Run Ended: {datetime.now()}")
-    sys.exit(2)
-
-# Defining function to delete the lock on script exit
+# Only script runs take the lock. Importing EPUBFixer (the ingest processor and daemon, convert-library)
+# must neither fail nor remove the lock of a fixer run in progress
+LOCK_PATH = tempfile.gettempdir() + '/kindle_epub_fixer.lock'
+_lock_owned = False
+
+def acquireLock():
+    """Creates a lock file unless one already exists meaning an instance of the script is
+    already running, then the script is closed, the user is notified and the program
+    exits with code 2"""
+    global _lock_owned
+    try:
+        lock = open(LOCK_PATH, 'x')
+        lock.close()
+    except FileExistsError:
+        print_and_log("[cwa-kindle-epub-fixer] CANCELLING... kindle-epub-fixer was initiated but is already running")
+        logger.info(f"\nCWA Kindle EPUB Fixer Service - Run Ended: {datetime.now()}")
+        sys.exit(2)
+    _lock_owned = True
+    # Will automatically run when the script exits
+    atexit.register(removeLock)
+
+# Defining function to delete the lock on script exit, only if this process took it
 def removeLock():
+    global _lock_owned
+    if not _lock_owned:
+        return
     try:
-        os.remove(tempfile.gettempdir() + '/kindle_epub_fixer.lock')
+        os.remove(LOCK_PATH)
     except FileNotFoundError:
         ...
-
-# Will automatically run when the script exits
-atexit.register(removeLock)
+    _lock_owned = False
 
 
 class EPUBFixer:
-    def __init__(self, manually_triggered:bool=False, current_position:str=None):
+    def __init__(self, manually_triggered:bool=False, current_position:str=None, db:CWA_DB=None, cwa_settings:dict=None,
+                 output=None):
         self.manually_triggered = manually_triggered
         self.current_position = current_position # string in the form of "n/n"
+        # Callers fixing EPUBs on a thread of their own can take the messages, called as output(string, log)
+        self.output = output
 
-        self.db = CWA_DB()
-        self.cwa_settings = self.db.cwa_settings
+        # Workers of a library-wide run are handed the settings and leave cwa.db to the main process
+        if cwa_settings is not None:
+            self.db = db
+            self.cwa_settings = cwa_settings
+        else:
+            self.db = db if db is not None else CWA_DB()
+            self.cwa_settings = self.db.cwa_settings
+        self.checksum = None
 
         self.fixed_problems = []
         self.files = {}
-        self.binary_files = {}
+        self.original_files = {}
         self.entries = []
 
-    def _extract_book_info_from_path(self, file_path: str) -> tuple[int | None, str]:
+    def print_and_log(self, string, log=True) -> None:
+        if self.output is not None:
+            self.output(string, log)
+        else:
+            print_and_log(string, log=log)
+
+    @staticmethod
+    def _extract_book_info_from_path(file_path: str) -> tuple[int | None, str]:
         """Extract book ID and format from file path.
 
         Expected path format: /calibre-library/Author/Title (123)/book.epub
@@ -146,7 +180,8 @@ class EPUBFixer:
         except Exception:
             return None, 'EPUB'
 
-    def _get_metadata_db_path(self) -> str:
+    @staticmethod
+    def _get_metadata_db_path() -> str:
         """Get the path to metadata.db considering split library configuration."""
         try:
             con = sqlite3.connect("/config/app.db", timeout=30)
@@ -165,8 +200,8 @@ class EPUBFixer:
             # Fallback to default location
             return "/calibre-library/metadata.db"
 
-    def _recalculate_checksum_after_modification(self, book_id: int, file_format: str, file_path: str) -> None:
-        """Calculate and store new checksum after modifying an EPUB file."""
+    def _recalculate_checksum_after_modification(self, book_id: int, file_format: str, file_path: str) -> str | None:
+        """Calculate and store new checksum after modifying an EPUB file. Returns the new checksum."""
         try:
             # Import the checksum calculation function
             import sys
@@ -179,7 +214,7 @@ class EPUBFixer:
             # Calculate new checksum
             checksum = calculate_koreader_partial_md5(file_path)
             if not checksum:
-                print_and_log(f"[cwa-kindle-epub-fixer] Warning: Failed to calculate checksum for {file_path}", log=self.manually_triggered)
+                self.print_and_log(f"[cwa-kindle-epub-fixer] Warning: Failed to calculate checksum for {file_path}", log=self.manually_triggered)
                 return
 
             # Store in database using centralized manager function
@@ -196,15 +231,16 @@ class EPUBFixer:
                 )
 
                 if success:
-                    print_and_log(f"[cwa-kindle-epub-fixer] Stored checksum {checksum[:8]}... for book {book_id} (v{CHECKSUM_VERSION})", log=self.manually_triggered)
+                    self.print_and_log(f"[cwa-kindle-epub-fixer] Stored checksum {checksum[:8]}... for book {book_id} (v{CHECKSUM_VERSION})", log=self.manually_triggered)
                 else:
-                    print_and_log(f"[cwa-kindle-epub-fixer] Warning: Failed to store checksum for book {book_id}", log=self.manually_triggered)
+                    self.print_and_log(f"[cwa-kindle-epub-fixer] Warning: Failed to store checksum for book {book_id}", log=self.manually_triggered)
             finally:
                 con.close()
+            return checksum
         except Exception as e:
-            print_and_log(f"[cwa-kindle-epub-fixer] Warning: Failed to recalculate checksum: {e}", log=self.manually_triggered)
+            self.print_and_log(f"[cwa-kindle-epub-fixer] Warning: Failed to recalculate checksum: {e}", log=self.manually_triggered)
             import traceback
-            print_and_log(traceback.format_exc(), log=self.manually_triggered)
+            self.print_and_log(traceback.format_exc(), log=self.manually_triggered)
 
 
     def backup_original_file(self, epub_path):
@@ -214,18 +250,18 @@ class EPUBFixer:
                 output_path = f"/config/processed_books/fixed_originals/"
                 shutil.copy2(epub_path, output_path)
             except Exception as e:
-                print_and_log(f"[cwa-kindle-epub-fixer] ERROR - Error occurred when backing up {epub_path} to {output_path}:\n{e}", log=self.manually_triggered)
+                self.print_and_log(f"[cwa-kindle-epub-fixer] ERROR - Error occurred when backing up {epub_path} to {output_path}:\n{e}", log=self.manually_triggered)
 
     def read_epub(self, epub_path):
-        """Read EPUB file contents"""
+        """Read the EPUB's text entries, the only ones the fixes look at. Images, fonts and other
+        binary entries are never loaded, write_epub copies them across as they are"""
         with zipfile.ZipFile(epub_path, 'r') as zip_ref:
             self.entries = zip_ref.namelist()
             for filename in self.entries:
                 ext = filename.split('.')[-1]
                 if filename == 'mimetype' or ext in ['html', 'xhtml', 'htm', 'xml', 'svg', 'css', 'opf', 'ncx']:
                     self.files[filename] = zip_ref.read(filename).decode('utf-8')
-                else:
-                    self.binary_files[filename] = zip_ref.read(filename)
+        self.original_files = dict(self.files)
 
     def fix_encoding(self):
         """Add UTF-8 encoding declaration if missing"""
@@ -354,21 +390,38 @@ class EPUBFixer:
                     self.fixed_problems.append(f"Remove stray image tag(s) in {filename}")
                     self.files[filename] = dom.toxml()
 
-    def write_epub(self, output_path):
-        """Write EPUB file"""
-        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
-            # First write mimetype file
-            if 'mimetype' in self.files:
-                zip_ref.writestr('mimetype', self.files['mimetype'], compress_type=zipfile.ZIP_STORED)
-
-            # Add text files
-            for filename, content in self.files.items():
-                if filename != 'mimetype':
-                    zip_ref.writestr(filename, content)
-
-            # Add binary files
-            for filename, content in self.binary_files.items():
-                zip_ref.writestr(filename, content)
+    def modified_files(self) -> set[str]:
+        """Names of the entries the fixes changed"""
+        return {filename for filename, content in self.files.items() if content != self.original_files.get(filename)}
+
+    def write_epub(self, input_path, output_path):
+        """Write the fixed EPUB. Only modified entries are compressed again, every other entry is
+        copied across from input_path still compressed. The EPUB is written next to output_path first,
+        so input_path and output_path may be the same file"""
+        modified = self.modified_files()
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        fd, tmp_path = tempfile.mkstemp(suffix='.epub', dir=output_dir)
+        os.close(fd)
+        try:
+            with zipfile.ZipFile(input_path, 'r') as zip_in, \
+                    zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as zip_out:
+                infos = zip_in.infolist()
+                # The mimetype entry has to come first
+                infos.sort(key=lambda info: info.filename != 'mimetype')
+                for info in infos:
+                    if info.filename == 'mimetype' and info.filename in modified:
+                        zip_out.writestr('mimetype', self.files['mimetype'], compress_type=zipfile.ZIP_STORED)
+                    elif info.filename in modified:
+                        zip_out.writestr(info.filename, self.files[info.filename])
+                    else:
+                        copy_zip_entry_raw(zip_in, zip_out, info)
+            if os.path.exists(output_path):
+                shutil.copymode(output_path, tmp_path)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
 
     def export_issue_summary(self, epub_path):
         if self.current_position:
@@ -377,13 +430,14 @@ class EPUBFixer:
             line_suffix = "[cwa-kindle-epub-fixer] "
 
         if self.fixed_problems:
-            print_and_log(line_suffix + f"{len(self.fixed_problems)} issues fixed with {epub_path}:", log=self.manually_triggered)
+            self.print_and_log(line_suffix + f"{len(self.fixed_problems)} issues fixed with {epub_path}:", log=self.manually_triggered)
             for count, problem in enumerate(self.fixed_problems):
-                print_and_log(f"   {str(count + 1).zfill(2)} - {problem}", log=self.manually_triggered)
+                self.print_and_log(f"   {str(count + 1).zfill(2)} - {problem}", log=self.manually_triggered)
         else:
-            print_and_log(line_suffix + f"No issues found! - {epub_path}", log=self.manually_triggered)
+            self.print_and_log(line_suffix + f"No issues found! - {epub_path}", log=self.manually_triggered)
 
-    def add_entry_to_db(self, input_path, output_path):
+    def db_entry(self, input_path, output_path) -> tuple:
+        """The epub_fixes row for this run, as epub_fixer_add_entry arguments"""
         if self.fixed_problems:
             fixed_problems = []
             for count, problem in enumerate(self.fixed_problems):
@@ -392,62 +446,111 @@ class EPUBFixer:
         else:
             fixed_problems = "No fixes required"
 
-        self.db.epub_fixer_add_entry(Path(input_path).stem,
-                                    bool(self.manually_triggered),
-                                    len(self.fixed_problems),
-                                    str(self.cwa_settings['auto_backup_epub_fixes']),
-                                    output_path,
-                                    fixed_problems)
+        return (Path(input_path).stem,
+                bool(self.manually_triggered),
+                len(self.fixed_problems),
+                str(self.cwa_settings['auto_backup_epub_fixes']),
+                str(output_path),
+                fixed_problems)
+
+    def add_entry_to_db(self, input_path, output_path):
+        self.db.epub_fixer_add_entry(*self.db_entry(input_path, output_path))
 
 
-    def process(self, input_path, output_path=None, default_language='en'):
-        """Process a single EPUB file"""
+    def process(self, input_path, output_path=None, default_language='en', record=True):
+        """Process a single EPUB file. With record=False the run is not added to cwa.db, the caller
+        stores db_entry() itself"""
         if not output_path:
             output_path = input_path
 
         # Extract book_id and format from path for checksum management
         book_id, book_format = self._extract_book_info_from_path(input_path)
 
-        # Back Up Original File
-        print_and_log("[cwa-kindle-epub-fixer] Backing up original file...", log=self.manually_triggered)
-        self.backup_original_file(input_path)
-
         # Load EPUB
-        print_and_log("[cwa-kindle-epub-fixer] Loading provided EPUB...", log=self.manually_triggered)
+        self.print_and_log("[cwa-kindle-epub-fixer] Loading provided EPUB...", log=self.manually_triggered)
         self.read_epub(input_path)
 
         # Run fixing procedures
-        print_and_log("[cwa-kindle-epub-fixer] Checking linking to body ID to prevent unresolved hyperlinks...", log=self.manually_triggered)
+        self.print_and_log("[cwa-kindle-epub-fixer] Checking linking to body ID to prevent unresolved hyperlinks...", log=self.manually_triggered)
         self.fix_body_id_link()
-        print_and_log("[cwa-kindle-epub-fixer] Checking language field tag is valid...", log=self.manually_triggered)
+        self.print_and_log("[cwa-kindle-epub-fixer] Checking language field tag is valid...", log=self.manually_triggered)
         self.fix_book_language(default_language)
-        print_and_log("[cwa-kindle-epub-fixer] Checking for stray images...", log=self.manually_triggered)
+        self.print_and_log("[cwa-kindle-epub-fixer] Checking for stray images...", log=self.manually_triggered)
         self.fix_stray_img()
-        print_and_log("[cwa-kindle-epub-fixer] Checking UTF-8 encoding declaration...", log=self.manually_triggered)
+        self.print_and_log("[cwa-kindle-epub-fixer] Checking UTF-8 encoding declaration...", log=self.manually_triggered)
         self.fix_encoding()
 
         # Notify user and/or write to log
         self.export_issue_summary(input_path)
 
-        # Write EPUB
-        print_and_log("[cwa-kindle-epub-fixer] Writing EPUB...", log=self.manually_triggered)
         if Path(output_path).is_dir():
-            output_path = output_path + os.path.basename(input_path)
-        self.write_epub(output_path)
-        print_and_log("[cwa-kindle-epub-fixer] EPUB successfully written.", log=self.manually_triggered)
+            output_path = os.path.join(output_path, os.path.basename(input_path))
+        same_file = os.path.abspath(output_path) == os.path.abspath(input_path)
+        if self.fixed_problems and self.modified_files():
+            # Back Up Original File
+            self.print_and_log("[cwa-kindle-epub-fixer] Backing up original file...", log=self.manually_triggered)
+            self.backup_original_file(input_path)
+
+            # Write EPUB
+            self.print_and_log("[cwa-kindle-epub-fixer] Writing EPUB...", log=self.manually_triggered)
+            self.write_epub(input_path, output_path)
+            self.print_and_log("[cwa-kindle-epub-fixer] EPUB successfully written.", log=self.manually_triggered)
+        elif not same_file:
+            # Nothing to fix, the EPUB is handed on untouched
+            shutil.copyfile(input_path, output_path)
 
         # Calculate and store new checksum after modification
         if book_id and self.fixed_problems:
             # Only recalculate if fixes were actually applied
-            self._recalculate_checksum_after_modification(book_id, book_format, output_path)
+            self.checksum = self._recalculate_checksum_after_modification(book_id, book_format, output_path)
 
         # Add entry to cwa.db
-        print_and_log("[cwa-kindle-epub-fixer] Adding run to cwa.db...", log=self.manually_triggered)
-        self.add_entry_to_db(input_path, output_path)
-        print_and_log("[cwa-kindle-epub-fixer] Run successfully added to cwa.db.", log=self.manually_triggered)
+        if record:
+            self.print_and_log("[cwa-kindle-epub-fixer] Adding run to cwa.db...", log=self.manually_triggered)
+            self.add_entry_to_db(input_path, output_path)
+            self.print_and_log("[cwa-kindle-epub-fixer] Run successfully added to cwa.db.", log=self.manually_triggered)
         return self.fixed_problems
 
 
+# The raw copy relies on zipfile internals, checked up front so a Python release changing them only costs speed
+RAW_ZIP_COPY_SUPPORTED = all(hasattr(zipfile, name) for name in ('structFileHeader', 'sizeFileHeader',
+                                                                  '_FH_FILENAME_LENGTH', '_FH_EXTRA_FIELD_LENGTH'))
+
+
+def copy_zip_entry_raw(zip_in: zipfile.ZipFile, zip_out: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+    """Copies an entry from one zip to another as it is stored, without decompressing and compressing it again.
+    Falls back to a regular copy when the zipfile internals it needs aren't there"""
+    if not (RAW_ZIP_COPY_SUPPORTED and all(hasattr(zip_out, attr) for attr in ('NameToInfo', 'start_dir', '_didModify'))):
+        zip_out.writestr(info, zip_in.read(info))
+        return
+
+    zip_in.fp.seek(info.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, zip_in.fp.read(zipfile.sizeFileHeader))
+    zip_in.fp.seek(header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH], os.SEEK_CUR)
+
+    out_info = zipfile.ZipInfo(info.filename, info.date_time)
+    for attr in ('compress_type', 'comment', 'extra', 'create_system', 'create_version', 'extract_version',
+                 'flag_bits', 'volume', 'internal_attr', 'external_attr', 'CRC', 'compress_size', 'file_size'):
+        setattr(out_info, attr, getattr(info, attr))
+    # Sizes and CRC are known up front, so no data descriptor follows the data
+    out_info.flag_bits &= ~0x08
+    out_info.header_offset = zip_out.fp.tell()
+
+    zip_out.fp.write(out_info.FileHeader(zip64=None))
+    remaining = info.compress_size
+    while remaining > 0:
+        chunk = zip_in.fp.read(min(remaining, 1024 * 1024))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated entry {info.filename}")
+        zip_out.fp.write(chunk)
+        remaining -= len(chunk)
+
+    zip_out.filelist.append(out_info)
+    zip_out.NameToInfo[out_info.filename] = out_info
+    zip_out.start_dir = zip_out.fp.tell()
+    zip_out._didModify = True
+
+
 def get_library_location() -> str:
     con = sqlite3.connect("/config/app.db", timeout=30)
     cur = con.cursor()
@@ -472,6 +575,139 @@ def get_all_epubs_in_library() -> list[str]:
     return epubs_in_library
 
 
+# Results of a library-wide run are written to cwa.db in batches of this size
+RESULT_BATCH_SIZE = 50
+
+
+def get_fixer_workers(requested: int | None = None) -> int:
+    """Number of EPUBs to fix at once. Taken from --workers, then the CWA_EPUB_FIXER_WORKERS
+    env variable, otherwise all but one of the available cores"""
+    if requested is None:
+        try:
+            requested = int(os.getenv("CWA_EPUB_FIXER_WORKERS", "0"))
+        except ValueError:
+            print_and_log(f"[cwa-kindle-epub-fixer] WARNING - Invalid CWA_EPUB_FIXER_WORKERS value '{os.getenv('CWA_EPUB_FIXER_WORKERS')}', using the default.")
+            requested = 0
+    if requested > 0:
+        return requested
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def get_epub_checksums() -> dict[int, str]:
+    """Latest KOReader checksum of every book's EPUB, from book_format_checksums in metadata.db"""
+    metadata_db = EPUBFixer._get_metadata_db_path()
+    try:
+        con = sqlite3.connect(Path(metadata_db).resolve().as_uri() + "?mode=ro", uri=True, timeout=30)
+        try:
+            rows = con.execute("SELECT book, checksum FROM book_format_checksums WHERE format = 'EPUB' ORDER BY created").fetchall()
+        finally:
+            con.close()
+    except sqlite3.Error:
+        # No checksums have been generated for this library yet
+        return {}
+    # Ordered by creation, so the latest checksum of each book wins
+    return {book_id: checksum for book_id, checksum in rows}
+
+
+def get_fingerprint(epub: str, checksums: dict[int, str]) -> tuple[int, int, str]:
+    """(size, mtime_ns, checksum) of an EPUB, as stored in epub_fixer_fingerprints"""
+    stat = os.stat(epub)
+    book_id, _ = EPUBFixer._extract_book_info_from_path(epub)
+    return stat.st_size, stat.st_mtime_ns, checksums.get(book_id, '')
+
+
+def is_unchanged(epub: str, fingerprints: dict[str, tuple[int, int, str]], checksums: dict[int, str]) -> bool:
+    """Whether the EPUB was already processed and hasn't changed since"""
+    known = fingerprints.get(epub)
+    if known is None:
+        return False
+    try:
+        size, mtime_ns, checksum = get_fingerprint(epub, checksums)
+    except OSError:
+        return False
+    # The checksum is only compared when both runs knew one, books without any are judged on size & mtime
+    return (size, mtime_ns) == known[:2] and (not checksum or not known[2] or checksum == known[2])
+
+
+def init_library_worker() -> None:
+    # Workers hand their output back to the main process, which writes it to the log in order
+    logger.disabled = True
+
+
+def fix_library_epub(epub: str, current_position: str, language: str, cwa_settings: dict) -> dict:
+    """Fixes one EPUB of a library-wide run on a pool worker. The worker's output is captured and
+    handed back so the main process can print it in order and store the results in cwa.db"""
+    output = io.StringIO()
+    result = {"epub": epub, "position": current_position, "error": None, "entry": None, "checksum": None}
+    with redirect_stdout(output):
+        try:
+            print(f"\n[cwa-kindle-epub-fixer] {current_position} - Processing {epub}...")
+            fixer = EPUBFixer(manually_triggered=True, current_position=current_position, cwa_settings=cwa_settings)
+            fixer.process(epub, epub, language, record=False)
+            result["entry"] = fixer.db_entry(epub, epub)
+            result["checksum"] = fixer.checksum
+        except Exception as e:
+            result["error"] = str(e)
+    result["output"] = output.getvalue()
+    return result
+
+
+def fix_library(language: str, workers: int, force: bool = False, run_status: RunStatus | None = None) -> dict[str, str]:
+    """Fixes every EPUB in the library that changed since the last library-wide run, spread over
+    a process pool. Returns the files that failed with their errors"""
+    db = CWA_DB()
+    if force:
+        db.epub_fixer_fingerprints_clear()
+    epubs = get_all_epubs_in_library()
+    fingerprints = db.epub_fixer_fingerprints_get()
+    checksums = get_epub_checksums()
+    epubs_to_process = [epub for epub in epubs if not is_unchanged(epub, fingerprints, checksums)]
+
+    if len(epubs) > len(epubs_to_process):
+        print_and_log(f"[cwa-kindle-epub-fixer] Skipping {len(epubs) - len(epubs_to_process)} EPUBs unchanged since they were last processed.")
+    if not epubs_to_process:
+        print_and_log("[cwa-kindle-epub-fixer] No EPUBs found to process. Exiting now...")
+        return {}
+    print_and_log(f"[cwa-kindle-epub-fixer] {len(epubs_to_process)} EPUBs found to process on {workers} worker(s).")
+
+    total = len(epubs_to_process)
+    positions = [f"{count + 1}/{total}" for count in range(total)]
+    errored_files = {}
+    entries, new_fingerprints = [], []
+    # Forked, the workers share the already open log file instead of truncating it on import
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                             initializer=init_library_worker) as pool:
+        results = pool.map(fix_library_epub, epubs_to_process, positions, repeat(language), repeat(db.cwa_settings),
+                           chunksize=4)
+        for done, result in enumerate(results, start=1):
+            for line in result["output"].strip("\n").splitlines():
+                print_and_log(line)
+            if run_status is not None:
+                run_status.update(done, total)
+            if result["error"] is not None:
+                print_and_log(f"[cwa-kindle-epub-fixer] {result['position']} - The following error occurred when processing {result['epub']}:\n{result['error']}")
+                errored_files[result["epub"]] = result["error"]
+                continue
+
+            entries.append(result["entry"])
+            try:
+                size, mtime_ns, checksum = get_fingerprint(result["epub"], checksums)
+                new_fingerprints.append((result["epub"], size, mtime_ns, result["checksum"] or checksum))
+            except OSError:
+                pass
+            if len(entries) >= RESULT_BATCH_SIZE:
+                db.epub_fixer_record_results(entries, new_fingerprints)
+                entries, new_fingerprints = [], []
+    if entries:
+        db.epub_fixer_record_results(entries, new_fingerprints)
+
+    if errored_files:
+        print_and_log(f"\n[cwa-kindle-epub-fixer] {total - len(errored_files)}/{total} EPUBs in library successfully processed")
+    else:
+        print_and_log(f"\n[cwa-kindle-epub-fixer] All {total} EPUBs in Library successfully processed! Exiting now...")
+    return errored_files
+
+
 def main():
     parser = argparse.ArgumentParser(
         prog='kindle-epub-fixer',
@@ -484,8 +720,11 @@ def main():
     parser.add_argument('--language', '-l', required=False, default='en', help='Default language to use if not specified or invalid')
     parser.add_argument('--suffix', '-s',required=False,  default=False, action='store_true', help='Adds suffix "fixed" to output filename if given')
     parser.add_argument('--all', '-a', required=False, default=False, action='store_true', help='Will attempt to fix any issues in every EPUB in th user\'s library')
+    parser.add_argument('--workers', '-w', required=False, type=int, default=None, help='Number of EPUBs to fix at once with --all (default: CWA_EPUB_FIXER_WORKERS or all but one CPU core)')
+    parser.add_argument('--force', '-f', required=False, default=False, action='store_true', help='With --all, also process EPUBs that are unchanged since they were last processed')
 
     args = parser.parse_args()
+    acquireLock()
     # logger.info(f"CWA Kindle EPUB Fixer Service - Run Started: {datetime.now()}\n")
 
     ### CATCH INCOMPATIBLE COMBINATIONS OF ARGUMENTS
@@ -531,30 +770,17 @@ def main():
     ### ALL PASSED AS ARGUMENT
     elif args.all and not args.input_file:
         logger.info(f"CWA Kindle EPUB Fixer Service - Run Started: {datetime.now()}\n")
+        run_status = RunStatus(EPUB_FIXER_STATUS)
+        run_status.start()
         print_and_log("[cwa-kindle-epub-fixer] Processing all epubs in library...")
-        epubs_to_process = get_all_epubs_in_library()
-        if len(epubs_to_process) > 0:
-            print_and_log(f"[cwa-kindle-epub-fixer] {len(epubs_to_process)} EPUBs found to process.")
-            errored_files = {}
-            for count, epub in enumerate(epubs_to_process):
-                current_position = f"{count + 1}/{len(epubs_to_process)}"
-                try:
-                    print_and_log(f"\n[cwa-kindle-epub-fixer] {current_position} - Processing {epub}...")
-                    EPUBFixer(manually_triggered=True, current_position=current_position).process(epub, epub, args.language)
-                except Exception as e:
-                    print_and_log(f"[cwa-kindle-epub-fixer] {current_position} - The following error occurred when processing {epub}:\n{e}")
-                    errored_files |= {epub:e}
-            if errored_files:
-                print_and_log(f"\n[cwa-kindle-epub-fixer] {len(epubs_to_process) - len(errored_files)}/{len(epubs_to_process)} EPUBs in library successfully processed")
-                print_and_log(f"\n[cwa-kindle-epub-fixer] The following {len(errored_files)} encountered errors:\n")
-                for file in errored_files:
-                    print_and_log(f"   - {file}")
-                    print_and_log(f"      - Error Encountered: {errored_files[file]}")
-            else:
-                print_and_log(f"\n[cwa-kindle-epub-fixer] All {len(epubs_to_process)} EPUBs in Library successfully processed! Exiting now...")
-        else:
-            print_and_log("[cwa-kindle-epub-fixer] No EPUBs found to process. Exiting now...")
+        errored_files = fix_library(args.language, get_fixer_workers(args.workers), force=args.force, run_status=run_status)
+        if errored_files:
+            print_and_log(f"\n[cwa-kindle-epub-fixer] The following {len(errored_files)} encountered errors:\n")
+            for file in errored_files:
+                print_and_log(f"   - {file}")
+                print_and_log(f"      - Error Encountered: {errored_files[file]}")
         logger.info(f"\nCWA Kindle EPUB Fixer Service - Run Ended: {datetime.now()}\n")
+        run_status.finish()
         sys.exit(0)
 
 
@@ -0,0 +1,126 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""
+Run status records for the library-wide background scripts
+
+Convert Library and the Kindle EPUB Fixer publish their progress to a small JSON file next to their
+run log, so the Web UI can report it without reading through the whole log on every poll. The log
+itself is then only ever read from where the last poll left off (see read_log_since).
+"""
+
+import atexit
+import json
+import os
+import tempfile
+import time
+
+CONVERT_LIBRARY_STATUS = "/config/convert-library-status.json"
+EPUB_FIXER_STATUS = "/config/epub-fixer-status.json"
+
+# Most of a log a single status poll sends, a first poll of a huge log only gets its tail
+LOG_TAIL_MAX_BYTES = 256 * 1024
+
+# States a run can be in. "starting" is set by the Web UI before the script is launched
+RUN_STATES = ("idle", "starting", "running", "finished", "cancelled", "failed")
+FINAL_STATES = ("finished", "cancelled", "failed")
+
+
+def write_run_status(path: str, state: str, current: int = 0, total: int = 0) -> None:
+    """Replaces the status record in one go, a reader never sees a half written file"""
+    record = {"state": state, "current": current, "total": total, "updated": time.time()}
+    directory = os.path.dirname(path) or "."
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".run-status-", suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[run-status] Could not write the run status to {path}: {e}", flush=True)
+
+
+def read_run_status(path: str) -> dict:
+    """Returns the status record, or an idle one when no run has published its status yet"""
+    try:
+        with open(path, "r") as f:
+            record = json.load(f)
+        if record.get("state") in RUN_STATES:
+            return {"state": record["state"],
+                    "current": int(record.get("current", 0)),
+                    "total": int(record.get("total", 0))}
+    except (OSError, ValueError, TypeError, AttributeError):
+        pass
+    return {"state": "idle", "current": 0, "total": 0}
+
+
+def mark_run_status(path: str, state: str) -> None:
+    """Moves the run into another state, keeping its progress"""
+    record = read_run_status(path)
+    write_run_status(path, state, record["current"], record["total"])
+
+
+def read_log_since(path: str, offset: int = 0, max_bytes: int = LOG_TAIL_MAX_BYTES) -> tuple[str, int, bool]:
+    """Returns the complete lines written to the log since offset, the offset to continue from and
+    whether the caller has to drop what it already has (the log was restarted, or only its tail fits)"""
+    reset = False
+    try:
+        with open(path, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            if offset < 0 or offset > size:
+                offset, reset = 0, True
+            if size - offset > max_bytes:
+                # Too far behind, skip ahead to the first full line of the tail
+                f.seek(size - max_bytes)
+                f.readline()
+                offset, reset = f.tell(), True
+            f.seek(offset)
+            chunk = f.read(size - offset)
+    except OSError:
+        return "", 0, offset != 0
+
+    # Leave a line that is still being written for the next poll
+    end = chunk.rfind(b"\n") + 1
+    return chunk[:end].decode("utf-8", errors="replace"), offset + end, reset
+
+
+class RunStatus:
+    """Progress of a run, as published by the script doing it. Updates are written at most every
+    min_interval seconds, state changes straight away"""
+
+    def __init__(self, path: str, min_interval: float = 0.5):
+        self.path = path
+        self.min_interval = min_interval
+        self.state = "idle"
+        self.current = 0
+        self.total = 0
+        self._written = 0.0
+
+    def start(self, total: int = 0) -> None:
+        self.state, self.current, self.total = "running", 0, total
+        self._write()
+        # A run that dies without saying so should not look like it is still going
+        atexit.register(self._exit)
+
+    def update(self, current: int, total: int | None = None) -> None:
+        self.current = current
+        if total is not None:
+            self.total = total
+        if time.monotonic() - self._written >= self.min_interval:
+            self._write()
+
+    def finish(self, state: str = "finished") -> None:
+        self.state = state
+        if state == "finished":
+            self.current = self.total
+        self._write()
+
+    def _exit(self) -> None:
+        if self.state == "running":
+            self.finish("failed")
+
+    def _write(self) -> None:
+        write_run_status(self.path, self.state, self.current, self.total)
+        self._written = time.monotonic()
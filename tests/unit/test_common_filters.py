@@ -0,0 +1,114 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""
+Unit Tests for CalibreDB.common_filters
+
+These tests verify the visibility filter is built once per user and set of
+restrictions, and that archived books are excluded without listing their ids.
+"""
+
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from cps import db, ub
+
+
+class FakeUser:
+    def __init__(self, user_id=1, denied_tags=""):
+        self.id = user_id
+        self.denied_tags = denied_tags
+        self.allowed_tags = ""
+        self.allowed_column_value = ""
+        self.denied_column_value = ""
+
+    def filter_language(self):
+        return "all"
+
+    def list_denied_tags(self):
+        return [t.strip() for t in self.denied_tags.split(",")]
+
+    def list_allowed_tags(self):
+        return [t.strip() for t in self.allowed_tags.split(",")]
+
+
+@pytest.fixture
+def calibre_db(monkeypatch):
+    engine = create_engine("sqlite://")
+    tables = [db.Books.__table__, db.Tags.__table__, db.books_tags_link, db.Languages.__table__,
+              db.books_languages_link]
+    db.Base.metadata.create_all(engine, tables=tables)
+    ub.ArchivedBook.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+
+    calibre_db = db.CalibreDB()
+    calibre_db.session = session
+    calibre_db.config = SimpleNamespace(config_restricted_column=0)
+    calibre_db.statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: calibre_db.statements.append(statement))
+
+    now = datetime.now(timezone.utc)
+    for book_id in (1, 2, 3):
+        book = db.Books(title=f"Book {book_id}", sort=f"Book {book_id}", author_sort="", timestamp=now, pubdate=now,
+                        series_index="1.0", last_modified=now, path=f"path/{book_id}", has_cover=0, authors=[],
+                        tags=[])
+        book.id = book_id
+        session.add(book)
+    session.add(ub.ArchivedBook(user_id=1, book_id=2, is_archived=True))
+    session.add(ub.ArchivedBook(user_id=2, book_id=3, is_archived=True))
+    session.commit()
+
+    user = FakeUser()
+    monkeypatch.setattr(db, "current_user", user)
+    db.CalibreDB.clear_filters_cache()
+    calibre_db.user = user
+    yield calibre_db
+    db.CalibreDB.clear_filters_cache()
+    session.close()
+
+
+def visible_ids(calibre_db, **kwargs):
+    query = calibre_db.session.query(db.Books.id).filter(calibre_db.common_filters(**kwargs)).order_by(db.Books.id)
+    return [book_id for book_id, in query]
+
+
+@pytest.mark.unit
+class TestCommonFilters:
+    def test_filter_is_built_once(self, calibre_db):
+        first = calibre_db.common_filters()
+        calibre_db.statements.clear()
+
+        assert calibre_db.common_filters() is first
+        assert calibre_db.statements == []
+        assert calibre_db.common_filters(allow_show_archived=True) is not first
+
+    def test_archived_books_are_excluded_by_subquery(self, calibre_db):
+        assert visible_ids(calibre_db) == [1, 3]
+        assert visible_ids(calibre_db, allow_show_archived=True) == [1, 2, 3]
+        assert "archived_book" in str(calibre_db.common_filters())
+
+    def test_archiving_a_book_needs_no_rebuild(self, calibre_db):
+        first = calibre_db.common_filters()
+        calibre_db.session.add(ub.ArchivedBook(user_id=1, book_id=1, is_archived=True))
+        calibre_db.session.commit()
+
+        assert calibre_db.common_filters() is first
+        assert visible_ids(calibre_db) == [3]
+
+    def test_changed_restrictions_build_a_new_filter(self, calibre_db):
+        first = calibre_db.common_filters()
+        calibre_db.user.denied_tags = "Horror"
+
+        assert calibre_db.common_filters() is not first
+
+    def test_filters_are_per_user(self, calibre_db, monkeypatch):
+        monkeypatch.setattr(db, "current_user", FakeUser(user_id=2))
+        assert visible_ids(calibre_db) == [1, 2]
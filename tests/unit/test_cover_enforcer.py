@@ -0,0 +1,168 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""
+Unit Tests for the library-wide Cover & Metadata Enforcer
+
+These tests verify `-all` enforces each book once however many formats it
+has, and skips books that are unchanged since their last enforcement unless
+ebook-polish failed for them.
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# Add scripts directory to path (works in both dev container and CI)
+scripts_dir = Path(__file__).parent.parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+import cover_enforcer
+
+# Importing the enforcer takes its run lock, the tests never run it as a script
+cover_enforcer.removeLock()
+
+
+class FakeDB:
+    def __init__(self):
+        self.fingerprints = {}
+        self.entries = []
+
+    def enforcement_fingerprints_get(self):
+        return dict(self.fingerprints)
+
+    def enforcement_fingerprints_set(self, fingerprints):
+        self.fingerprints.update(fingerprints)
+
+    def enforcement_fingerprints_clear(self):
+        self.fingerprints = {}
+
+    def enforce_add_entry_from_all(self, book_dicts):
+        self.entries.extend(book_dicts)
+
+
+class FakeBook:
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def export_as_dict(self):
+        return {"file_path": self.file_path}
+
+
+@pytest.fixture
+def enforcer(tmp_path, monkeypatch):
+    books = []
+    for book_id, formats in ((1, ["epub", "azw3"]), (2, ["epub"])):
+        book_dir = tmp_path / "Author" / f"Title ({book_id})"
+        book_dir.mkdir(parents=True)
+        (book_dir / "cover.jpg").write_bytes(b"cover")
+        (book_dir / "metadata.opf").write_text("<package/>")
+        files = []
+        for fmt in formats:
+            (book_dir / f"Title.{fmt}").write_bytes(b"book")
+            files.append(str(book_dir / f"Title.{fmt}"))
+        books.append((book_id, str(book_dir), "2025-01-01 00:00:00+00:00", files))
+
+    enforcer = cover_enforcer.Enforcer.__new__(cover_enforcer.Enforcer)
+    enforcer.db = FakeDB()
+    enforcer.calibre_library = str(tmp_path)
+    enforcer.enforced = []
+    lock = threading.Lock()
+
+    def fake_enforce_cover(book_dir, supported_files=None):
+        with lock:
+            enforcer.enforced.append(book_dir)
+        return [FakeBook(f) for f in supported_files]
+
+    monkeypatch.setattr(enforcer, "get_library_books", lambda: books, raising=False)
+    monkeypatch.setattr(enforcer, "enforce_cover", fake_enforce_cover)
+    enforcer.books = books
+    return enforcer
+
+
+@pytest.mark.unit
+class TestEnforceAllCovers:
+    def test_each_book_is_enforced_once(self, enforcer):
+        n_enforced, _, n_supported_files = enforcer.enforce_all_covers(workers=2)
+
+        assert sorted(enforcer.enforced) == sorted(book[1] for book in enforcer.books)
+        assert n_enforced == n_supported_files == 3
+        assert len(enforcer.db.entries) == 3
+
+    def test_unchanged_books_are_skipped(self, enforcer):
+        enforcer.enforce_all_covers(workers=2)
+        enforcer.enforced.clear()
+
+        assert enforcer.enforce_all_covers(workers=2)[2] == 0
+        assert enforcer.enforced == []
+
+        cover = os.path.join(enforcer.books[1][1], "cover.jpg")
+        with open(cover, "wb") as f:
+            f.write(b"a new cover")
+        enforcer.enforce_all_covers(workers=2)
+        assert enforcer.enforced == [enforcer.books[1][1]]
+
+    def test_failed_books_are_not_recorded_as_enforced(self, enforcer, monkeypatch):
+        failing_dir = enforcer.books[1][1]
+        enforce_cover = enforcer.enforce_cover
+
+        def polish_fails_for_one_book(book_dir, supported_files=None):
+            if book_dir == failing_dir:
+                raise cover_enforcer.subprocess.CalledProcessError(1, ["ebook-polish"])
+            return enforce_cover(book_dir, supported_files)
+
+        monkeypatch.setattr(enforcer, "enforce_cover", polish_fails_for_one_book)
+
+        n_enforced, _, n_supported_files = enforcer.enforce_all_covers(workers=2)
+
+        assert (n_enforced, n_supported_files) == (2, 3)
+        assert list(enforcer.db.fingerprints) == [enforcer.books[0][0]]
+
+    def test_force_enforces_unchanged_books(self, enforcer):
+        enforcer.enforce_all_covers(workers=2)
+        enforcer.enforced.clear()
+
+        enforcer.enforce_all_covers(force=True, workers=2)
+        assert len(enforcer.enforced) == 2
+
+    def test_failed_polish_fails_the_book(self, monkeypatch):
+        enforcer = cover_enforcer.Enforcer.__new__(cover_enforcer.Enforcer)
+        enforcer.calibre_env = {}
+        book = FakeBook("/library/Title.epub")
+        book.cover_path, book.new_metadata_path = "/missing/cover.jpg", "/tmp/metadata.opf"
+        monkeypatch.setattr(cover_enforcer.subprocess, "run",
+                            lambda command, env=None: cover_enforcer.subprocess.CompletedProcess(command, 1))
+
+        with pytest.raises(cover_enforcer.subprocess.CalledProcessError):
+            enforcer.polish(book)
+
+    def test_books_come_from_metadata_db_one_entry_per_book(self, tmp_path):
+        for book_id in (1, 2):
+            book_dir = tmp_path / "Author" / f"Title ({book_id})"
+            book_dir.mkdir(parents=True)
+            (book_dir / "Title.epub").write_bytes(b"book")
+            (book_dir / "Title.azw3").write_bytes(b"book")
+        con = sqlite3.connect(tmp_path / "metadata.db")
+        con.execute("CREATE TABLE books (id INTEGER PRIMARY KEY, path TEXT, last_modified TEXT)")
+        con.execute("CREATE TABLE data (id INTEGER PRIMARY KEY, book INTEGER, format TEXT, name TEXT)")
+        con.executemany("INSERT INTO books VALUES (?, ?, 'now')", [(1, "Author/Title (1)"), (2, "Author/Title (2)")])
+        con.executemany("INSERT INTO data (book, format, name) VALUES (?, ?, 'Title')",
+                        [(1, "EPUB"), (1, "AZW3"), (1, "PDF"), (2, "EPUB")])
+        con.commit()
+        con.close()
+
+        enforcer = cover_enforcer.Enforcer.__new__(cover_enforcer.Enforcer)
+        enforcer.calibre_library = str(tmp_path)
+        enforcer.split_library = None
+        enforcer.supported_formats = ["epub", "azw3"]
+
+        books = enforcer.get_library_books()
+        assert [(book_id, len(files)) for book_id, _, _, files in books] == [(1, 2), (2, 1)]
+        assert books[0][1] == str(tmp_path / "Author" / "Title (1)")
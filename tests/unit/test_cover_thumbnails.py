@@ -0,0 +1,192 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""
+Unit Tests for cover thumbnail rendering
+
+These tests verify a cover is decoded once for all of its thumbnails, that
+every size is scaled down from the one before it and that renders farmed out
+to the process pool report their errors back.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from cps import constants, ub
+from cps.services.worker import STAT_CANCELLED
+from cps.tasks import thumbnail
+
+
+class FakeImage:
+    opened = []
+
+    def __init__(self, filename=None, blob=None):
+        self.source = filename or blob
+        self.width, self.height = 1000, 1500
+        self.format = None
+        self.resizes = []
+        self.saved = []
+        FakeImage.opened.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def resize(self, width, height, filter=None):
+        self.resizes.append((self.width, self.height, width, height))
+        self.width, self.height = width, height
+
+    def save(self, filename):
+        self.saved.append((filename, self.format, self.height))
+
+
+@pytest.fixture
+def fake_image(monkeypatch):
+    FakeImage.opened = []
+    monkeypatch.setattr(thumbnail, "Image", FakeImage, raising=False)
+    return FakeImage
+
+
+@pytest.mark.unit
+class TestRenderCoverThumbnails:
+    def test_cover_is_decoded_once_for_every_output(self, fake_image):
+        outputs = [(resolution, fmt, f"/cache/{resolution}.{fmt}")
+                   for resolution in (constants.COVER_THUMBNAIL_SMALL, constants.COVER_THUMBNAIL_MEDIUM,
+                                      constants.COVER_THUMBNAIL_LARGE)
+                   for fmt in thumbnail.THUMBNAIL_FORMATS]
+        thumbnail.render_cover_thumbnails("/library/book/cover.jpg", outputs)
+
+        assert len(fake_image.opened) == 1
+        assert sorted(saved[0] for saved in fake_image.opened[0].saved) == sorted(output[2] for output in outputs)
+
+    def test_sizes_are_scaled_down_from_the_previous_one(self, fake_image):
+        outputs = [(constants.COVER_THUMBNAIL_SMALL, "jpg", "/cache/small.jpg"),
+                   (constants.COVER_THUMBNAIL_LARGE, "jpg", "/cache/large.jpg")]
+        thumbnail.render_cover_thumbnails(b"cover", outputs)
+
+        img = fake_image.opened[0]
+        assert img.source == b"cover"
+        assert [resize[1] for resize in img.resizes] == [1500, thumbnail.get_resize_height(constants.COVER_THUMBNAIL_LARGE)]
+        assert img.saved == [("/cache/large.jpg", "jpg", thumbnail.get_resize_height(constants.COVER_THUMBNAIL_LARGE)),
+                             ("/cache/small.jpg", "jpg", thumbnail.get_resize_height(constants.COVER_THUMBNAIL_SMALL))]
+
+
+def failing_render(key):
+    raise ValueError(f"bad cover {key}")
+
+
+class BrokenPool:
+    def submit(self, function, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool("worker died"))
+        return future
+
+
+@pytest.mark.unit
+class TestRunRenders:
+    def test_errors_are_reported_per_render(self):
+        rendered = []
+        renders = [(1, rendered.append, (1,)), (2, failing_render, (2,)), (3, rendered.append, (3,))]
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            results = dict(thumbnail.run_renders(pool, renders))
+
+        assert sorted(rendered) == [1, 3]
+        assert results[1] is None and results[3] is None
+        assert isinstance(results[2], ValueError)
+
+    def test_renders_run_inline_when_the_pool_broke(self):
+        rendered = []
+        results = list(thumbnail.run_renders(BrokenPool(), [(1, rendered.append, (1,))]))
+
+        assert rendered == [1]
+        assert results == [(1, None)]
+
+    def test_worker_count_can_be_configured(self, monkeypatch):
+        monkeypatch.setenv("CWA_THUMBNAIL_WORKERS", "3")
+        assert thumbnail.get_thumbnail_workers() == 3
+
+        monkeypatch.setenv("CWA_THUMBNAIL_WORKERS", "invalid")
+        assert 1 <= thumbnail.get_thumbnail_workers() <= 8
+
+
+@pytest.mark.unit
+class TestMissingCoverThumbnails:
+    def test_one_task_is_scheduled_for_many_requests(self):
+        queue = thumbnail.MissingCoverThumbnails()
+
+        assert queue.add(1) is True
+        assert queue.add(2) is False
+        assert queue.add(1) is False
+        assert queue.take() == {1, 2}
+
+    def test_new_task_is_scheduled_once_the_queue_ran_dry(self):
+        queue = thumbnail.MissingCoverThumbnails()
+        queue.add(1)
+        queue.take()
+
+        assert queue.add(2) is False
+        assert queue.take() == {2}
+        assert queue.take() == set()
+        assert queue.add(3) is True
+
+    def test_failed_task_does_not_block_the_queue(self):
+        queue = thumbnail.MissingCoverThumbnails()
+        queue.add(1)
+        queue.release()
+
+        assert queue.add(1) is True
+
+
+class FakeSession:
+    def remove(self):
+        pass
+
+
+@pytest.fixture
+def missing_covers_task(monkeypatch):
+    monkeypatch.setattr(ub, "get_new_session_instance", FakeSession)
+    monkeypatch.setattr(thumbnail, "use_IM", True)
+    queue = thumbnail.MissingCoverThumbnails()
+    monkeypatch.setattr(thumbnail, "missing_cover_thumbnails", queue)
+    task = thumbnail.TaskGenerateMissingCoverThumbnails()
+    monkeypatch.setattr(task, "get_books_with_covers", lambda book_ids: [])
+    return task, queue
+
+
+@pytest.mark.unit
+class TestGenerateMissingCoverThumbnails:
+    def test_request_arriving_as_the_task_finishes_keeps_its_new_task(self, missing_covers_task, monkeypatch):
+        task, queue = missing_covers_task
+        take = queue.take
+        scheduled = []
+
+        def take_then_request():
+            book_ids = take()
+            if not book_ids:
+                scheduled.append(queue.add(2))
+            return book_ids
+
+        monkeypatch.setattr(queue, "take", take_then_request)
+        queue.add(1)
+
+        task.run(None)
+
+        assert scheduled == [True]
+        assert queue.add(3) is False
+
+    def test_cancelled_task_hands_the_queue_back(self, missing_covers_task):
+        task, queue = missing_covers_task
+        queue.add(1)
+        task.stat = STAT_CANCELLED
+
+        task.run(None)
+
+        assert queue.add(2) is True
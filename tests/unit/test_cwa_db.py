@@ -230,6 +230,60 @@ class TestCWADBConversionLogging:
         assert result[3] == "PDF"  # original_format
 
 
+@pytest.mark.unit
+class TestCWADBConversionJobs:
+    """Test the per-book state kept for resumable library conversions."""
+
+    @pytest.fixture
+    def target_format(self, temp_cwa_db):
+        # Unique per test so rows left by other tests never interfere
+        import uuid
+        target_format = f"test-{uuid.uuid4().hex[:8]}"
+        yield target_format
+        temp_cwa_db.cur.execute("DELETE FROM cwa_conversion_jobs WHERE target_format=?", (target_format,))
+        temp_cwa_db.con.commit()
+
+    def test_pending_jobs_are_recorded(self, temp_cwa_db, target_format):
+        """Verify jobs are added as pending in one go."""
+        temp_cwa_db.conversion_jobs_add_pending([(1, "/library/A/One (1)/One.mobi"), (2, "/library/B/Two (2)/Two.pdf")], target_format)
+
+        jobs = temp_cwa_db.conversion_jobs_get(target_format)
+        assert set(jobs) == {1, 2}
+        assert jobs[2]["state"] == "pending"
+        assert jobs[2]["source_path"] == "/library/B/Two (2)/Two.pdf"
+
+    def test_state_transitions_persist(self, temp_cwa_db, target_format):
+        """Verify converted, imported and failed states are stored with their details."""
+        temp_cwa_db.conversion_jobs_add_pending([(1, "/a.mobi"), (2, "/b.pdf")], target_format)
+        temp_cwa_db.conversion_job_set_state(1, target_format, "converted", converted_path="/tmp/convert-1/a.epub")
+        temp_cwa_db.conversion_job_set_state(2, target_format, "failed", reason="ebook-convert exited with code 1")
+
+        jobs = temp_cwa_db.conversion_jobs_get(target_format)
+        assert jobs[1]["state"] == "converted"
+        assert jobs[1]["converted_path"] == "/tmp/convert-1/a.epub"
+        assert jobs[2]["state"] == "failed"
+        assert jobs[2]["reason"] == "ebook-convert exited with code 1"
+
+    def test_re_adding_a_job_resets_it(self, temp_cwa_db, target_format):
+        """Verify a job queued again starts over as pending."""
+        temp_cwa_db.conversion_jobs_add_pending([(1, "/a.mobi")], target_format)
+        temp_cwa_db.conversion_job_set_state(1, target_format, "failed", reason="bad file")
+        temp_cwa_db.conversion_jobs_add_pending([(1, "/a.azw3")], target_format)
+
+        job = temp_cwa_db.conversion_jobs_get(target_format)[1]
+        assert job["state"] == "pending"
+        assert job["reason"] == ""
+        assert job["source_path"] == "/a.azw3"
+
+    def test_clear_failed_only_removes_failed_jobs(self, temp_cwa_db, target_format):
+        """Verify retrying failed books leaves the other jobs alone."""
+        temp_cwa_db.conversion_jobs_add_pending([(1, "/a.mobi"), (2, "/b.pdf")], target_format)
+        temp_cwa_db.conversion_job_set_state(2, target_format, "failed", reason="bad file")
+
+        assert temp_cwa_db.conversion_jobs_clear_failed(target_format) == 1
+        assert set(temp_cwa_db.conversion_jobs_get(target_format)) == {1}
+
+
 @pytest.mark.unit
 class TestCWADBStatistics:
     """Test statistics aggregation functions."""
@@ -336,3 +390,22 @@ class TestCWADBErrorHandling:
 if __name__ == '__main__':
     # Allow running directly
     pytest.main([__file__, '-v'])
+
+
+@pytest.mark.unit
+class TestCWADBEpubFixerFingerprints:
+    """Test the fingerprints kept for incremental library-wide EPUB fixer runs."""
+
+    def test_results_are_recorded_in_one_batch(self, temp_cwa_db, tmp_path):
+        """Verify fixer entries and fingerprints are stored and fingerprints are updated in place."""
+        epub = str(tmp_path / "Book.epub")
+        entry = ("Book", True, 1, "False", epub, "01 - Fixed encoding for file chapter.xhtml")
+        before = temp_cwa_db.cur.execute("SELECT count(*) FROM epub_fixes").fetchone()[0]
+
+        temp_cwa_db.epub_fixer_record_results([entry], [(epub, 100, 200, "abc")])
+        temp_cwa_db.epub_fixer_record_results([entry], [(epub, 150, 300, None)])
+
+        assert temp_cwa_db.epub_fixer_fingerprints_get()[epub] == (150, 300, "")
+        assert temp_cwa_db.cur.execute("SELECT count(*) FROM epub_fixes").fetchone()[0] == before + 2
+        temp_cwa_db.cur.execute("DELETE FROM epub_fixer_fingerprints WHERE file_path=?", (epub,))
+        temp_cwa_db.con.commit()
@@ -0,0 +1,83 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""
+Unit Tests for the embedded metadata export cache
+
+These tests verify an export runs once per book version and settings, that its
+checksum is stored once, and that the least recently used exports are evicted.
+"""
+
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from cps import export_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "exports"
+    cache_dir.mkdir()
+    export_dir = tmp_path / "tmp"
+    export_dir.mkdir()
+    monkeypatch.setattr(export_cache, "get_cache_dir", lambda: str(cache_dir))
+    monkeypatch.setattr(export_cache, "get_temp_dir", lambda: str(export_dir))
+    checksums = []
+    monkeypatch.setattr(export_cache, "_store_checksum",
+                        lambda book_id, book_format, path: checksums.append((book_id, path)))
+
+    class Exporter:
+        def __init__(self):
+            self.calls = 0
+            self.checksums = checksums
+
+        def __call__(self, content=b"book"):
+            self.calls += 1
+            name = "export{}".format(self.calls)
+            (export_dir / (name + ".epub")).write_bytes(content)
+            return str(export_dir), name
+
+    return Exporter()
+
+
+MODIFIED = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.mark.unit
+class TestExportCache:
+    def test_export_runs_once(self, cache):
+        first = export_cache.get_export(1, "epub", MODIFIED, ("calibredb",), cache)
+        second = export_cache.get_export(1, "epub", MODIFIED, ("calibredb",), cache)
+
+        assert first == second
+        assert cache.calls == 1
+        assert cache.checksums == [(1, first)]
+        with open(first, "rb") as f:
+            assert f.read() == b"book"
+
+    def test_edits_and_settings_make_new_entries(self, cache):
+        first = export_cache.get_export(1, "epub", MODIFIED, ("calibredb",), cache)
+        edited = export_cache.get_export(1, "epub", datetime(2025, 2, 1, tzinfo=timezone.utc), ("calibredb",), cache)
+        other_settings = export_cache.get_export(1, "epub", MODIFIED, ("calibredb", "split"), cache)
+
+        assert len({first, edited, other_settings}) == 3
+        assert cache.calls == 3
+
+    def test_failed_export_is_not_cached(self, cache):
+        assert export_cache.get_export(1, "epub", MODIFIED, (), lambda: (None, None)) is None
+        assert export_cache.get_cached_export(1, "epub", MODIFIED, ()) is None
+
+    def test_least_recently_used_is_evicted(self, cache):
+        old = export_cache.get_export(1, "epub", MODIFIED, (), lambda: cache(b"x" * 10))
+        new = export_cache.get_export(2, "epub", MODIFIED, (), lambda: cache(b"x" * 10))
+        os.utime(old, (1, 1))
+
+        export_cache.evict(max_size=15)
+
+        assert not os.path.exists(old)
+        assert os.path.exists(new)
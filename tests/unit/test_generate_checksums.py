@@ -212,6 +212,8 @@ class TestChecksumGenerationScript:
             timeout=30
         )
 
+        assert result.returncode == 0
+
         # Verify original checksum is unchanged
         conn = sqlite3.connect(db_path)
         cur = conn.cursor()
@@ -487,3 +489,65 @@ class TestChecksumGenerationAccuracy:
 
         # Should match
         assert script_checksum == direct_checksum
+
+
+@pytest.mark.unit
+class TestChecksumGenerationBatches:
+    """Test the batched, parallel backfill."""
+
+    def test_interrupted_run_keeps_committed_batches(self, tmp_path, monkeypatch):
+        """An interrupted run keeps its finished batches and the next run only does the rest."""
+        import generate_book_checksums
+
+        library_path = tmp_path / "test_library"
+        create_minimal_calibre_library(library_path)
+        for i in range(5):
+            add_book_to_library(library_path, f"Book {i}", ["EPUB"])
+
+        hashed = []
+        real_hash = generate_book_checksums.hash_book_format
+
+        def interrupting_hash(file_path):
+            if len(hashed) == 3:
+                raise KeyboardInterrupt
+            hashed.append(file_path)
+            return real_hash(file_path)
+
+        monkeypatch.setattr(generate_book_checksums, "hash_book_format", interrupting_hash)
+        with pytest.raises(KeyboardInterrupt):
+            generate_book_checksums.generate_checksums(str(library_path), batch_size=2, workers=1)
+
+        conn = sqlite3.connect(library_path / "metadata.db")
+        assert conn.execute("SELECT COUNT(*) FROM book_format_checksums").fetchone()[0] == 2
+        conn.close()
+
+        hashed.clear()
+        monkeypatch.setattr(generate_book_checksums, "hash_book_format", lambda file_path: hashed.append(file_path) or real_hash(file_path))
+        generate_book_checksums.generate_checksums(str(library_path), batch_size=2, workers=4)
+
+        assert len(hashed) == 3
+        conn = sqlite3.connect(library_path / "metadata.db")
+        rows = conn.execute("SELECT book, COUNT(*) FROM book_format_checksums GROUP BY book").fetchall()
+        conn.close()
+        assert rows == [(book_id, 1) for book_id in range(1, 6)]
+
+    def test_reports_throughput(self, tmp_path, capsys):
+        import generate_book_checksums
+
+        library_path = tmp_path / "test_library"
+        create_minimal_calibre_library(library_path)
+        add_book_to_library(library_path, "Book", ["EPUB", "PDF"])
+
+        generate_book_checksums.generate_checksums(str(library_path), workers=2)
+
+        assert "files/sec" in capsys.readouterr().out
+
+    def test_worker_count_can_be_configured(self, monkeypatch):
+        import generate_book_checksums
+
+        monkeypatch.setenv("CWA_CHECKSUM_WORKERS", "3")
+        assert generate_book_checksums.get_checksum_workers() == 3
+        assert generate_book_checksums.get_checksum_workers(5) == 5
+
+        monkeypatch.setenv("CWA_CHECKSUM_WORKERS", "invalid")
+        assert 1 <= generate_book_checksums.get_checksum_workers() <= 16
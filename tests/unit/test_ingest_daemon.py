@@ -0,0 +1,181 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""
+Unit Tests for the Ingest Daemon
+
+These tests verify the thin ingest_processor.py client and the long-lived
+ingest daemon hand files over correctly and report exit codes back.
+"""
+
+import json
+import sqlite3
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+
+# Add scripts directory to path (works in both dev container and CI)
+scripts_dir = Path(__file__).parent.parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+import ingest_daemon
+import ingest_processor
+from cwa_db import CWA_DB
+
+
+class FakeContext:
+    def __init__(self):
+        self.cwa_settings = {'ingest_timeout_minutes': 15}
+        self.refresh_calls = 0
+
+    def refresh_if_changed(self):
+        self.refresh_calls += 1
+        return False
+
+
+def start_daemon(context_factory):
+    # AF_UNIX paths are length limited, so keep the socket short
+    socket_dir = tempfile.mkdtemp(prefix="cwa-")
+    daemon = ingest_daemon.IngestDaemon(socket_path=str(Path(socket_dir) / "ingest.sock"),
+                                        context_factory=context_factory)
+    server = daemon.bind()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return daemon, server
+
+
+@pytest.fixture
+def running_daemon(monkeypatch):
+    monkeypatch.setattr(ingest_daemon, "BATCH_WINDOW", 0.5)
+    daemon, server = start_daemon(FakeContext)
+    yield daemon
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def real_context_factory(tmp_path, monkeypatch):
+    """Builds a real IngestContext with its cwa.db, app.db and dirs.json in tmp_path"""
+    class TempCWA_DB(CWA_DB):
+        def connect_to_db(self):
+            self.db_path = f"{tmp_path}/"
+            return super().connect_to_db()
+
+    monkeypatch.setattr(ingest_processor, "CWA_DB", TempCWA_DB)
+    monkeypatch.setattr(ingest_processor, "load_cps_integrations", lambda: None)
+
+    dirs_json = tmp_path / "dirs.json"
+    dirs_json.write_text(json.dumps({"ingest_folder": str(tmp_path / "ingest"),
+                                     "calibre_library_dir": str(tmp_path / "library"),
+                                     "tmp_conversion_dir": str(tmp_path / "tmp")}))
+    app_db = tmp_path / "app.db"
+    con = sqlite3.connect(app_db)
+    con.execute("CREATE TABLE settings (config_calibre_dir TEXT, config_calibre_split INTEGER, "
+                "config_calibre_split_dir TEXT)")
+    con.execute("INSERT INTO settings VALUES (?, 0, NULL)", (str(tmp_path / "library"),))
+    con.commit()
+    con.close()
+
+    return lambda: ingest_processor.IngestContext(dirs_json_path=str(dirs_json), app_db_path=str(app_db))
+
+
+@pytest.mark.unit
+class TestIngestDaemon:
+    def test_client_returns_none_without_daemon(self, tmp_path):
+        assert ingest_processor.submit_to_daemon("/tmp/book.epub", socket_path=str(tmp_path / "missing.sock")) is None
+
+    def test_files_are_processed_with_shared_context(self, running_daemon, monkeypatch):
+        processed = []
+        monkeypatch.setattr(ingest_processor, "main", lambda path, context: processed.append((path, context)))
+
+        for name in ("one.epub", "two.epub"):
+            assert ingest_processor.submit_to_daemon(f"/ingest/{name}", socket_path=running_daemon.socket_path) == 0
+
+        assert [path for path, _ in processed] == ["/ingest/one.epub", "/ingest/two.epub"]
+        assert all(context is running_daemon.context for _, context in processed)
+        assert running_daemon.context.refresh_calls == 2
+
+    def test_errors_are_reported_as_exit_codes(self, running_daemon, monkeypatch):
+        def failing_main(path, context):
+            if path.endswith("busy.epub"):
+                sys.exit(2)
+            raise RuntimeError("calibredb exploded")
+
+        monkeypatch.setattr(ingest_processor, "main", failing_main)
+
+        assert ingest_processor.submit_to_daemon("/ingest/busy.epub", socket_path=running_daemon.socket_path) == 2
+        assert ingest_processor.submit_to_daemon("/ingest/broken.epub", socket_path=running_daemon.socket_path) == 1
+
+    def test_files_arriving_together_are_batched(self, running_daemon, monkeypatch):
+        batches = []
+
+        def fake_main_batch(paths, context):
+            batches.append(sorted(paths))
+            return {path: (1 if path.endswith("bad.epub") else 0) for path in paths}
+
+        monkeypatch.setattr(ingest_processor, "main_batch", fake_main_batch)
+
+        paths = ["/ingest/a.epub", "/ingest/b.epub", "/ingest/bad.epub"]
+        results = {}
+
+        def submit(path):
+            results[path] = ingest_processor.submit_to_daemon(path, socket_path=running_daemon.socket_path)
+
+        threads = [threading.Thread(target=submit, args=(path,)) for path in paths]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+
+        assert batches == [sorted(paths)]
+        assert results == {"/ingest/a.epub": 0, "/ingest/b.epub": 0, "/ingest/bad.epub": 1}
+
+    def test_real_context_is_used_on_the_worker_thread(self, real_context_factory, monkeypatch):
+        settings = []
+        monkeypatch.setattr(ingest_processor, "main",
+                            lambda path, context: settings.append(context.db.get_cwa_settings()))
+        daemon, server = start_daemon(real_context_factory)
+        try:
+            assert ingest_processor.submit_to_daemon("/ingest/one.epub", socket_path=daemon.socket_path) == 0
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert len(settings) == 1
+        assert "auto_convert" in settings[0]
+
+
+@pytest.mark.unit
+class TestBatchImportIdMapping:
+    def test_ids_in_order_when_every_file_was_added(self, tmp_path):
+        staged = [tmp_path / "a.epub", tmp_path / "b.epub"]
+        assert ingest_processor._map_added_book_ids(staged, [7, 8], str(tmp_path / "metadata.db"), str(tmp_path)) == [7, 8]
+
+    def test_ids_matched_by_content_when_some_were_merged(self, tmp_path):
+        library = tmp_path / "library"
+        staging = tmp_path / "staging"
+        staging.mkdir()
+        contents = {"first": b"first book " * 2000, "second": b"second book " * 2000}
+        for name, data in contents.items():
+            (staging / f"{name}.epub").write_bytes(data)
+
+        # Only "second" made it in as a new book (id 12), "first" was merged into an existing one
+        book_dir = library / "Author" / "Second (12)"
+        book_dir.mkdir(parents=True)
+        (book_dir / "Second - Author.epub").write_bytes(contents["second"])
+        con = sqlite3.connect(library / "metadata.db")
+        con.execute("CREATE TABLE books (id INTEGER PRIMARY KEY, path TEXT)")
+        con.execute("CREATE TABLE data (id INTEGER PRIMARY KEY, book INTEGER, format TEXT, name TEXT)")
+        con.execute("INSERT INTO books VALUES (12, 'Author/Second (12)')")
+        con.execute("INSERT INTO data VALUES (1, 12, 'EPUB', 'Second - Author')")
+        con.commit()
+        con.close()
+
+        book_ids = ingest_processor._map_added_book_ids([staging / "first.epub", staging / "second.epub"], [12],
+                                                        str(library / "metadata.db"), str(library))
+        assert book_ids == [None, 12]
@@ -0,0 +1,194 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""
+Unit Tests for the Kindle EPUB Fixer
+
+These tests verify EPUBs are only rewritten when a fix was applied, that
+entries the fixes did not touch are copied across without being recompressed,
+that callers can take the fixer's output and cwa.db row for themselves
+and that library-wide runs skip EPUBs that are unchanged since the last one.
+"""
+
+import os
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+# Add scripts directory to path (works in both dev container and CI)
+scripts_dir = Path(__file__).parent.parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+import kindle_epub_fixer
+
+CONTAINER = """<?xml version="1.0" encoding="utf-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>"""
+
+OPF = """<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" xmlns:dc="http://purl.org/dc/elements/1.1/">
+  <metadata><dc:language>en</dc:language></metadata>
+</package>"""
+
+CLEAN_CHAPTER = '<?xml version="1.0" encoding="utf-8"?>\n<html><body><p>Text</p></body></html>'
+
+
+class FakeDB:
+    fingerprints = {}
+
+    def __init__(self):
+        self.cwa_settings = {'auto_backup_epub_fixes': False}
+        self.entries = []
+
+    def epub_fixer_add_entry(self, *args):
+        self.entries.append(args)
+
+    def epub_fixer_fingerprints_get(self):
+        return dict(FakeDB.fingerprints)
+
+    def epub_fixer_record_results(self, entries, fingerprints):
+        self.entries.extend(entries)
+        FakeDB.fingerprints.update({path: (size, mtime_ns, checksum) for path, size, mtime_ns, checksum in fingerprints})
+
+    def epub_fixer_fingerprints_clear(self):
+        FakeDB.fingerprints = {}
+
+
+def make_epub(path, chapter):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as epub:
+        epub.writestr('mimetype', 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        epub.writestr('META-INF/container.xml', CONTAINER)
+        epub.writestr('content.opf', OPF)
+        epub.writestr('chapter.xhtml', chapter)
+        epub.writestr('images/cover.jpg', os.urandom(64 * 1024) + b'\0' * 64 * 1024)
+    return path
+
+
+def raw_entry(path, name):
+    with zipfile.ZipFile(path) as epub:
+        info = epub.getinfo(name)
+        epub.fp.seek(info.header_offset + zipfile.sizeFileHeader + len(info.orig_filename) + len(info.extra))
+        return info.compress_type, epub.fp.read(info.compress_size)
+
+
+@pytest.mark.unit
+class TestEPUBFixerCopyThrough:
+    def test_untouched_epub_is_not_rewritten(self, tmp_path):
+        epub = make_epub(tmp_path / "book.epub", CLEAN_CHAPTER)
+        os.utime(epub, (1_000_000, 1_000_000))
+
+        fixes = kindle_epub_fixer.EPUBFixer(db=FakeDB()).process(str(epub))
+
+        assert fixes == []
+        assert os.stat(epub).st_mtime == 1_000_000
+
+    def test_untouched_epub_is_copied_to_another_output(self, tmp_path):
+        epub = make_epub(tmp_path / "book.epub", CLEAN_CHAPTER)
+        output = tmp_path / "out.epub"
+
+        kindle_epub_fixer.EPUBFixer(db=FakeDB()).process(str(epub), str(output))
+
+        assert output.read_bytes() == epub.read_bytes()
+
+    def test_fixed_epub_keeps_other_entries_compressed_as_they_were(self, tmp_path):
+        epub = make_epub(tmp_path / "book.epub", '<html><body><p>Text</p></body></html>')
+        cover_before = raw_entry(epub, 'images/cover.jpg')
+        opf_before = raw_entry(epub, 'content.opf')
+
+        fixes = kindle_epub_fixer.EPUBFixer(db=FakeDB()).process(str(epub))
+
+        assert fixes == ['Fixed encoding for file chapter.xhtml']
+        with zipfile.ZipFile(epub) as fixed:
+            assert fixed.testzip() is None
+            assert fixed.namelist()[0] == 'mimetype'
+            assert fixed.getinfo('mimetype').compress_type == zipfile.ZIP_STORED
+            assert fixed.read('chapter.xhtml').decode('utf-8').startswith('<?xml version="1.0" encoding="utf-8"?>')
+        assert raw_entry(epub, 'images/cover.jpg') == cover_before
+        assert raw_entry(epub, 'content.opf') == opf_before
+
+    def test_output_and_run_can_be_kept_by_the_caller(self, tmp_path, capsys):
+        epub = make_epub(tmp_path / "book.epub", '<html><body><p>Text</p></body></html>')
+        db = FakeDB()
+        output = []
+
+        fixer = kindle_epub_fixer.EPUBFixer(db=db, output=lambda string, log: output.append(string))
+        fixer.process(str(epub), record=False)
+
+        assert db.entries == []
+        assert fixer.db_entry(str(epub), str(epub))[0] == "book"
+        assert "[cwa-kindle-epub-fixer] EPUB successfully written." in output
+        assert capsys.readouterr().out == ""
+
+    def test_entries_are_copied_without_the_zipfile_internals(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(kindle_epub_fixer, "RAW_ZIP_COPY_SUPPORTED", False)
+        epub = make_epub(tmp_path / "book.epub", '<html><body><p>Text</p></body></html>')
+        with zipfile.ZipFile(epub) as original:
+            cover_before = original.read('images/cover.jpg')
+
+        kindle_epub_fixer.EPUBFixer(db=FakeDB()).process(str(epub))
+
+        with zipfile.ZipFile(epub) as fixed:
+            assert fixed.testzip() is None
+            assert fixed.read('images/cover.jpg') == cover_before
+            assert fixed.getinfo('mimetype').compress_type == zipfile.ZIP_STORED
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    FakeDB.fingerprints = {}
+    epubs = [str(make_epub(tmp_path / f"book{n}.epub", '<html><body><p>Text</p></body></html>')) for n in range(3)]
+    monkeypatch.setattr(kindle_epub_fixer, "CWA_DB", FakeDB)
+    monkeypatch.setattr(kindle_epub_fixer, "get_all_epubs_in_library", lambda: epubs)
+    monkeypatch.setattr(kindle_epub_fixer, "get_epub_checksums", lambda: {})
+    return epubs
+
+
+@pytest.mark.unit
+class TestLibraryRun:
+    def test_every_epub_is_fixed_on_the_pool(self, library):
+        errors = kindle_epub_fixer.fix_library("en", workers=2)
+
+        assert errors == {}
+        assert set(FakeDB.fingerprints) == set(library)
+        for epub in library:
+            with zipfile.ZipFile(epub) as fixed:
+                assert fixed.read('chapter.xhtml').startswith(b'<?xml')
+
+    def test_unchanged_epubs_are_skipped(self, library, monkeypatch):
+        kindle_epub_fixer.fix_library("en", workers=2)
+        processed = []
+        monkeypatch.setattr(kindle_epub_fixer.ProcessPoolExecutor, "map",
+                            lambda self, fn, epubs, *args, **kwargs: processed.extend(epubs) or [])
+
+        kindle_epub_fixer.fix_library("en", workers=2)
+        assert processed == []
+
+        os.utime(library[1], ns=(0, os.stat(library[1]).st_mtime_ns + 1_000_000_000))
+        kindle_epub_fixer.fix_library("en", workers=2)
+        assert processed == [library[1]]
+
+    def test_force_processes_everything_again(self, library, monkeypatch):
+        kindle_epub_fixer.fix_library("en", workers=2)
+        processed = []
+        monkeypatch.setattr(kindle_epub_fixer.ProcessPoolExecutor, "map",
+                            lambda self, fn, epubs, *args, **kwargs: processed.extend(epubs) or [])
+
+        kindle_epub_fixer.fix_library("en", workers=2, force=True)
+        assert processed == library
+
+    def test_changed_checksum_is_not_skipped(self, tmp_path):
+        book_dir = tmp_path / "Author" / "Title (7)"
+        book_dir.mkdir(parents=True)
+        epub = str(make_epub(book_dir / "Title.epub", CLEAN_CHAPTER))
+        size, mtime_ns, _ = kindle_epub_fixer.get_fingerprint(epub, {})
+        fingerprints = {epub: (size, mtime_ns, "aaaa")}
+
+        assert kindle_epub_fixer.is_unchanged(epub, fingerprints, {7: "aaaa"})
+        assert kindle_epub_fixer.is_unchanged(epub, fingerprints, {})
+        assert not kindle_epub_fixer.is_unchanged(epub, fingerprints, {7: "bbbb"})
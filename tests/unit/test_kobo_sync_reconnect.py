@@ -0,0 +1,75 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""
+Unit Tests for Kobo sync library change detection
+
+These tests verify a Kobo library sync only rebuilds the Calibre engine when
+metadata.db changed on disk.
+"""
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from cps.db import CalibreDB
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    (tmp_path / "metadata.db").write_bytes(b"library")
+    reconnects = []
+
+    def fake_reconnect(self, config, app_db_path):
+        reconnects.append(config.config_calibre_dir)
+        CalibreDB.library_signature = CalibreDB.get_library_signature(config.config_calibre_dir)
+
+    monkeypatch.setattr(CalibreDB, "reconnect_db", fake_reconnect)
+    monkeypatch.setattr(CalibreDB, "ensure_session", lambda self, expire_on_commit=True: None)
+    monkeypatch.setattr(CalibreDB, "_init", True)
+    monkeypatch.setattr(CalibreDB, "library_signature", None)
+    return SimpleNamespace(path=tmp_path, config=SimpleNamespace(config_calibre_dir=str(tmp_path)), reconnects=reconnects)
+
+
+def touch(path, offset_ns):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + offset_ns))
+
+
+@pytest.mark.unit
+class TestReconnectIfChanged:
+    def test_first_sync_reconnects(self, library):
+        assert CalibreDB().reconnect_db_if_changed(library.config, "app.db") is True
+        assert library.reconnects == [str(library.path)]
+
+    def test_unchanged_library_is_not_reconnected(self, library):
+        calibre_db = CalibreDB()
+        calibre_db.reconnect_db_if_changed(library.config, "app.db")
+
+        assert calibre_db.reconnect_db_if_changed(library.config, "app.db") is False
+        assert calibre_db.reconnect_db_if_changed(library.config, "app.db") is False
+        assert len(library.reconnects) == 1
+
+    def test_write_to_wal_triggers_reconnect(self, library):
+        calibre_db = CalibreDB()
+        calibre_db.reconnect_db_if_changed(library.config, "app.db")
+
+        (library.path / "metadata.db-wal").write_bytes(b"new book")
+        assert calibre_db.reconnect_db_if_changed(library.config, "app.db") is True
+
+        touch(library.path / "metadata.db-wal", 1_000_000)
+        assert calibre_db.reconnect_db_if_changed(library.config, "app.db") is True
+        assert len(library.reconnects) == 3
+
+    def test_changed_library_dir_triggers_reconnect(self, library, tmp_path_factory):
+        calibre_db = CalibreDB()
+        calibre_db.reconnect_db_if_changed(library.config, "app.db")
+
+        other = tmp_path_factory.mktemp("other-library")
+        (other / "metadata.db").write_bytes(b"library")
+        assert calibre_db.reconnect_db_if_changed(SimpleNamespace(config_calibre_dir=str(other)), "app.db") is True
+
@@ -0,0 +1,84 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""Unit tests for the KOSync credential verification cache"""
+
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+# The protocols package re-exports the blueprint under the module's name
+kosync = importlib.import_module("cps.progress_syncing.protocols.kosync")
+
+
+class FakeSession:
+    def __init__(self, users):
+        self.users = users
+
+    def get(self, model, user_id):
+        return self.users.get(user_id)
+
+
+@pytest.fixture
+def users(monkeypatch):
+    users = {1: SimpleNamespace(id=1, name="reader", password="hash-1")}
+    monkeypatch.setattr(kosync.ub, "session", FakeSession(users), raising=False)
+    return users
+
+
+@pytest.mark.unit
+class TestCredentialCache:
+    def test_verified_credentials_are_reused(self, users):
+        cache = kosync.CredentialCache()
+        assert cache.get("reader", "secret") is None
+
+        cache.add("Reader", "secret", users[1])
+
+        assert cache.get("READER", "secret") is users[1]
+        assert cache.get("reader", "wrong") is None
+        assert cache.stats() == {"hits": 1, "misses": 2, "size": 1}
+
+    def test_password_change_invalidates(self, users):
+        cache = kosync.CredentialCache()
+        cache.add("reader", "secret", users[1])
+
+        users[1].password = "hash-2"
+
+        assert cache.get("reader", "secret") is None
+        assert cache.stats()["size"] == 0
+
+    def test_deleted_user_invalidates(self, users):
+        cache = kosync.CredentialCache()
+        cache.add("reader", "secret", users[1])
+
+        del users[1]
+
+        assert cache.get("reader", "secret") is None
+
+    def test_entries_expire(self, users, monkeypatch):
+        cache = kosync.CredentialCache(ttl=10)
+        cache.add("reader", "secret", users[1])
+
+        now = kosync.time.monotonic()
+        monkeypatch.setattr(kosync.time, "monotonic", lambda: now + 11)
+
+        assert cache.get("reader", "secret") is None
+
+    def test_cache_is_bounded(self, users):
+        cache = kosync.CredentialCache(max_size=2)
+        for password in ("one", "two", "three"):
+            cache.add("reader", password, users[1])
+
+        assert cache.get("reader", "one") is None
+        assert cache.get("reader", "three") is users[1]
+        assert cache.stats()["size"] == 2
+
+    def test_passwords_are_not_stored(self, users):
+        cache = kosync.CredentialCache()
+        cache.add("reader", "secret", users[1])
+
+        assert all(b"secret" not in digest for digest in cache._entries)
@@ -0,0 +1,142 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""
+Unit Tests for the SMTP connection pool and streamed sending of TaskEmail
+
+These tests verify consecutive e-mails to the same server reuse one
+authenticated connection, that dead or idle connections are not reused and
+that attachments are base64 encoded from disk while the message is sent.
+"""
+
+import base64
+import os
+import smtplib
+from email import message_from_bytes, policy
+
+import pytest
+
+from cps.tasks import mail
+
+
+class FakeConnection:
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.transferSize = 0
+
+    def noop(self):
+        if not self.alive:
+            raise smtplib.SMTPServerDisconnected()
+        return 250, b"OK"
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool():
+    pool = mail.SMTPConnectionPool(idle_timeout=60)
+    yield pool
+    if pool._timer:
+        pool._timer.cancel()
+
+
+@pytest.mark.unit
+class TestSMTPConnectionPool:
+    def test_connection_is_reused_for_the_same_server(self, pool):
+        first = pool.acquire("server", FakeConnection)
+        pool.release("server", first)
+
+        assert pool.acquire("server", FakeConnection) is first
+
+    def test_other_settings_get_their_own_connection(self, pool):
+        first = pool.acquire("server", FakeConnection)
+        pool.release("server", first)
+
+        assert pool.acquire("other", FakeConnection) is not first
+
+    def test_dead_connection_is_replaced(self, pool):
+        first = pool.acquire("server", FakeConnection)
+        pool.release("server", first)
+        first.alive = False
+
+        second = pool.acquire("server", FakeConnection)
+        assert second is not first
+        assert first.closed
+
+    def test_idle_connections_are_closed(self, pool):
+        first = pool.acquire("server", FakeConnection)
+        pool.release("server", first)
+        pool.idle_timeout = 0
+
+        pool.expire()
+
+        assert first.closed
+        assert pool.acquire("server", FakeConnection) is not first
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = bytearray()
+
+    def sendall(self, data):
+        self.sent += data
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    connection = mail.Email()
+    connection.sock = FakeSocket()
+    monkeypatch.setattr(connection, "ehlo_or_helo_if_needed", lambda: None)
+    monkeypatch.setattr(connection, "mail", lambda from_addr: (250, b"OK"))
+    monkeypatch.setattr(connection, "rcpt", lambda to_addr: (250, b"OK"))
+    monkeypatch.setattr(connection, "docmd", lambda cmd: (354, b"Go ahead"))
+    monkeypatch.setattr(connection, "getreply", lambda: (250, b"Queued"))
+    return connection
+
+
+@pytest.mark.unit
+class TestStreamedAttachment:
+    @pytest.mark.parametrize("size", [0, 1, 56, 57, 58, 57 * 1024 + 5])
+    def test_encoded_size_matches_base64(self, size):
+        assert mail.encoded_size(size) == len(base64.encodebytes(b"x" * size).replace(b"\n", b"\r\n"))
+
+    def test_attachment_is_streamed_between_head_and_tail(self, smtp, tmp_path):
+        content = os.urandom(200 * 1024)
+        attachment = tmp_path / "book.epub"
+        attachment.write_bytes(content)
+
+        smtp.send_streamed("from@example.com", "to@example.com", b"Subject: x\r\n.dot\r\n\r\n", str(attachment),
+                           b"--end--\r\n")
+
+        sent = bytes(smtp.sock.sent)
+        assert sent.startswith(b"Subject: x\r\n..dot\r\n\r\n")
+        assert sent.endswith(b"--end--\r\n.\r\n")
+        body = sent[len(b"Subject: x\r\n..dot\r\n\r\n"):-len(b"--end--\r\n.\r\n")]
+        assert base64.b64decode(body) == content
+        assert smtp.getTransferStatus() == 1
+
+    def test_message_is_rebuilt_around_the_placeholder(self, smtp, tmp_path, monkeypatch):
+        content = os.urandom(1000)
+        attachment = tmp_path / "book.epub"
+        attachment.write_bytes(content)
+        task = mail.TaskEmail("Subject", "path", "book.epub", {"mail_from": "from@example.com"}, "to@example.com",
+                              "message", "Text")
+        monkeypatch.setattr(task, "_get_attachment", lambda book_path, filename: (str(attachment), False))
+        msg = task.prepare_message(stream_attachment=True)
+        monkeypatch.setattr(task, "_connection_key", lambda: "server")
+        monkeypatch.setattr(mail.smtp_pool, "acquire", lambda key, connect: smtp)
+        monkeypatch.setattr(mail.smtp_pool, "release", lambda key, connection: None)
+
+        task.send_standard_email(msg)
+
+        sent = bytes(smtp.sock.sent)[:-len(b".\r\n")]
+        parsed = message_from_bytes(sent, policy=policy.default)
+        assert [part.get_content() for part in parsed.iter_attachments()] == [content]
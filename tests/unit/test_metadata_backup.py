@@ -0,0 +1,100 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""
+Unit Tests for TaskBackupMetadata
+
+These tests verify books are marked dirty with a single statement and that
+the backup works through the dirty books in committed batches, keeping the
+books whose metadata.opf could not be written dirty without stopping there.
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+from lxml import etree
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from cps import db
+from cps.services.worker import STAT_FAIL, STAT_FINISH_SUCCESS
+from cps.tasks import metadata_backup
+
+
+@pytest.fixture
+def task(tmp_path, monkeypatch):
+    engine = create_engine("sqlite://")
+    # the backup eager loads every relationship it writes to metadata.opf
+    tables = [db.Books.__table__, db.Authors.__table__, db.books_authors_link, db.Tags.__table__,
+              db.books_tags_link, db.Comments.__table__, db.Series.__table__, db.books_series_link,
+              db.Ratings.__table__, db.books_ratings_link, db.Languages.__table__, db.books_languages_link,
+              db.Publishers.__table__, db.books_publishers_link, db.Identifiers.__table__,
+              db.Metadata_Dirtied.__table__, db.CustomColumns.__table__]
+    db.Base.metadata.create_all(engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    now = datetime.now(timezone.utc)
+    for book_id in range(1, 8):
+        book = db.Books(title=f"Book {book_id}", sort=f"Book {book_id}", author_sort="", timestamp=now, pubdate=now,
+                        series_index="1.0", last_modified=now, path=f"path{book_id}", has_cover=0, authors=[],
+                        tags=[])
+        book.id = book_id
+        session.add(book)
+        (tmp_path / f"path{book_id}").mkdir()
+    session.commit()
+
+    monkeypatch.setattr(metadata_backup, "BACKUP_BATCH_SIZE", 3)
+    monkeypatch.setattr(metadata_backup.config, "config_use_google_drive", False, raising=False)
+    monkeypatch.setattr(metadata_backup.config, "get_book_path", lambda: str(tmp_path), raising=False)
+    monkeypatch.setattr(metadata_backup, "create_new_metadata_backup",
+                        lambda book, *args: etree.Element("package", id=str(book.id)))
+
+    task = metadata_backup.TaskBackupMetadata()
+    task.calibre_db.session = session
+    task.statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: task.statements.append(statement))
+    task.book_path = tmp_path
+    return task
+
+
+def dirty_books(task):
+    return sorted(book_id for book_id, in task.calibre_db.session.query(db.Metadata_Dirtied.book))
+
+
+@pytest.mark.unit
+class TestBackupMetadata:
+    def test_all_books_are_marked_dirty_at_once(self, task):
+        task.calibre_db.session.add(db.Metadata_Dirtied(2))
+        task.calibre_db.session.commit()
+        task.statements.clear()
+
+        task.set_all_books_dirty()
+
+        assert task.stat == STAT_FINISH_SUCCESS
+        assert dirty_books(task) == list(range(1, 8))
+        assert len([s for s in task.statements if s.startswith("INSERT")]) == 1
+
+    def test_dirty_books_are_backed_up_in_batches(self, task):
+        task.set_all_books_dirty()
+
+        task.backup_metadata()
+
+        assert task.stat == STAT_FINISH_SUCCESS
+        assert dirty_books(task) == []
+        for book_id in range(1, 8):
+            assert (task.book_path / f"path{book_id}" / "metadata.opf").exists()
+        assert len([s for s in task.statements if s.startswith("DELETE")]) == 3
+
+    def test_failed_books_stay_dirty(self, task):
+        task.set_all_books_dirty()
+        (task.book_path / "path2").rmdir()
+
+        task.backup_metadata()
+
+        assert task.stat == STAT_FAIL
+        assert dirty_books(task) == [2]
+        for book_id in (1, 3, 4, 5, 6, 7):
+            assert (task.book_path / f"path{book_id}" / "metadata.opf").exists()
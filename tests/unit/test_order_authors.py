@@ -0,0 +1,88 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""
+Unit Tests for CalibreDB.order_authors
+
+These tests verify authors are put in author_sort order and that ordering a
+whole page of books costs a fixed number of queries.
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from cps import db
+
+
+@pytest.fixture
+def calibre_db():
+    engine = create_engine("sqlite://")
+    tables = [db.Books.__table__, db.Authors.__table__, db.books_authors_link]
+    db.Base.metadata.create_all(engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+
+    calibre_db = db.CalibreDB()
+    calibre_db.session = session
+    calibre_db.statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: calibre_db.statements.append(statement))
+    yield calibre_db
+    session.close()
+
+
+def add_book(session, book_id, author_sort, authors):
+    now = datetime.now(timezone.utc)
+    book = db.Books(title=f"Book {book_id}", sort=f"Book {book_id}", author_sort=author_sort, timestamp=now,
+                    pubdate=now, series_index="1.0", last_modified=now, path=f"path/{book_id}", has_cover=0,
+                    authors=authors, tags=[])
+    book.id = book_id
+    book.authors = authors
+    session.add(book)
+    return book
+
+
+@pytest.mark.unit
+class TestOrderAuthors:
+    def test_authors_follow_author_sort(self, calibre_db):
+        session = calibre_db.session
+        king = db.Authors("Stephen King", "King, Stephen")
+        straub = db.Authors("Peter Straub", "Straub, Peter")
+        add_book(session, 1, "Straub, Peter & King, Stephen", [king, straub])
+        session.commit()
+        session.expunge_all()
+
+        book = session.query(db.Books).one()
+        assert [a.name for a in calibre_db.order_authors([book])] == ["Peter Straub", "Stephen King"]
+
+    def test_unsorted_authors_are_appended(self, calibre_db):
+        session = calibre_db.session
+        first = db.Authors("First Author", "Author, First")
+        extra = db.Authors("Extra Author", "Author, Extra")
+        add_book(session, 1, "Author, First", [extra, first])
+        session.commit()
+        session.expunge_all()
+
+        book = session.query(db.Books).one()
+        calibre_db.order_authors([book], list_return=True)
+        assert [a.name for a in book.ordered_authors] == ["First Author", "Extra Author"]
+
+    def test_page_of_books_uses_constant_queries(self, calibre_db):
+        session = calibre_db.session
+        for book_id in range(1, 61):
+            authors = [db.Authors(f"Author {book_id}a", f"{book_id}a"), db.Authors(f"Author {book_id}b", f"{book_id}b")]
+            add_book(session, book_id, f"{book_id}b & {book_id}a", authors)
+        session.commit()
+        session.expunge_all()
+
+        books = session.query(db.Books).order_by(db.Books.id).all()
+        calibre_db.statements.clear()
+        calibre_db.order_authors(books, list_return=True)
+
+        assert len(calibre_db.statements) == 2
+        assert [a.name for a in books[59].ordered_authors] == ["Author 60b", "Author 60a"]
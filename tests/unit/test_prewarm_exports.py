@@ -0,0 +1,88 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""
+Unit Tests for pre-warming embedded metadata exports
+
+These tests verify a burst of edits and ingests queues a single task and that
+pre-warming stops once its disk budget is used up.
+"""
+
+import pytest
+
+from cps import ub
+from cps.tasks import prewarm
+
+
+class FakeSession:
+    def remove(self):
+        pass
+
+
+@pytest.mark.unit
+class TestPendingPrewarm:
+    def test_one_task_is_scheduled_for_many_requests(self):
+        queue = prewarm.PendingPrewarm()
+
+        assert queue.add([1]) is True
+        assert queue.add([2]) is False
+        assert queue.add() is False
+        assert queue.take() == ({1, 2}, True)
+        assert queue.take() == (set(), False)
+        assert queue.add([3]) is True
+
+    def test_failed_task_does_not_block_the_queue(self):
+        queue = prewarm.PendingPrewarm()
+        queue.add([1])
+        queue.release()
+
+        assert queue.add([1]) is True
+
+    def test_request_arriving_as_the_task_finishes_keeps_its_new_task(self, monkeypatch):
+        monkeypatch.setattr(ub, "get_new_session_instance", FakeSession)
+        monkeypatch.setattr(prewarm.config, "config_use_google_drive", False, raising=False)
+        monkeypatch.setattr(prewarm.config, "config_embed_metadata", True, raising=False)
+        queue = prewarm.PendingPrewarm()
+        monkeypatch.setattr(prewarm, "pending_prewarm", queue)
+        take = queue.take
+        scheduled = []
+
+        def take_then_request():
+            book_ids, everything = take()
+            if not book_ids and not everything:
+                scheduled.append(queue.add([2]))
+            return book_ids, everything
+
+        monkeypatch.setattr(queue, "take", take_then_request)
+        task = prewarm.TaskPrewarmExports()
+        monkeypatch.setattr(task, "get_candidates", lambda book_ids: [])
+        queue.add([1])
+
+        task.run(None)
+
+        assert scheduled == [True]
+        assert queue.add([3]) is False
+
+
+@pytest.mark.unit
+class TestPrewarmBudget:
+    def test_prewarm_stops_at_the_disk_budget(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(ub, "get_new_session_instance", lambda: None)
+        monkeypatch.setattr(prewarm, "EXPORT_PREWARM_SIZE", 25)
+        monkeypatch.setattr(prewarm, "EXPORT_PREWARM_WORKERS", 1)
+        exported = []
+
+        def export(candidate):
+            exported.append(candidate)
+            path = tmp_path / "{}.epub".format(candidate[0])
+            path.write_bytes(b"x" * 10)
+            return str(path)
+
+        task = prewarm.TaskPrewarmExports()
+        monkeypatch.setattr(task, "export", export)
+
+        assert task.prewarm([(book_id, "epub", None) for book_id in range(1, 6)]) == 3
+        assert [candidate[0] for candidate in exported] == [1, 2, 3]
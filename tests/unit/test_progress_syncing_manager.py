@@ -13,8 +13,10 @@ from datetime import datetime
 from cps.progress_syncing.checksums import (
     store_checksum,
     calculate_and_store_checksum,
+    checksum_lookup_cache,
     CHECKSUM_VERSION
 )
+from cps.progress_syncing.checksums.manager import ChecksumLookupCache
 from cps.progress_syncing.models import ensure_checksum_table
 
 
@@ -134,3 +136,40 @@ class TestCalculateAndStoreChecksum:
         calculate_and_store_checksum(1, 'EPUB', '/nonexistent/file.epub', db_connection=test_db)
         cursor = test_db.execute("SELECT COUNT(*) FROM book_format_checksums")
         assert cursor.fetchone()[0] == 0
+
+
+@pytest.mark.unit
+class TestChecksumLookupCache:
+    """Test the checksum -> book lookup cache."""
+
+    def test_returns_cached_match(self):
+        cache = ChecksumLookupCache()
+        cache.add('abc123', None, (1, 'EPUB', 'Title', 'Author/Title (1)', CHECKSUM_VERSION))
+        assert cache.get('abc123')[0] == 1
+        assert cache.get('abc123', CHECKSUM_VERSION) is None
+
+    def test_evicts_least_recently_used(self):
+        cache = ChecksumLookupCache(max_size=2)
+        cache.add('a', None, (1,))
+        cache.add('b', None, (2,))
+        cache.get('a')
+        cache.add('c', None, (3,))
+        assert cache.get('a') == (1,)
+        assert cache.get('b') is None
+
+    def test_expired_entries_are_dropped(self):
+        cache = ChecksumLookupCache(ttl=-1)
+        cache.add('abc123', None, (1,))
+        assert cache.get('abc123') is None
+
+    def test_store_checksum_invalidates_every_version(self, test_db):
+        checksum_lookup_cache.add('abc123', None, (1,))
+        checksum_lookup_cache.add('abc123', CHECKSUM_VERSION, (1,))
+        checksum_lookup_cache.add('def456', None, (2,))
+
+        store_checksum(2, 'EPUB', 'abc123', db_connection=test_db)
+
+        assert checksum_lookup_cache.get('abc123') is None
+        assert checksum_lookup_cache.get('abc123', CHECKSUM_VERSION) is None
+        assert checksum_lookup_cache.get('def456') == (2,)
+        checksum_lookup_cache.clear()
@@ -99,6 +99,33 @@ class TestEnsureChecksumTable:
         indexes = [row[0] for row in cursor.fetchall()]
         assert any('book_format' in idx for idx in indexes)
 
+    def test_lookup_is_answered_from_covering_index(self, tmp_path):
+        db = tmp_path / "test.db"
+        conn = sqlite3.connect(str(db))
+        ensure_checksum_table(conn)
+
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT book, format, version FROM book_format_checksums "
+            "WHERE checksum = ? ORDER BY created DESC, version DESC LIMIT 1", ('abc123',)
+        ).fetchall()
+        details = " ".join(row[-1] for row in plan)
+        assert "COVERING INDEX idx_checksum_lookup" in details
+        assert "TEMP B-TREE" not in details
+
+    def test_adds_lookup_index_to_existing_table(self, tmp_path):
+        db = tmp_path / "test.db"
+        conn = sqlite3.connect(str(db))
+        conn.execute("""
+            CREATE TABLE book_format_checksums (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, book INTEGER NOT NULL, format TEXT NOT NULL,
+                checksum TEXT NOT NULL, version TEXT NOT NULL DEFAULT 'koreader', created TIMESTAMP
+            )
+        """)
+        ensure_checksum_table(conn)
+
+        cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='book_format_checksums'")
+        assert 'idx_checksum_lookup' in [row[0] for row in cursor.fetchall()]
+
     def test_idempotent(self, tmp_path):
         db = tmp_path / "test.db"
         conn = sqlite3.connect(str(db))
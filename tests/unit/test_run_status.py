@@ -0,0 +1,101 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""
+Unit Tests for the run status records of Convert Library and the EPUB Fixer
+
+These tests verify the published progress can be read back at any time and
+that the run log is only ever read from where the last poll left off.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add scripts directory to path (works in both dev container and CI)
+scripts_dir = Path(__file__).parent.parent.parent / "scripts"
+sys.path.insert(0, str(scripts_dir))
+
+import run_status
+
+
+@pytest.mark.unit
+class TestRunStatus:
+    def test_missing_status_reads_as_idle(self, tmp_path):
+        assert run_status.read_run_status(str(tmp_path / "status.json")) == {"state": "idle", "current": 0, "total": 0}
+
+    def test_corrupt_status_reads_as_idle(self, tmp_path):
+        path = tmp_path / "status.json"
+        path.write_text("{not json")
+        assert run_status.read_run_status(str(path))["state"] == "idle"
+
+    def test_progress_is_published(self, tmp_path):
+        path = str(tmp_path / "status.json")
+        status = run_status.RunStatus(path, min_interval=0)
+        status.start(10)
+        status.update(4)
+
+        assert run_status.read_run_status(path) == {"state": "running", "current": 4, "total": 10}
+        status.finish()
+        assert run_status.read_run_status(path) == {"state": "finished", "current": 10, "total": 10}
+
+    def test_updates_are_throttled(self, tmp_path):
+        path = str(tmp_path / "status.json")
+        status = run_status.RunStatus(path, min_interval=3600)
+        status.start(10)
+        status.update(4)
+
+        assert run_status.read_run_status(path)["current"] == 0
+        status.finish("cancelled")
+        assert run_status.read_run_status(path) == {"state": "cancelled", "current": 4, "total": 10}
+
+    def test_mark_keeps_progress(self, tmp_path):
+        path = str(tmp_path / "status.json")
+        run_status.write_run_status(path, "running", 3, 7)
+        run_status.mark_run_status(path, "cancelled")
+
+        assert run_status.read_run_status(path) == {"state": "cancelled", "current": 3, "total": 7}
+
+
+@pytest.mark.unit
+class TestReadLogSince:
+    def test_only_new_lines_are_returned(self, tmp_path):
+        log = tmp_path / "run.log"
+        log.write_text("one\ntwo\n")
+
+        text, offset, reset = run_status.read_log_since(str(log), 0)
+        assert (text, reset) == ("one\ntwo\n", False)
+
+        with open(log, "a") as f:
+            f.write("three\nfou")
+        text, offset, reset = run_status.read_log_since(str(log), offset)
+        assert (text, reset) == ("three\n", False)
+
+        with open(log, "a") as f:
+            f.write("r\n")
+        assert run_status.read_log_since(str(log), offset)[0] == "four\n"
+
+    def test_restarted_log_is_read_from_the_start(self, tmp_path):
+        log = tmp_path / "run.log"
+        log.write_text("a much longer previous run\n")
+        _, offset, _ = run_status.read_log_since(str(log), 0)
+
+        log.write_text("new run\n")
+        assert run_status.read_log_since(str(log), offset) == ("new run\n", 8, True)
+
+    def test_large_backlog_only_returns_the_tail(self, tmp_path):
+        log = tmp_path / "run.log"
+        log.write_text("".join(f"line {n}\n" for n in range(1000)))
+
+        text, offset, reset = run_status.read_log_since(str(log), 0, max_bytes=100)
+        assert reset is True
+        assert offset == log.stat().st_size
+        assert text.endswith("line 999\n")
+        assert text.startswith("line ") and len(text) <= 100
+
+    def test_missing_log(self, tmp_path):
+        assert run_status.read_log_since(str(tmp_path / "run.log"), 0) == ("", 0, False)
@@ -0,0 +1,177 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""
+Unit Tests for the metadata provider fan-out
+
+These tests verify a metadata search answers by its deadline with whatever the
+providers returned so far, that repeated searches are served from the cache and
+that searches outliving their request don't rely on its context.
+"""
+
+import functools
+import threading
+
+import pytest
+from flask import Flask, has_request_context
+
+from cps import search_metadata, usermanagement
+from cps.metadata_provider import hardcover
+from cps.services.Metadata import MetaRecord, MetaSourceInfo, Metadata
+
+
+def record(provider_id, title):
+    return MetaRecord(id=title, title=title, authors=[], url="",
+                      source=MetaSourceInfo(id=provider_id, description=provider_id, link=""))
+
+
+class FakeProvider:
+    def __init__(self, provider_id, release=None, error=None):
+        self.provider_id = provider_id
+        self.release = release
+        self.error = error
+        self.calls = 0
+
+    def search(self, query, generic_cover="", locale="en"):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return [record(self.provider_id, query)]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    search_metadata.search_cache.clear()
+    yield
+    search_metadata.search_cache.clear()
+
+
+def searches(*providers):
+    return [(provider.provider_id, provider.search) for provider in providers]
+
+
+@pytest.mark.unit
+class TestSearchProviders:
+    def test_results_follow_provider_order(self):
+        providers = searches(FakeProvider("b"), FakeProvider("a"))
+
+        data = search_metadata.search_providers(providers, "Dune", "", "en")
+
+        assert [x["source"]["id"] for x in data] == ["b", "a"]
+
+    def test_repeated_search_is_served_from_cache(self):
+        provider = FakeProvider("google")
+
+        search_metadata.search_providers(searches(provider), "Dune", "", "en")
+        data = search_metadata.search_providers(searches(provider), "Dune", "", "en")
+
+        assert provider.calls == 1
+        assert data[0]["title"] == "Dune"
+        search_metadata.search_providers(searches(provider), "Dune", "", "de")
+        assert provider.calls == 2
+
+    def test_slow_provider_is_left_out_and_cached_once_done(self):
+        release = threading.Event()
+        fast, slow = FakeProvider("fast"), FakeProvider("slow", release=release)
+
+        data = search_metadata.search_providers(searches(fast, slow), "Dune", "", "en", timeout=0.2)
+        assert [x["source"]["id"] for x in data] == ["fast"]
+
+        release.set()
+        for _ in range(50):
+            if search_metadata.search_cache.get("slow", "Dune", "en") is not None:
+                break
+            threading.Event().wait(0.05)
+        data = search_metadata.search_providers(searches(fast, slow), "Dune", "", "en", timeout=0.2)
+        assert [x["source"]["id"] for x in data] == ["fast", "slow"]
+        assert slow.calls == 1
+
+    def test_failing_provider_is_not_cached(self):
+        broken = FakeProvider("broken", error=ValueError("down"))
+
+        assert search_metadata.search_providers(searches(broken), "Dune", "", "en") == []
+        search_metadata.search_providers(searches(broken), "Dune", "", "en")
+        assert broken.calls == 2
+
+
+class FakeUser:
+    def __init__(self, hardcover_token=None):
+        self.view_settings = {"metadata": {}}
+        self.hardcover_token = hardcover_token
+
+
+class RouteProvider(Metadata):
+    def __init__(self, provider_id, release=None):
+        super().__init__()
+        self.__id__ = provider_id
+        self.__name__ = provider_id
+        self.release = release
+        self.in_request = []
+
+    def search(self, query, generic_cover="", locale="en"):
+        if self.release is not None:
+            self.release.wait(5)
+        self.in_request.append(has_request_context())
+        return [record(self.__id__, query)]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    app = Flask(__name__)
+    app.config["LOGIN_DISABLED"] = True
+    app.register_blueprint(search_metadata.meta)
+    monkeypatch.setattr(usermanagement.config, "config_allow_reverse_proxy_header_login", False, raising=False)
+    monkeypatch.setattr(search_metadata, "current_user", FakeUser())
+    monkeypatch.setattr(search_metadata, "get_locale", lambda: "en")
+    monkeypatch.setattr(search_metadata, "_get_global_provider_enabled_map", lambda: {"disabled": False})
+    monkeypatch.setattr(search_metadata, "search_providers",
+                        functools.partial(search_metadata.search_providers, timeout=0.2))
+    return app.test_client()
+
+
+@pytest.mark.unit
+class TestMetadataRoutes:
+    def test_providers_are_listed_with_their_global_state(self, client, monkeypatch):
+        monkeypatch.setattr(search_metadata, "cl", [RouteProvider("enabled"), RouteProvider("disabled")])
+
+        response = client.get("/metadata/provider")
+
+        assert response.status_code == 200
+        assert [(p["id"], p["globally_enabled"]) for p in response.get_json()] == [("enabled", True),
+                                                                                  ("disabled", False)]
+
+    def test_search_skips_globally_disabled_providers(self, client, monkeypatch):
+        monkeypatch.setattr(search_metadata, "cl", [RouteProvider("enabled"), RouteProvider("disabled")])
+
+        response = client.post("/metadata/search", data={"query": "Dune"})
+
+        assert response.status_code == 200
+        assert [x["source"]["id"] for x in response.get_json()] == ["enabled"]
+
+    def test_search_finishing_after_the_request_runs_without_its_context(self, client, monkeypatch):
+        release = threading.Event()
+        slow = RouteProvider("slow", release=release)
+        monkeypatch.setattr(search_metadata, "cl", [slow])
+
+        response = client.post("/metadata/search", data={"query": "Dune"})
+        assert response.get_json() == []
+
+        release.set()
+        for _ in range(50):
+            if search_metadata.search_cache.get("slow", "Dune", "en") is not None:
+                break
+            threading.Event().wait(0.05)
+        assert search_metadata.search_cache.get("slow", "Dune", "en")[0]["title"] == "Dune"
+        assert slow.in_request == [False]
+
+    def test_hardcover_reads_the_user_token_while_in_the_request(self, monkeypatch):
+        monkeypatch.setattr(hardcover, "current_user", FakeUser(hardcover_token="user-token"))
+
+        search = hardcover.Hardcover().request_search()
+
+        assert search.keywords == {"user_token": "user-token"}
@@ -0,0 +1,75 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2025 Calibre-Web contributors
+# Copyright (C) 2024-2025 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""
+Unit Tests for CalibreDB.get_search_results
+
+These tests verify a search page is counted and fetched in SQL and that only
+the ids of the whole result are kept for the shelf mass add.
+"""
+
+from array import array
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from cps import db, ub
+
+
+@pytest.fixture
+def calibre_db(monkeypatch):
+    engine = create_engine("sqlite://")
+    tables = [db.Books.__table__, db.Authors.__table__, db.books_authors_link]
+    db.Base.metadata.create_all(engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+
+    now = datetime.now(timezone.utc)
+    for book_id in range(1, 26):
+        book = db.Books(title=f"Book {book_id}", sort=f"Book {book_id:02d}", author_sort="", timestamp=now,
+                        pubdate=now, series_index="1.0", last_modified=now, path=f"path/{book_id}", has_cover=0,
+                        authors=[], tags=[])
+        book.id = book_id
+        session.add(book)
+    session.commit()
+
+    calibre_db = db.CalibreDB()
+    calibre_db.session = session
+    calibre_db.statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: calibre_db.statements.append(statement))
+    monkeypatch.setattr(calibre_db, "search_query",
+                        lambda term, config, *join: session.query(db.Books, db.Books.title))
+    monkeypatch.setattr(ub, "current_user", SimpleNamespace(id=1))
+    monkeypatch.setattr(ub, "searched_ids", {})
+    yield calibre_db
+    session.close()
+
+
+@pytest.mark.unit
+class TestGetSearchResults:
+    def test_page_is_fetched_in_sql(self, calibre_db):
+        entries, count, pagination = calibre_db.get_search_results("Book", None, 10, [[db.Books.sort]], 10)
+
+        assert count == 25
+        assert [entry.Books.id for entry in entries] == list(range(11, 21))
+        assert pagination.page == 2
+        assert any("LIMIT" in statement for statement in calibre_db.statements)
+
+    def test_whole_result_ids_are_stored_compactly(self, calibre_db):
+        calibre_db.get_search_results("Book", None, 0, [[db.Books.sort]], 10)
+
+        stored = ub.searched_ids[1]
+        assert isinstance(stored, array)
+        assert list(stored) == list(range(1, 26))
+
+    def test_without_pagination_returns_everything(self, calibre_db):
+        entries, count, pagination = calibre_db.get_search_results("Book", None)
+
+        assert count == len(entries) == 25
+        assert pagination is None